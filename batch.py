@@ -0,0 +1,52 @@
+import argparse
+import json
+import sys
+import yaml
+from pkg.analysis.batch import BatchRunner
+from pkg.utils.logger import GameLogger
+
+def load_config(config_path: str) -> dict:
+    with open(config_path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+def main():
+    try:
+        config = load_config("config/settings/global_constants.yaml")
+        learning_cfg = load_config("config/settings/learning.yaml")
+    except FileNotFoundError:
+        sys.exit(1)
+
+    batch_cfg = config.get("batch", {})
+    parser = argparse.ArgumentParser(description="Run seeded episodes in parallel and aggregate their reports.")
+    parser.add_argument("--episodes", type=int, default=batch_cfg.get("episodes", 100))
+    parser.add_argument("--seed", type=int, default=batch_cfg.get("base_seed", 0))
+    parser.add_argument("--workers", type=int, default=batch_cfg.get("workers"))
+    parser.add_argument("--max-pending", type=int, default=batch_cfg.get("max_pending"))
+    parser.add_argument("--out", default=batch_cfg.get("output"), help="write the aggregated summary as JSON")
+    args = parser.parse_args()
+
+    logger = GameLogger(level="INFO")
+    step = max(1, args.episodes // 20)
+
+    def progress(done, total):
+        if done % step == 0 or done == total:
+            logger.lib.info(f"BATCH    | {done}/{total} episodes")
+
+    runner = BatchRunner(
+        config, learning_cfg, args.episodes,
+        base_seed=args.seed, workers=args.workers, max_pending=args.max_pending, progress=progress,
+    )
+    summary = runner.run()
+    if summary["cancelled"]:
+        logger.lib.warning(f"BATCH    | cancelled after {summary['completed']}/{summary['episodes']} episodes")
+
+    for key, stats in summary["metrics"].items():
+        logger.lib.info(f"{key: <25}: mean {stats['mean']:.4f}  p50 {stats['p50']:.4f}  [{stats['min']:.4f}, {stats['max']:.4f}]")
+    logger.lib.info(f"{'termination_reasons': <25}: {summary['termination_reasons']}")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
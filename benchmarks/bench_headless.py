@@ -0,0 +1,68 @@
+import copy
+import sys
+import time
+from pathlib import Path
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pkg.analysis.evaluator import SimulationEvaluator
+from pkg.engine.core import SimulationCore
+from pkg.entities.onis.oni_base import Oni
+from pkg.factory.generator import WorldGenerator
+from pkg.utils.random_manager import RandomManager
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+def make_core(config, learning_cfg, seed, headless):
+    # batch の run_episode と同じ作り方。保存・リプレイ・並列実行は切る
+    config = copy.deepcopy(config)
+    world = config["world"]
+    config["seed"] = world["seed"] = seed
+    world.update(headless=headless, executor="serial", keep_history=False,
+                 checkpoint_dir=None, replay_path=None, profile=False)
+    Oni.reset_shared_memory()
+    state = WorldGenerator(seed=seed).build_initial_state(config)
+    return SimulationCore(state, config, learning_cfg, random_manager=RandomManager(seed))
+
+def run_normal(core):
+    # main.py の通常経路から描画とログを除いたもの
+    evaluator = SimulationEvaluator(keep_history=False)
+    try:
+        while not core.state.is_terminal:
+            evaluator.record_step(core.step())
+    finally:
+        core.close()
+    return evaluator.generate_final_report()
+
+def run_headless(core):
+    return core.run_headless(SimulationEvaluator(keep_history=False))
+
+def bench(config, learning_cfg, seed, headless):
+    core = make_core(config, learning_cfg, seed, headless)
+    t0 = time.perf_counter()
+    report = (run_headless if headless else run_normal)(core)
+    return report, core.state.turn, time.perf_counter() - t0
+
+def main():
+    config = load("config/settings/global_constants.yaml")
+    learning_cfg = load("config/settings/learning.yaml")
+    seeds = [int(s) for s in sys.argv[1:]] or [0, 1, 2]
+    print(f"{'seed':>6} | {'turns':>5} | {'normal t/s':>10} | {'headless t/s':>12} | same report")
+    totals = {False: [0, 0.0], True: [0, 0.0]}
+    for seed in seeds:
+        row = {}
+        for headless in (False, True):
+            row[headless] = bench(config, learning_cfg, seed, headless)
+            totals[headless][0] += row[headless][1]
+            totals[headless][1] += row[headless][2]
+        (normal, turns, t_normal), (fast, _, t_fast) = row[False], row[True]
+        print(f"{seed:>6} | {turns:>5} | {turns / t_normal:>10.1f} | {turns / t_fast:>12.1f} | {normal == fast}")
+    print(f"{'all':>6} | {totals[True][0]:>5} | {totals[False][0] / totals[False][1]:>10.1f} | "
+          f"{totals[True][0] / totals[True][1]:>12.1f} |")
+
+if __name__ == "__main__":
+    main()
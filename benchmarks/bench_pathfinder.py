@@ -0,0 +1,97 @@
+import heapq
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pkg.engine.pathfinder import Pathfinder
+
+class LegacyPathfinder:
+    # ベースラインの Pathfinder._astar / _dist をそのまま写したもの (比較用。書き換えないこと)
+    def __init__(self, grid):
+        self.grid = grid
+        self.height, self.width = grid.shape
+
+    def _astar(self, start, goal):
+        if not (0 <= goal[0] < self.height and 0 <= goal[1] < self.width) or self.grid[goal] == 1:
+            return [start]
+        oheap = [(0, start)]
+        came_from = {}
+        g_score = {start: 0}
+        close_set = set()
+        c1, c2 = 1.0, 1.414
+        while oheap:
+            _, current = heapq.heappop(oheap)
+            if current == goal:
+                path = []
+                while current in came_from:
+                    path.append(current)
+                    current = came_from[current]
+                return [start] + path[::-1]
+            if current in close_set: continue
+            close_set.add(current)
+            for di, dj in [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]:
+                ni, nj = current[0] + di, current[1] + dj
+                neighbor = (ni, nj)
+                if not (0 <= ni < self.height and 0 <= nj < self.width) or self.grid[neighbor] == 1:
+                    continue
+                if di != 0 and dj != 0:
+                    if self.grid[current[0] + di, current[1]] == 1 or self.grid[current[0], current[1] + dj] == 1:
+                        continue
+                    cost = c2
+                else:
+                    cost = c1
+                tg = g_score[current] + cost
+                if tg < g_score.get(neighbor, float('inf')):
+                    came_from[neighbor] = current
+                    g_score[neighbor] = tg
+                    f = tg + self._dist(neighbor, goal)
+                    heapq.heappush(oheap, (f, neighbor))
+        return [start]
+
+    def _dist(self, a, b):
+        dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
+        return dx + dy + (1.414 - 2.0) * (dx if dx < dy else dy)
+
+def legacy_astar(grid, start, goal):
+    # 平坦化前の Pathfinder._astar (比較用のベースライン)
+    return LegacyPathfinder(grid)._astar(start, goal)
+
+def make_grid(size, wall_density, rng):
+    return (rng.random((size, size)) < wall_density).astype(int)
+
+def random_queries(grid, count, rng):
+    free = np.argwhere(grid == 0)
+    picks = rng.integers(0, len(free), size=(count, 2))
+    return [(tuple(map(int, free[a])), tuple(map(int, free[b]))) for a, b in picks]
+
+def bench(size, queries, wall_density=0.2, seed=0):
+    rng = np.random.default_rng(seed)
+    grid = make_grid(size, wall_density, rng)
+    pairs = random_queries(grid, queries, rng)
+
+    t0 = time.perf_counter()
+    legacy = [legacy_astar(grid, s, g) for s, g in pairs]
+    t_legacy = time.perf_counter() - t0
+
+    finder = Pathfinder(grid)
+    t0 = time.perf_counter()
+    flat = [finder._astar(s, g) for s, g in pairs]
+    t_flat = time.perf_counter() - t0
+
+    mismatches = sum(1 for a, b in zip(legacy, flat) if a != b)
+    return t_legacy, t_flat, mismatches
+
+def main():
+    cases = [(25, 400), (64, 200), (128, 60), (256, 20), (512, 5)]
+    print(f"{'size':>6} | {'queries':>7} | {'legacy ms/q':>11} | {'flat ms/q':>9} | {'speedup':>7} | mismatches")
+    for size, queries in cases:
+        t_legacy, t_flat, mismatches = bench(size, queries)
+        print(f"{size:>6} | {queries:>7} | {t_legacy / queries * 1e3:>11.3f} | "
+              f"{t_flat / queries * 1e3:>9.3f} | {t_legacy / t_flat:>6.1f}x | {mismatches}")
+
+if __name__ == "__main__":
+    main()
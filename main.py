@@ -2,16 +2,36 @@ import sys
 import yaml
 import os
 from pathlib import Path
+from pkg.engine.checkpoint import Checkpointer
 from pkg.engine.core import SimulationCore
 from pkg.factory.generator import WorldGenerator
 from pkg.utils.logger import GameLogger
+from pkg.utils.profiler import PROFILER
 from pkg.analysis.evaluator import SimulationEvaluator
+from pkg.analysis.replay import ReplayWriter
 from pkg.utils.visualizer import URLMapVisualizer
 
 def load_config(config_path: str) -> dict:
     with open(config_path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
+def dump_budgets(core, logger):
+    if core.budgets is None:
+        return
+    for name, s in core.budgets.report().items():
+        logger.lib.info(
+            f"BUDGET   | {name: <10} | decisions {s['decisions']} | exhausted {s['exhausted']} "
+            f"| overruns {s['overruns']} | max {s['max_ms']:.2f} ms"
+        )
+
+def dump_profile(world, logger):
+    if not PROFILER.enabled:
+        return
+    for line in PROFILER.format_table().splitlines():
+        logger.lib.info(f"PROFILE  | {line}")
+    if world.get("profile_output"):
+        PROFILER.to_json(world["profile_output"])
+
 def main():
     try:
         config = load_config("config/settings/global_constants.yaml")
@@ -20,26 +40,52 @@ def main():
         sys.exit(1)
 
     logger = GameLogger(level="INFO")
+    world = config["world"]
+    resume_from = None
+    if world.get("checkpoint_dir") and world.get("resume"):
+        resume_from = Checkpointer.latest(world["checkpoint_dir"])
+
+    if resume_from is not None:
+        core = SimulationCore.resume(resume_from, config, learning_cfg)
+        world_state = core.state
+    else:
+        generator = WorldGenerator(seed=config.get("seed"))
+        world_state = generator.build_initial_state(config)
+        core = SimulationCore(state=world_state, config=config, learning_cfg=learning_cfg)
+
+    if core.headless:
+        # 最終報告だけを求める。ターンごとの結果・ログ・描画・リプレイは作らない
+        evaluator = SimulationEvaluator(keep_history=False, metrics=world.get("report_metrics"))
+        try:
+            report = core.run_headless(evaluator)
+        except Exception as e:
+            logger.error(f"Engine Crash: {str(e)}")
+            raise
+        logger.print_report(report)
+        dump_budgets(core, logger)
+        dump_profile(world, logger)
+        return
 
     asset_urls = config.get("assets", {}) 
     viz = URLMapVisualizer(asset_urls=asset_urls)
 
-    generator = WorldGenerator(seed=config.get("seed"))
-    world_state = generator.build_initial_state(config)
-
-    core = SimulationCore(state=world_state, config=config, learning_cfg=learning_cfg)
-    evaluator = SimulationEvaluator()
+    replay = None
+    if world.get("replay_path"):
+        replay = ReplayWriter(world["replay_path"], world.get("replay_keyframe_interval", 32))
+    evaluator = SimulationEvaluator(
+        keep_history=world.get("keep_history", True), replay=replay, metrics=world.get("report_metrics"),
+    )
 
     initial_snapshot = core.get_snapshot()
     viz.save_frame(0, initial_snapshot, world_state.grid, world_state.exit_pos)
 
     try:
-        for turn in range(1, config["world"]["max_turns"] + 1):
+        for turn in range(world_state.turn + 1, config["world"]["max_turns"] + 1):
             step_result = core.step()
             evaluator.record_step(step_result)
             logger.log_turn(turn, step_result)
 
-            viz.save_frame(turn, step_result.snapshot, world_state.grid, world_state.exit_pos)
+            viz.save_frame(turn, step_result.snapshot, core.state.grid, world_state.exit_pos)
 
             if step_result.is_terminal:
                 break
@@ -47,9 +93,15 @@ def main():
     except Exception as e:
         logger.error(f"Engine Crash: {str(e)}")
         raise
+    finally:
+        core.close()
+        if replay is not None:
+            replay.close()
 
     report = evaluator.generate_final_report()
     logger.print_report(report)
+    dump_budgets(core, logger)
+    dump_profile(world, logger)
 
 if __name__ == "__main__":
     main()
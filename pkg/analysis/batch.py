@@ -0,0 +1,208 @@
+import copy
+import os
+import signal
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+from pkg.analysis.evaluator import SimulationEvaluator
+from pkg.engine.core import SimulationCore
+from pkg.entities.onis.oni_base import Oni
+from pkg.factory.generator import WorldGenerator
+from pkg.utils.random_manager import RandomManager
+
+def episode_seeds(base_seed, episodes):
+    """エピソードごとの種。base_seed と通し番号だけで決まり、ワーカー数に依らない"""
+    children = np.random.SeedSequence(base_seed).spawn(episodes)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+def episode_config(config, seed):
+    """1エピソード分の設定。バッチ中は保存や並列実行を切り、種を差し替える"""
+    config = copy.deepcopy(config)
+    config["seed"] = seed
+    world = config["world"]
+    world["seed"] = seed
+    world["executor"] = "serial"
+    world["checkpoint_dir"] = None
+    world["replay_path"] = None
+    world["keep_history"] = False
+    world["headless"] = True
+    world["profile"] = False
+    return config
+
+def run_episode(config, learning_cfg, seed):
+    """1エピソードを最後まで回して generate_final_report を返す"""
+    config = episode_config(config, seed)
+    # 鬼の共有記憶はクラスに残るので、前のエピソードの分を消しておく
+    Oni.reset_shared_memory()
+    random_manager = RandomManager(seed)
+    state = WorldGenerator(seed=seed).build_initial_state(config)
+    core = SimulationCore(state, config, learning_cfg, random_manager=random_manager)
+    evaluator = SimulationEvaluator(keep_history=False, metrics=config["world"].get("report_metrics"))
+    return core.run_headless(evaluator)
+
+_worker_cfg = None
+
+def _init_worker(config, learning_cfg):
+    # 設定はワーカーごとに一度だけ受け取り、経路キャッシュなどはエピソードをまたいで使い回す。
+    # Ctrl-C は親がまとめて止めるので、ワーカーでは無視する
+    global _worker_cfg
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_cfg = (config, learning_cfg)
+
+def _run_guarded(config, learning_cfg, index, seed):
+    # 1本の失敗でバッチ全体を止めず、失敗として集計する
+    try:
+        return index, run_episode(config, learning_cfg, seed)
+    except Exception as e:
+        return index, {"error": f"{type(e).__name__}: {e}"}
+
+def _run_remote(index, seed):
+    return _run_guarded(*_worker_cfg, index, seed)
+
+class BatchStats:
+    """
+    エピソードごとの報告を通し番号の位置に溜め、分布の統計にまとめる。
+    届いた順ではなく番号順に集計するので、ワーカー数や完了順で結果は変わらない。
+    報告そのものは持たず、数値の列と終了理由だけを持つ。
+    """
+
+    QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+    MAX_ERRORS = 10
+
+    def __init__(self, episodes):
+        self.episodes = episodes
+        self._values = {}
+        self._reasons = [None] * episodes
+        self._done = np.zeros(episodes, dtype=bool)
+        self.errors = {}
+        self.failed = 0
+
+    def add(self, index, report):
+        self._done[index] = True
+        if "error" in report:
+            self.failed += 1
+            if len(self.errors) < self.MAX_ERRORS:
+                self.errors[index] = report["error"]
+            self._reasons[index] = "ERROR"
+            return
+        self._reasons[index] = report.get("termination_reason")
+        for key, value in report.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                column = self._values.get(key)
+                if column is None:
+                    column = self._values[key] = np.full(self.episodes, np.nan)
+                column[index] = value
+
+    @property
+    def done(self):
+        return int(np.count_nonzero(self._done))
+
+    def summary(self):
+        metrics = {}
+        for key, column in self._values.items():
+            values = column[~np.isnan(column)]
+            if not len(values):
+                continue
+            stats = {
+                "count": int(len(values)),
+                "mean": float(values.mean()),
+                "std": float(values.std()),
+                "min": float(values.min()),
+                "max": float(values.max()),
+            }
+            for q, v in zip(self.QUANTILES, np.quantile(values, self.QUANTILES)):
+                stats[f"p{round(q * 100):02d}"] = float(v)
+            metrics[key] = stats
+        reasons = {}
+        for reason in self._reasons:
+            if reason is not None:
+                reasons[reason] = reasons.get(reason, 0) + 1
+        return {
+            "episodes": self.episodes,
+            "completed": self.done,
+            "failed": self.failed,
+            "metrics": metrics,
+            "termination_reasons": dict(sorted(reasons.items())),
+            "errors": {i: self.errors[i] for i in sorted(self.errors)},
+        }
+
+class BatchRunner:
+    """
+    種を決めた episodes 本のエピソードをプロセスプールで回し、報告を届いた順に BatchStats へ流す。
+    投入済みで未完了のエピソードは max_pending 本までに抑えるので、本数が多くてもメモリは増えない。
+    progress(done, total) は1本終わるごとに呼ぶ。cancel (threading.Event など) が立つか Ctrl-C で
+    新しい投入を止め、それまでの集計を cancelled=True として返す。workers=1 ならプールを使わない。
+    最初に終わった FAIL_FAST 本 (本数がそれより少なければ全部) がどれも失敗なら、
+    設定か世界の作り方が壊れているとみて RuntimeError で止める。
+    """
+
+    FAIL_FAST = 5
+
+    def __init__(self, config, learning_cfg, episodes, base_seed=0, workers=None, max_pending=None, progress=None):
+        if episodes < 0:
+            raise ValueError(f"episodes must not be negative: {episodes}")
+        self.config = config
+        self.learning_cfg = learning_cfg
+        self.episodes = episodes
+        self.seeds = episode_seeds(base_seed, episodes)
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.progress = progress
+
+    def run(self, cancel=None):
+        stats = BatchStats(self.episodes)
+        try:
+            if self.workers == 1:
+                cancelled = self._run_inline(stats, cancel)
+            else:
+                cancelled = self._run_pool(stats, cancel)
+        except KeyboardInterrupt:
+            cancelled = True
+        summary = stats.summary()
+        summary["cancelled"] = cancelled
+        return summary
+
+    def _run_inline(self, stats, cancel):
+        for index, seed in enumerate(self.seeds):
+            if cancel is not None and cancel.is_set():
+                return True
+            stats.add(*_run_guarded(self.config, self.learning_cfg, index, seed))
+            self._report(stats)
+        return False
+
+    def _run_pool(self, stats, cancel):
+        pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.config, self.learning_cfg))
+        pending = set()
+        queue = iter(enumerate(self.seeds))
+        cancelled = interrupted = False
+        try:
+            while True:
+                while not cancelled and len(pending) < self.max_pending:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    pending.add(pool.submit(_run_remote, *item))
+                if not pending:
+                    break
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stats.add(*future.result())
+                    self._report(stats)
+                if cancel is not None and cancel.is_set() and not cancelled:
+                    cancelled = True
+                    for future in pending:
+                        future.cancel()
+                    pending = {future for future in pending if not future.cancelled()}
+        except KeyboardInterrupt:
+            interrupted = True
+            raise
+        finally:
+            # cancel では走っている分を待ってから閉じる。Ctrl-C なら待たずに捨てる
+            pool.shutdown(wait=not interrupted, cancel_futures=True)
+        return cancelled
+
+    def _report(self, stats):
+        if stats.failed == stats.done >= min(self.episodes, self.FAIL_FAST):
+            index = min(stats.errors)
+            raise RuntimeError(f"First {stats.done} episodes all failed; episode {index}: {stats.errors[index]}")
+        if self.progress is not None:
+            self.progress(stats.done, self.episodes)
@@ -1,23 +1,64 @@
 import numpy as np
+from pkg.analysis.replay import ReplayReader
 
 class SimulationEvaluator:
-    def __init__(self):
+    # 毎ターンの意図と行動が要る指標。これらを求めなければターンごとの集計は飛ばす
+    PER_TURN_METRICS = ("avg_intercept_precision", "total_captures", "prediction_hit_rate")
+    FINAL_METRICS = ("survival_rate",)
+
+    def __init__(self, keep_history=True, replay=None, metrics=None):
+        # 長い実行では keep_history=False にし、履歴は replay (ReplayWriter) に書き出す
+        self.keep_history = keep_history
+        self.replay = replay
+        # metrics を渡せば報告はその指標 (と turn_count / termination_reason) だけになる
+        known = self.PER_TURN_METRICS + self.FINAL_METRICS
+        self.requested = known if metrics is None else tuple(metrics)
+        unknown = [m for m in self.requested if m not in known]
+        if unknown:
+            raise ValueError(f"Unknown metrics: {unknown}")
+        self._per_turn = any(m in self.PER_TURN_METRICS for m in self.requested)
         self.history = []
+        self.turn_count = 0
+        self._last = None
         self.metrics = {
             "intercept_precision": [],
             "total_captures": 0,
             "prediction_hits": 0
         }
 
-    def record_step(self, step_result):
-        self.history.append(step_result)
-        self._calculate_metrics(step_result)
+    @classmethod
+    def from_replay(cls, path, metrics=None):
+        """保存済みのリプレイを先頭から流して集計し直す"""
+        evaluator = cls(keep_history=False, metrics=metrics)
+        with ReplayReader(path) as reader:
+            for frame in reader:
+                evaluator.record_step(frame)
+        return evaluator
+
+    def record_step(self, step_result, state=None):
+        """
+        step_result は SimulationCore.step の戻り値。headless の TurnRecord はスナップショットを
+        持たないので、陣営は state (WorldState) の列から読む
+        """
+        if self.keep_history:
+            self.history.append(step_result)
+        if self.replay is not None:
+            self.replay.write(step_result)
+        self.turn_count += 1
+        self._last = step_result
+        if self._per_turn:
+            self._calculate_metrics(step_result, state)
 
-    def _calculate_metrics(self, res):
-        oni_ids = [a_id for a_id, a in res.snapshot.items() if a.get("is_oni")]
-        human_ids = [a_id for a_id, a in res.snapshot.items() if not a.get("is_oni")]
+    def _calculate_metrics(self, res, state=None):
+        if state is not None:
+            store = state.store
+            oni_ids = [a_id for a_id, is_oni in zip(store.ids, store.column("is_oni").tolist()) if is_oni]
+            human_ids = [a_id for a_id, is_oni in zip(store.ids, store.column("is_oni").tolist()) if not is_oni]
+        else:
+            oni_ids = [a_id for a_id, a in res.snapshot.items() if a.get("is_oni")]
+            human_ids = [a_id for a_id, a in res.snapshot.items() if not a.get("is_oni")]
 
-        captures = [a_id for a_id, action in res.actions.items() 
+        captures = [a_id for a_id, action in res.actions.items()
                     if action.status_update.get('alive') is False]
         self.metrics["total_captures"] += len(captures)
 
@@ -26,7 +67,7 @@ class SimulationEvaluator:
             o_intent = res.intents.get(o_id)
             if not o_intent or not o_intent.target_pos:
                 continue
-            
+
             for h_id in human_ids:
                 h_intent = res.intents.get(h_id)
                 if h_intent and tuple(o_intent.target_pos) == tuple(h_intent.target_pos):
@@ -36,20 +77,34 @@ class SimulationEvaluator:
         if oni_ids:
             self.metrics["intercept_precision"].append(hits / len(oni_ids))
 
-    def generate_final_report(self):
-        if not self.history:
-            return {"error": "NO_HISTORY_DATA"}
-
-        final_res = self.history[-1]
-        final_state = final_res.snapshot
+    def _survival_rate(self, state=None):
+        if state is not None:
+            store = state.store
+            humans = ~store.column("is_oni")
+            total = int(np.count_nonzero(humans))
+            escaped = int(np.count_nonzero(humans & store.column("escaped")))
+            return escaped / total if total else 0.0
+        final_state = self._last.snapshot
         humans = [h for h in final_state.values() if not h.get("is_oni")]
         escaped = [h for h in humans if h.get("escaped")]
+        return len(escaped) / len(humans) if humans else 0.0
+
+    def generate_final_report(self, state=None):
+        """state を渡せば最終状態はスナップショットではなく WorldState の列から求める"""
+        if self._last is None:
+            return {"error": "NO_HISTORY_DATA"}
 
-        return {
-            "turn_count": len(self.history),
-            "termination_reason": final_res.termination_reason,
-            "avg_intercept_precision": float(np.mean(self.metrics["intercept_precision"])) if self.metrics["intercept_precision"] else 0.0,
-            "total_captures": self.metrics["total_captures"],
-            "survival_rate": len(escaped) / len(humans) if humans else 0.0,
-            "prediction_hit_rate": self.metrics["prediction_hits"] / len(self.history) if self.history else 0.0
+        values = {
+            "avg_intercept_precision": lambda: float(np.mean(self.metrics["intercept_precision"])) if self.metrics["intercept_precision"] else 0.0,
+            "total_captures": lambda: self.metrics["total_captures"],
+            "survival_rate": lambda: self._survival_rate(state),
+            "prediction_hit_rate": lambda: self.metrics["prediction_hits"] / self.turn_count,
+        }
+        report = {
+            "turn_count": self.turn_count,
+            "termination_reason": self._last.termination_reason,
         }
+        for name in values:
+            if name in self.requested:
+                report[name] = values[name]()
+        return report
@@ -0,0 +1,269 @@
+import mmap
+import pickle
+import struct
+from pathlib import Path
+from types import SimpleNamespace
+import numpy as np
+
+MAGIC = b"TAGRPL\x00\x01"
+KEYFRAME = 0
+DELTA = 1
+
+# レコードの頭: (本体のバイト数, 種類, ターン)
+_HEAD = struct.Struct("<IBi")
+_COUNT = struct.Struct("<I")
+# (アクター番号, y, x)。位置のない行は y = x = NO_POS
+_CELL = np.dtype([("idx", "<u4"), ("y", "<i4"), ("x", "<i4")])
+NO_POS = np.iinfo(np.int32).min
+
+def _status_dict(status):
+    status = status.model_dump() if hasattr(status, "model_dump") else dict(status)
+    pos = status.get("pos")
+    status["pos"] = None if pos is None else (int(pos[0]), int(pos[1]))
+    return status
+
+def _pack_cells(rows):
+    cells = np.array(rows, dtype=_CELL)
+    return _COUNT.pack(len(cells)) + cells.tobytes()
+
+def _unpack_cells(buf, offset):
+    (n,) = _COUNT.unpack_from(buf, offset)
+    offset += _COUNT.size
+    cells = np.frombuffer(buf, dtype=_CELL, count=n, offset=offset)
+    return cells.tolist(), offset + n * _CELL.itemsize
+
+def _cell_pos(y, x):
+    return None if y == NO_POS else (y, x)
+
+class ReplayFrame:
+    """
+    リプレイから復元した1ターン分。step_result と同じ名前の属性を持つので、
+    SimulationEvaluator や GameLogger にそのまま渡せる
+    """
+
+    __slots__ = ("turn", "snapshot", "intents", "actions", "is_terminal", "termination_reason")
+
+    def __init__(self, turn, snapshot, intents, actions, is_terminal, termination_reason):
+        self.turn = turn
+        self.snapshot = snapshot
+        self.intents = intents
+        self.actions = actions
+        self.is_terminal = is_terminal
+        self.termination_reason = termination_reason
+
+    @property
+    def removed_items(self):
+        return [pos for action in self.actions.values() for pos in action.status_update.get("removed_items", ())]
+
+class ReplayWriter:
+    """
+    step_result を追記専用のバイナリに書く。keyframe_interval ターンごとに全アクターの状態を
+    キーフレームとして書き、その間は前のターンから変わった位置・状態と、意図・行動だけを書く。
+    位置は固定長の配列、その他の値は pickle で持つ。既存のファイルには続きとして追記する。
+    """
+
+    def __init__(self, path, keyframe_interval=32):
+        if keyframe_interval < 1:
+            raise ValueError(f"keyframe_interval must be positive: {keyframe_interval}")
+        self.path = Path(path)
+        self.keyframe_interval = keyframe_interval
+        fresh = not self.path.exists() or self.path.stat().st_size == 0
+        if not fresh:
+            with open(self.path, "rb") as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"Not a replay file: {self.path}")
+        self._file = open(self.path, "ab")
+        if fresh:
+            self._file.write(MAGIC)
+        self._ids = []
+        self._index = {}
+        self._last = None
+        self._since_key = 0
+        self._turn = 0
+
+    def write(self, step_result):
+        turn = getattr(step_result, "turn", None)
+        turn = self._turn + 1 if turn is None else turn
+        self._turn = turn
+        snapshot = {a_id: _status_dict(s) for a_id, s in step_result.snapshot.items()}
+        # 顔ぶれが変わったら番号を振り直すためにキーフレームにする
+        keyframe = (
+            self._last is None
+            or self._since_key >= self.keyframe_interval
+            or snapshot.keys() != self._last.keys()
+        )
+        if keyframe:
+            self._ids = list(snapshot)
+            self._index = {a_id: i for i, a_id in enumerate(self._ids)}
+            self._since_key = 0
+        self._since_key += 1
+
+        index = self._index
+        cells, fields = [], {}
+        for a_id, status in snapshot.items():
+            before = None if keyframe else self._last[a_id]
+            pos = status["pos"]
+            if before is None or pos != before["pos"]:
+                cells.append((index[a_id],) + ((NO_POS, NO_POS) if pos is None else pos))
+            changed = {
+                k: v for k, v in status.items()
+                if k != "pos" and (before is None or k not in before or before[k] != v)
+            }
+            if changed:
+                fields[index[a_id]] = changed
+
+        intents, targets, updates = [], [], {}
+        for a_id, intent in (step_result.intents or {}).items():
+            pos = getattr(intent, "target_pos", None)
+            if pos is not None and a_id in index:
+                intents.append((index[a_id], int(pos[0]), int(pos[1])))
+        for a_id, action in (step_result.actions or {}).items():
+            if not action or a_id not in index:
+                continue
+            pos = action.target_pos
+            targets.append((index[a_id],) + ((NO_POS, NO_POS) if pos is None else (int(pos[0]), int(pos[1]))))
+            if action.status_update:
+                updates[index[a_id]] = dict(action.status_update)
+
+        extra = {
+            "fields": fields,
+            "updates": updates,
+            "terminal": bool(getattr(step_result, "is_terminal", False)),
+            "reason": getattr(step_result, "termination_reason", "") or "",
+        }
+        if keyframe:
+            extra["ids"] = self._ids
+        body = b"".join((
+            _pack_cells(cells), _pack_cells(intents), _pack_cells(targets),
+            pickle.dumps(extra, protocol=pickle.HIGHEST_PROTOCOL),
+        ))
+        self._file.write(_HEAD.pack(len(body), KEYFRAME if keyframe else DELTA, turn))
+        self._file.write(body)
+        self._last = snapshot
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ReplayReader:
+    """
+    ReplayWriter のファイルを mmap で読む。開く時にレコードの頭だけをたどって目次を作り、
+    frame(turn) は直前のキーフレームから差分を当てて復元する。反復は先頭から順に復元する。
+    書きかけで途切れた末尾のレコードは無視する。
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        size = self.path.stat().st_size
+        if size < len(MAGIC):
+            self._file.close()
+            raise ValueError(f"Not a replay file: {self.path}")
+        self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._buf[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"Not a replay file: {self.path}")
+        self._offsets, self.turns, self._keyframes = [], [], []
+        offset = len(MAGIC)
+        while offset + _HEAD.size <= size:
+            length, kind, turn = _HEAD.unpack_from(self._buf, offset)
+            if offset + _HEAD.size + length > size:
+                break
+            if kind == KEYFRAME:
+                self._keyframes.append(len(self._offsets))
+            elif not self._keyframes:
+                raise ValueError(f"Replay starts without a keyframe: {self.path}")
+            self._offsets.append(offset)
+            self.turns.append(turn)
+            offset += _HEAD.size + length
+        self._by_turn = {turn: i for i, turn in enumerate(self.turns)}
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def frame(self, turn):
+        """turn のターンの状態。同じターンが何度も書かれていれば最後のもの"""
+        i = self._by_turn.get(turn)
+        if i is None:
+            raise KeyError(turn)
+        return self.frame_at(i)
+
+    def frame_at(self, i):
+        """i 番目のレコードの状態"""
+        if not 0 <= i < len(self._offsets):
+            raise IndexError(i)
+        start = self._keyframes[self._keyframe_before(i)]
+        state = {}
+        for k in range(start, i + 1):
+            frame = self._apply(state, k)
+        return frame
+
+    def _keyframe_before(self, i):
+        lo, hi = 0, len(self._keyframes)
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self._keyframes[mid] <= i:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+    def __iter__(self):
+        state = {}
+        for i in range(len(self._offsets)):
+            yield self._apply(state, i)
+
+    def _apply(self, state, i):
+        # state は {"ids": [...], "snapshot": {...}} で、レコード i の差分を当てて進める
+        buf = self._buf
+        offset = self._offsets[i]
+        length, kind, turn = _HEAD.unpack_from(buf, offset)
+        offset += _HEAD.size
+        end = offset + length
+        cells, offset = _unpack_cells(buf, offset)
+        intents, offset = _unpack_cells(buf, offset)
+        targets, offset = _unpack_cells(buf, offset)
+        extra = pickle.loads(buf[offset:end])
+
+        if kind == KEYFRAME:
+            state["ids"] = extra["ids"]
+            state["snapshot"] = {a_id: {} for a_id in extra["ids"]}
+        ids, snapshot = state["ids"], state["snapshot"]
+        for idx, y, x in cells:
+            snapshot[ids[idx]]["pos"] = _cell_pos(y, x)
+        for idx, fields in extra["fields"].items():
+            snapshot[ids[idx]].update(fields)
+
+        updates = extra["updates"]
+        return ReplayFrame(
+            turn,
+            {a_id: dict(status) for a_id, status in snapshot.items()},
+            {ids[idx]: SimpleNamespace(target_pos=(y, x)) for idx, y, x in intents},
+            {
+                ids[idx]: SimpleNamespace(target_pos=_cell_pos(y, x), status_update=updates.get(idx, {}))
+                for idx, y, x in targets
+            },
+            extra["terminal"],
+            extra["reason"],
+        )
+
+    def close(self):
+        if getattr(self, "_buf", None) is not None:
+            self._buf.close()
+            self._buf = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,226 @@
+from collections.abc import Mapping
+import numpy as np
+
+NO_POS = np.iinfo(np.int64).min
+
+class Column:
+    """
+    アクターの属性を ActorStore の列に置くデスクリプタ。ストアに入る前は普通の属性として
+    インスタンスの __dict__ に持ち、ActorStore.add で列へ移す。
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, actor, owner=None):
+        if actor is None:
+            return self
+        store = actor.__dict__.get("_store")
+        if store is None:
+            try:
+                return actor.__dict__[self.name]
+            except KeyError:
+                raise AttributeError(self.name) from None
+        return store.get(self.name, actor._slot)
+
+    def __set__(self, actor, value):
+        store = actor.__dict__.get("_store")
+        if store is None:
+            actor.__dict__[self.name] = value
+        else:
+            store.set(self.name, actor._slot, value)
+
+def columns_of(cls):
+    """cls (と親クラス) が Column として宣言している属性名"""
+    return [name for name in ActorStore.COLUMNS if isinstance(getattr(cls, name, None), Column)]
+
+class ActorStore:
+    """
+    アクターの状態を列ごとの NumPy 配列に持つ。行は add した順の固定スロットで、
+    アクター本体は Column 経由でこの配列を読み書きする薄い窓口になる。
+    終了判定や集計、tick のカウントダウンは列に対する配列演算で行う。
+    """
+
+    # 名前: (dtype, 1行の形, 未宣言の行の値)
+    COLUMNS = {
+        "pos": (np.int64, (2,), NO_POS),
+        "prev_pos": (np.int64, (2,), NO_POS),
+        "alive": (bool, (), False),
+        "escaped": (bool, (), False),
+        "is_oni": (bool, (), False),
+        "role": (np.int16, (), -1),
+        "stamina": (np.int64, (), 0),
+        "stun": (np.int64, (), 0),
+        "mp_charge": (np.int64, (), 0),
+        "dream_mode": (np.int64, (), 0),
+        "confused": (np.int64, (), 0),
+    }
+    POSITIONS = ("pos", "prev_pos")
+    # 終了判定や集計が配列だけで済むよう、どのアクターも列に置く属性
+    REQUIRED = ("pos", "alive", "escaped", "is_oni")
+
+    def __init__(self, capacity=64):
+        self.capacity = max(1, capacity)
+        self.ids = []
+        self.slots = {}
+        self.roles = []
+        self._role_codes = {}
+        self._arrays = {
+            name: np.full((self.capacity,) + shape, fill, dtype=dtype)
+            for name, (dtype, shape, fill) in self.COLUMNS.items()
+        }
+        # 行ごとに、tick で減らす列かどうか
+        self._ticking = {name: np.zeros(self.capacity, dtype=bool) for name in self.COLUMNS}
+        # fork 元と共有していない(書き込んでよい)列。行の割り当て表は _own_rows まで共有する
+        self._owned = set(self.COLUMNS)
+        self._rows_owned = True
+
+    def __len__(self):
+        return len(self.ids)
+
+    def fork(self):
+        """列を共有した複製。どちらの側も列ごとに最初の書き込みでコピーする"""
+        twin = object.__new__(ActorStore)
+        twin.__dict__.update(self.__dict__)
+        twin._arrays = dict(self._arrays)
+        twin._owned = set()
+        twin._rows_owned = False
+        self._owned = set()
+        self._rows_owned = False
+        return twin
+
+    def _writable(self, name):
+        if name not in self._owned:
+            self._arrays[name] = self._arrays[name].copy()
+            self._owned.add(name)
+        return self._arrays[name]
+
+    def _own_rows(self):
+        if not self._rows_owned:
+            self.ids = list(self.ids)
+            self.slots = dict(self.slots)
+            self.roles = list(self.roles)
+            self._role_codes = dict(self._role_codes)
+            self._ticking = {name: flags.copy() for name, flags in self._ticking.items()}
+            self._rows_owned = True
+
+    def add(self, actor):
+        """actor にスロットを割り当て、宣言された属性の値を列へ移す"""
+        if actor.a_id in self.slots:
+            raise ValueError(f"Actor already in store: {actor.a_id}")
+        self._own_rows()
+        slot = len(self.ids)
+        if slot == self.capacity:
+            self._grow(self.capacity * 2)
+        declared = columns_of(type(actor))
+        missing = [name for name in self.REQUIRED + tuple(actor.tick_fields) if name not in declared]
+        if missing:
+            raise ValueError(f"{type(actor).__name__} must declare {missing} as Column")
+        values = {name: actor.__dict__.pop(name) for name in declared if name in actor.__dict__}
+        self.ids.append(actor.a_id)
+        self.slots[actor.a_id] = slot
+        for name in actor.tick_fields:
+            self._ticking[name][slot] = True
+        self.bind(actor, slot)
+        for name, value in values.items():
+            self.set(name, slot, value)
+        return slot
+
+    def bind(self, actor, slot):
+        """値は動かさずに actor をスロットの窓口にする (clone したアクター用)"""
+        actor._store = self
+        actor._slot = slot
+
+    def _grow(self, capacity):
+        self._owned = set(self.COLUMNS)
+        for name, (dtype, shape, fill) in self.COLUMNS.items():
+            array = np.full((capacity,) + shape, fill, dtype=dtype)
+            array[:self.capacity] = self._arrays[name]
+            self._arrays[name] = array
+            ticking = np.zeros(capacity, dtype=bool)
+            ticking[:self.capacity] = self._ticking[name]
+            self._ticking[name] = ticking
+        self.capacity = capacity
+
+    def column(self, name, write=False):
+        """使用中の行だけの列のビュー。書き込むなら write=True で受け取る"""
+        array = self._writable(name) if write else self._arrays[name]
+        return array[:len(self.ids)]
+
+    def get(self, name, slot):
+        value = self._arrays[name][slot]
+        if name in self.POSITIONS:
+            y, x = value.tolist()
+            return None if y == NO_POS else (y, x)
+        if name == "role":
+            return self.roles[value] if value >= 0 else None
+        return value.item()
+
+    def set(self, name, slot, value):
+        if name in self.POSITIONS:
+            value = (NO_POS, NO_POS) if value is None else (int(value[0]), int(value[1]))
+        elif name == "role":
+            value = self._role_code(value)
+        self._writable(name)[slot] = value
+
+    def _role_code(self, role):
+        if role is None:
+            return -1
+        code = self._role_codes.get(role)
+        if code is None:
+            self._own_rows()
+            code = self._role_codes[role] = len(self.roles)
+            self.roles.append(role)
+        return code
+
+    def tick(self):
+        """tick_fields に宣言された残りターンを全アクター分まとめて1つ減らす"""
+        n = len(self.ids)
+        for name, ticking in self._ticking.items():
+            mask = ticking[:n]
+            if not mask.any():
+                continue
+            mask = mask & (self._arrays[name][:n] > 0)
+            if mask.any():
+                self._writable(name)[:n][mask] -= 1
+
+    def in_field(self):
+        """生存かつ未脱出の行"""
+        return self.column("alive") & ~self.column("escaped")
+
+class ForkedActors(Mapping):
+    """
+    fork した WorldState の actor_data。元のアクターを最初に引かれた時に clone し、
+    分岐側のストアのスロットに結び付ける。fork 元も同じく包み直すので、元のアクターは
+    fork 以降書き換えられず、どちらの側も分岐点の状態から clone できる。
+    """
+
+    def __init__(self, source, store):
+        self._source = source
+        self._store = store
+        self._clones = {}
+
+    def __getitem__(self, a_id):
+        actor = self._clones.get(a_id)
+        if actor is None:
+            actor = self._peek(self._source, a_id).clone(self._store)
+            self._clones[a_id] = actor
+        return actor
+
+    @staticmethod
+    def _peek(actors, a_id):
+        # 入れ子の ForkedActors からは、新たに clone せずに今あるアクターを取り出す
+        while isinstance(actors, ForkedActors):
+            if a_id in actors._clones:
+                return actors._clones[a_id]
+            actors = actors._source
+        return actors[a_id]
+
+    def __iter__(self):
+        return iter(self._source)
+
+    def __len__(self):
+        return len(self._source)
+
+    def __contains__(self, a_id):
+        return a_id in self._source
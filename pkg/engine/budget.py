@@ -0,0 +1,129 @@
+import contextvars
+import threading
+import time
+from pkg.utils.profiler import PROFILER
+
+_CURRENT = contextvars.ContextVar("decision_budget", default=None)
+_STAT_KEYS = ("decisions", "exhausted", "overruns", "nodes")
+
+def current_budget():
+    """いま走っている decide の DecisionBudget。予算なしで呼ばれていれば None"""
+    return _CURRENT.get()
+
+class DecisionBudget:
+    """
+    1回の decide に与える予算。seconds (壁時計) と nodes (探索で調べた数) のどちらか・両方で決める。
+    探索する振る舞いは途中で spend を呼び、True が返ったらそこまでの最良の答えを返す。
+    A* も Oracle のセル評価も同じ予算から使うので、1回の decide 全体で上限が効く。
+    """
+
+    __slots__ = ("seconds", "nodes", "start", "deadline", "used", "exhausted")
+
+    def __init__(self, seconds=None, nodes=None):
+        self.seconds = seconds
+        self.nodes = nodes
+        self.start = time.perf_counter()
+        self.deadline = self.start + seconds if seconds is not None else None
+        self.used = 0
+        self.exhausted = False
+
+    def spend(self, n=1):
+        """n 個分を使い、予算が尽きていれば True"""
+        self.used += n
+        if not self.exhausted:
+            if self.nodes is not None and self.used >= self.nodes:
+                self.exhausted = True
+            elif self.deadline is not None and time.perf_counter() >= self.deadline:
+                self.exhausted = True
+        return self.exhausted
+
+class DecisionBudgets:
+    """
+    アクタークラスごとの予算の決まりと、その使われ方の集計。設定は budget 節:
+
+        budget:
+          enabled: true
+          default_ms: 5.0        # クラスの指定がなければこれ
+          default_nodes: null
+          classes:
+            Oracle: {ms: 3.0, nodes: 20000}
+
+    ms は時間で打ち切るので結果が実行環境に依る。再現が要る実行では nodes だけを使うこと。
+    nodes は実際に調べた数で、経路キャッシュに当たった探索は使わない (process モードではワーカーごとのキャッシュに依る)。
+    集計はクラスごとに、予算を使い切って打ち切った回数 (exhausted) と、
+    打ち切っても ms を超えた回数 (overruns) を持つ。
+    """
+
+    def __init__(self, default_ms=None, default_nodes=None, classes=None):
+        self.default = (default_ms, default_nodes)
+        self.classes = {name: (spec.get("ms"), spec.get("nodes")) for name, spec in (classes or {}).items()}
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """budget.enabled が偽なら None"""
+        section = config.get("budget") or {}
+        if not section.get("enabled"):
+            return None
+        return cls(section.get("default_ms"), section.get("default_nodes"), section.get("classes"))
+
+    def __getstate__(self):
+        # ワーカープロセスへは決まりだけを渡し、集計は戻り値で受け取る
+        return {"default": self.default, "classes": self.classes}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def allot(self, actor):
+        ms, nodes = self.classes.get(type(actor).__name__, self.default)
+        if ms is None and nodes is None:
+            return None
+        return DecisionBudget(ms / 1000 if ms is not None else None, nodes)
+
+    def call(self, actor, view):
+        """予算を与えて actor.decide(view) を呼ぶ"""
+        budget = self.allot(actor)
+        if budget is None:
+            return actor.decide(view)
+        token = _CURRENT.set(budget)
+        try:
+            return actor.decide(view)
+        finally:
+            _CURRENT.reset(token)
+            self._record(type(actor).__name__, budget, time.perf_counter() - budget.start)
+
+    def _record(self, name, budget, elapsed):
+        overrun = budget.seconds is not None and elapsed > budget.seconds
+        with self._lock:
+            s = self._entry(name)
+            s["decisions"] += 1
+            s["exhausted"] += budget.exhausted
+            s["overruns"] += overrun
+            s["nodes"] += budget.used
+            s["max_ms"] = max(s["max_ms"], elapsed * 1000)
+        if PROFILER.enabled:
+            if budget.exhausted:
+                PROFILER.count(f"budget_exhausted.{name}")
+            if overrun:
+                PROFILER.count(f"budget_overrun.{name}")
+
+    def merge(self, stats):
+        """別プロセスで集計した分を足し込む"""
+        with self._lock:
+            for name, other in stats.items():
+                s = self._entry(name)
+                for key in _STAT_KEYS:
+                    s[key] += other[key]
+                s["max_ms"] = max(s["max_ms"], other["max_ms"])
+
+    def _entry(self, name):
+        s = self.stats.get(name)
+        if s is None:
+            s = self.stats[name] = {**dict.fromkeys(_STAT_KEYS, 0), "max_ms": 0.0}
+        return s
+
+    def report(self):
+        return {name: dict(s) for name, s in sorted(self.stats.items())}
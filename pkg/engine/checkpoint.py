@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+import importlib
+import os
+import pickle
+import zlib
+from pathlib import Path
+from pkg.engine.state import WorldState
+
+MAGIC = b"TAGCKPT\x01"
+
+def _shared_classes(state):
+    # クラス共有の状態を持つアクタークラス (鬼の共有記憶など)
+    return {type(a) for a in state.actor_data.values() if hasattr(type(a), "snapshot_shared")}
+
+def _class_path(cls):
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+def _import_class(path):
+    module, name = path.split(":")
+    return getattr(importlib.import_module(module), name)
+
+class Checkpointer:
+    """
+    SimulationCore の状態を interval ターンごとに directory へ書き出す。
+    呼び出し時には WorldState.fork と学習済みプランナーの複製だけを行い、
+    アクターの複製・pickle・圧縮・書き込みは背景スレッドで行うのでループは止まらない。
+    fork の後に壁を書き換える時は WorldState.edit_grid を通すこと (背景で読んでいるグリッドを守るため)。
+    ファイルは一時ファイルに書いてから置き換え、新しいものから keep 個だけ残す。
+    """
+
+    SUFFIX = ".ckpt"
+
+    def __init__(self, directory, interval, keep=3, random_manager=None):
+        if interval < 1:
+            raise ValueError(f"checkpoint interval must be positive: {interval}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+        self.keep = keep
+        self.random_manager = random_manager
+        self._writer = ThreadPoolExecutor(1)
+        self._pending = []
+
+    def due(self, turn):
+        return turn > 0 and turn % self.interval == 0
+
+    def save(self, core):
+        """今の状態を控え、書き込みを背景スレッドに任せる。戻り値は保存先の Path を返す Future"""
+        state = core.state
+        twin = state.fork()
+        # 学習した h は毎ターン書き換わるので、ここで複製しておく
+        twin.planners = state.planners.copy()
+        shared = {_class_path(cls): cls.snapshot_shared(portable=True) for cls in _shared_classes(state)}
+        rng = self.random_manager.get_state() if self.random_manager is not None else None
+        self._pending = [f for f in self._pending if not f.done()]
+        future = self._writer.submit(self._write, state.turn, twin, shared, rng)
+        self._pending.append(future)
+        return future
+
+    def _write(self, turn, twin, shared, rng):
+        payload = {"turn": turn, "state": twin.export_checkpoint(), "shared": shared, "random": rng}
+        data = MAGIC + zlib.compress(pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+        path = self.directory / f"turn_{turn:06}{self.SUFFIX}"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._prune()
+        return path
+
+    def _prune(self):
+        if self.keep is None:
+            return
+        for old in sorted(self.directory.glob(f"*{self.SUFFIX}"))[:-self.keep or None]:
+            old.unlink()
+
+    def wait(self):
+        """書きかけのチェックポイントを全て書き終えるまで待つ"""
+        for future in self._pending:
+            future.result()
+        self._pending = []
+
+    def close(self):
+        self.wait()
+        self._writer.shutdown()
+
+    @classmethod
+    def latest(cls, directory, before=None):
+        """directory の一番新しいチェックポイント。before を渡せばそのターンより前のものに限る。なければ None"""
+        paths = sorted(Path(directory).glob(f"*{cls.SUFFIX}"))
+        if before is not None:
+            paths = [p for p in paths if p.name < f"turn_{before:06}"]
+        return paths[-1] if paths else None
+
+def load_checkpoint(path, config, random_manager=None):
+    """
+    チェックポイントから WorldState を作り直し、クラス共有の状態と
+    (random_manager を渡せば) グローバルな乱数の状態も保存時点に戻す
+    """
+    data = Path(path).read_bytes()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"Not a checkpoint file: {path}")
+    payload = pickle.loads(zlib.decompress(data[len(MAGIC):]))
+    for cls_path, snapshot in payload["shared"].items():
+        _import_class(cls_path).restore_shared(snapshot)
+    if random_manager is not None and payload["random"] is not None:
+        random_manager.set_state(payload["random"])
+    return WorldState.from_checkpoint(payload["state"], config)
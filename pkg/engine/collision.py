@@ -0,0 +1,53 @@
+import numpy as np
+
+def pad_paths(paths, width):
+    """経路のリストを (N, width, 2) の int 配列にする。短い経路は終点を繰り返して埋める"""
+    cells = np.empty((len(paths), width, 2), dtype=np.int64)
+    lengths = np.empty(len(paths), dtype=np.int64)
+    for i, path in enumerate(paths):
+        arr = np.asarray(path, dtype=np.int64).reshape(-1, 2)
+        cells[i, :len(arr)] = arr
+        cells[i, len(arr):] = arr[-1]
+        lengths[i] = len(arr)
+    return cells, lengths
+
+def find_contacts(h_cells, h_len, o_cells, o_len):
+    """
+    人間 × 鬼の全組の接触候補を一度に求める。
+    end[h, o] は終点が同じ組、cross[h, o] は終点が違い2セル以上を共有する組 (すれ違いを含む)。
+    先頭に世界などの軸を足した (..., N, width, 2) を渡せば、その軸ごとに組を作る。
+    """
+    width = h_cells.shape[-2]
+    eq = (h_cells[..., :, None, :, None, :] == o_cells[..., None, :, None, :, :]).all(axis=-1)
+    # 共有セル数は集合の積の要素数なので、人間側の経路で初めて出てくるセルだけを数える
+    same = (h_cells[..., :, :, None, :] == h_cells[..., :, None, :, :]).all(axis=-1)
+    earlier = np.tri(width, k=-1, dtype=bool)
+    first = ~(same & earlier).any(axis=-1) & (np.arange(width) < h_len[..., None])
+    shared = (eq.any(axis=-1) & first[..., :, None, :]).sum(axis=-1)
+    end = (h_cells[..., :, None, -1, :] == o_cells[..., None, :, -1, :]).all(axis=-1)
+    return end, ~end & (shared > 1)
+
+def first_contacts(h_cells, h_len, o_cells, o_len, start_los, step_los):
+    """
+    各人間が捕まる鬼の添字 (鬼は o_cells の順に調べる)。捕まらなければ -1。
+    終点が同じ組は移動前の位置どうしの視線、交差した組は同じ歩数目の位置どうしの
+    視線がどこかで通れば接触とする。start_los(h, o) は移動前の組の判定、
+    step_los(src, dst) は (N, 2) の組をまとめて判定する関数。
+    """
+    end, cross = find_contacts(h_cells, h_len, o_cells, o_len)
+    cand_h, cand_o = np.nonzero(end | cross)
+    if not len(cand_h):
+        return np.full(len(h_cells), -1)
+    seen = np.array([start_los(h, o) for h, o in zip(cand_h.tolist(), cand_o.tolist())], dtype=bool)
+    crossing = cross[cand_h, cand_o]
+    steps = np.minimum(h_len[cand_h], o_len[cand_o])
+    # 2歩目以降の視線は交差した組の分だけ一括で判定する
+    rows, ks = np.nonzero(crossing[:, None] & (np.arange(1, h_cells.shape[1]) < steps[:, None]))
+    if len(rows):
+        ks = ks + 1
+        later = np.zeros(len(cand_h), dtype=bool)
+        np.logical_or.at(later, rows, step_los(h_cells[cand_h[rows], ks], o_cells[cand_o[rows], ks]))
+        seen |= crossing & later
+    hit = np.zeros(end.shape, dtype=bool)
+    hit[cand_h, cand_o] = seen
+    return np.where(hit.any(axis=1), hit.argmax(axis=1), -1)
@@ -1,39 +1,241 @@
+from collections import namedtuple
 import numpy as np
+from pkg.engine.budget import DecisionBudgets
+from pkg.engine.checkpoint import Checkpointer, load_checkpoint
 from pkg.engine.mediator import InformationMediator
+from pkg.engine.executor import StepExecutor
 from pkg.engine.resolver import ActionResolver
+from pkg.engine.nexthop import NextHopTable
+from pkg.engine.path_cache import PATH_CACHE, grid_version
+from pkg.engine.visibility import VisibilityIndex
+from pkg.utils.profiler import PROFILER
+from pkg.utils.random_manager import RandomManager
+
+# headless の step が返す1ターン分。スナップショットは作らず、既にある dict をそのまま渡す
+TurnRecord = namedtuple("TurnRecord", ("turn", "intents", "actions", "is_terminal", "termination_reason"))
 
 class SimulationCore:
-    def __init__(self, state, config, learning_cfg):
+    """
+    world.headless が真なら step は export_step_result を作らずに TurnRecord を返す。
+    最終結果だけが要るバッチ実行向けで、run_headless は描画もログもせずに最終報告だけを返す。
+    スループットの目安は既定設定 (25x25・人間7/Oracle 1/鬼3・executor serial) で 1コアあたり 30 turns/sec 以上。
+    benchmarks/bench_headless.py では約 40-45 turns/sec で、1ターンの大半は decide (特に Oracle のセル評価) なので
+    headless でもほとんど速くならない。
+    world.profile が真なら PROFILER に区間ごとの時間を積む (視界の中身は遅延で組むので decide 側に入る)。
+    """
+
+    def __init__(self, state, config, learning_cfg, random_manager=None):
         self.state = state
         self.config = config
         self.learning_cfg = learning_cfg
         self.mediator = InformationMediator(config)
         self.resolver = ActionResolver(config)
+        # 動いている間は、このコアの次の一歩表と視線表を PATH_CACHE から捨てさせない
+        PATH_CACHE.retain()
+        self._retained = True
+        self._prepare_next_hop_table(state.grid)
+        self._prepare_visibility(state.grid)
+        world = config["world"]
+        self.budgets = DecisionBudgets.from_config(config)
+        self.executor = StepExecutor(world.get("executor", "serial"), world.get("executor_workers"), self.budgets)
+        self.executor.bind(state.grid)
+        self._grid_version = state.grid.version
+        # 分岐用のコアは親の視線表を借りているので、直す前に自分の分を複製する
+        self._visibility_owned = True
+        self.headless = world.get("headless", False)
+        self.random_manager = random_manager or RandomManager()
+        self.checkpointer = None
+        if world.get("checkpoint_dir"):
+            self.checkpointer = Checkpointer(
+                world["checkpoint_dir"], world.get("checkpoint_interval", 50),
+                world.get("checkpoint_keep", 3), self.random_manager,
+            )
+        if world.get("profile"):
+            PROFILER.enable(world.get("profile_window"), world.get("profile_slowest"))
+
+    @classmethod
+    def resume(cls, path, config, learning_cfg, random_manager=None):
+        """チェックポイントから再開する。乱数とクラス共有の状態も保存時点に戻る"""
+        random_manager = random_manager or RandomManager()
+        state = load_checkpoint(path, config, random_manager)
+        return cls(state, config, learning_cfg, random_manager)
+
+    def _prepare_next_hop_table(self, grid):
+        world = self.config["world"]
+        mode = world.get("nexthop_table", False)
+        if not mode:
+            return
+        max_cells = world.get("nexthop_max_cells", NextHopTable.DEFAULT_MAX_CELLS)
+        if mode == "auto" and not NextHopTable.fits(grid, max_cells):
+            return
+        table = NextHopTable.load_or_build(grid, cache_dir=world.get("nexthop_cache_dir"))
+        PATH_CACHE.attach_table(grid_version(grid), table)
+
+    def _prepare_visibility(self, grid):
+        world = self.config["world"]
+        if not world.get("visibility_index", False):
+            return
+        # 視界の最大半径まで表に持つ。それより遠い組は都度 Bresenham で判定する
+        radius = max(e.get("vision_range", 0) for e in self.config["entities"].values() if isinstance(e, dict))
+        index = VisibilityIndex.load_or_build(grid, radius, cache_dir=world.get("visibility_cache_dir"))
+        self.mediator.visibility = index
+        PATH_CACHE.attach_visibility(grid_version(grid), index)
+
+    def _sync_grid(self):
+        # 壁や扉が変わったら、変わった矩形の周りだけ視線表を直して新しい版に付け替える
+        grid = self.state.grid
+        if grid.version == self._grid_version:
+            return
+        self._grid_version = grid.version
+        self.state.actor_visibility = None
+        index = self.mediator.visibility
+        if index is not None and not self._visibility_owned:
+            index = self.mediator.visibility = index.copy()
+            self._visibility_owned = True
+        if index is not None and index.sync(grid):
+            PATH_CACHE.attach_visibility(grid_version(grid), index)
+        self._prepare_next_hop_table(grid)
+        self.executor.bind(grid)
 
     def step(self):
+        profiling = PROFILER.enabled
+        if profiling:
+            turn = self.state.turn + 1
+            PROFILER.begin_turn(turn, lambda: self._repro_context(turn))
+        self._sync_grid()
+        store = self.state.store
         active_actors = {
-            a_id: actor for a_id, actor in self.state.actor_data.items() 
-            if actor.alive and not actor.escaped
+            a_id: self.state.actor_data[a_id]
+            for a_id, in_field in zip(store.ids, store.in_field().tolist()) if in_field
         }
+        PROFILER.lap("sync")
 
-        views = self.mediator.get_local_views(self.state)
+        views = self.executor.build_views(self.mediator, self.state)
+        PROFILER.lap("views")
         
-        intents = {
-            a_id: actor.decide(views[a_id]) 
-            for a_id, actor in active_actors.items()
-        }
+        intents = self.executor.decide(active_actors, views)
+        PROFILER.lap("decide")
         
         resolved_actions = self.resolver.resolve(intents, self.state)
+        PROFILER.lap("resolve")
         
         self.state.apply(resolved_actions)
+        PROFILER.lap("apply")
 
         if self.learning_cfg.get("meta_strategy", {}).get("enable_feedback_loop"):
             self.mediator.inject_learning(self.state, resolved_actions)
+            PROFILER.lap("learning")
+
+        if self.checkpointer is not None and self.checkpointer.due(self.state.turn):
+            self.checkpointer.save(self)
+            PROFILER.lap("checkpoint")
 
-        return self.state.export_step_result(intents, resolved_actions)
+        if self.headless:
+            state = self.state
+            result = TurnRecord(state.turn, intents, resolved_actions, state.is_terminal, state.termination_reason)
+        else:
+            result = self.state.export_step_result(intents, resolved_actions)
+        if profiling:
+            PROFILER.lap("export")
+            PROFILER.end_turn()
+        return result
+
+    def get_snapshot(self):
+        """今の全アクターの get_public_status"""
+        state = self.state
+        return {a_id: state.actor_data[a_id].get_public_status() for a_id in state.store.ids}
+
+    def _repro_context(self, turn):
+        # 遅いターンを再現するのに要るもの: 種・ターン開始時の乱数状態・そこから再開できるチェックポイント。
+        # 遅いターンに選ばれた時だけターンの終わりに呼ばれる。グローバルな乱数はターン中に進まない
+        # (アクターは各自の Generator を持つ) ので、ここで取っても開始時と同じ状態になる
+        checkpoint = None
+        if self.checkpointer is not None:
+            checkpoint = Checkpointer.latest(self.checkpointer.directory, before=turn)
+        return {
+            "seed": self.random_manager.seed,
+            "world_seed": self.config["world"].get("seed"),
+            "random_state": self.random_manager.get_state(),
+            "checkpoint": str(checkpoint) if checkpoint is not None else None,
+        }
+
+    def run_headless(self, evaluator=None):
+        """終了まで回して evaluator の最終報告を返す。evaluator がなければ状態の要約を返す"""
+        headless, self.headless = self.headless, True
+        try:
+            while not self.state.is_terminal:
+                record = self.step()
+                if evaluator is not None:
+                    evaluator.record_step(record, self.state)
+        finally:
+            self.headless = headless
+            self.close()
+        if evaluator is None:
+            return self.state.get_summary()
+        return evaluator.generate_final_report(self.state)
 
     def run(self):
         results = []
-        while not self.state.is_terminal:
-            results.append(self.step())
+        try:
+            while not self.state.is_terminal:
+                results.append(self.step())
+        finally:
+            self.close()
         return results
+
+    def run_branches(self, n, max_turns=None, prepare=None):
+        """
+        今の状態から n 本の分岐を順に走らせ、分岐ごとの step の結果のリストを返す。
+        分岐は WorldState.fork で作るので、分岐点までの状態はコピーせずに共有する。
+        prepare(i, state) で分岐ごとに状態を書き換えられる。max_turns は分岐点からのターン数の上限。
+        鬼のクラス共有の記憶は分岐ごとに分岐点の内容へ戻し、最後に元に戻す。
+        """
+        shared = {
+            cls: cls.snapshot_shared()
+            for cls in {type(a) for a in self.state.actor_data.values()}
+            if hasattr(cls, "snapshot_shared")
+        }
+        branches = []
+        try:
+            for i in range(n):
+                for cls, snapshot in shared.items():
+                    cls.restore_shared(snapshot)
+                state = self.state.fork()
+                if prepare is not None:
+                    prepare(i, state)
+                core = self._branch(state)
+                results = []
+                while not state.is_terminal and (max_turns is None or len(results) < max_turns):
+                    results.append(core.step())
+                branches.append(results)
+        finally:
+            for cls, snapshot in shared.items():
+                cls.restore_shared(snapshot)
+        return branches
+
+    def _branch(self, state):
+        # 設定と視線表・次の一歩表は親と共有し、ターンごとに状態を持つ部品だけ作り直す
+        core = object.__new__(SimulationCore)
+        core.state = state
+        core.config = self.config
+        core.learning_cfg = self.learning_cfg
+        core.mediator = InformationMediator(self.config)
+        core.mediator.visibility = self.mediator.visibility
+        core.resolver = ActionResolver(self.config)
+        core.budgets = self.budgets
+        core.executor = StepExecutor("serial", budgets=self.budgets)
+        core._grid_version = self._grid_version
+        core._visibility_owned = self.mediator.visibility is None
+        core.headless = self.headless
+        core.random_manager = self.random_manager
+        core.checkpointer = None
+        core._retained = False
+        return core
+
+    def close(self):
+        if self._retained:
+            PATH_CACHE.release()
+            self._retained = False
+        self.executor.close()
+        if self.checkpointer is not None:
+            self.checkpointer.close()
@@ -0,0 +1,137 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from pkg.engine.path_cache import PATH_CACHE, grid_version
+from pkg.utils.profiler import PROFILER
+
+class SharedGrid:
+    """グリッドを共有メモリに置き、ワーカープロセスへは名前と形だけを渡す"""
+
+    def __init__(self, grid):
+        self._shm = shared_memory.SharedMemory(create=True, size=max(grid.nbytes, 1))
+        self.array = np.ndarray(grid.shape, dtype=grid.dtype, buffer=self._shm.buf)
+        self.array[...] = grid
+        self.handle = (self._shm.name, grid.shape, grid.dtype.str)
+
+    def close(self):
+        self.array = None
+        self._shm.close()
+        self._shm.unlink()
+
+_worker_grid = None
+
+def _init_worker(handle, table, visibility):
+    # ワーカー側でも同じ次の一歩表と視線表を使わないと、直列実行と結果が変わる
+    global _worker_grid
+    name, shape, dtype = handle
+    shm = shared_memory.SharedMemory(name=name)
+    _worker_grid = (shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+    version = grid_version(_worker_grid[1])
+    if table is not None:
+        PATH_CACHE.attach_table(version, table)
+    if visibility is not None:
+        PATH_CACHE.attach_visibility(version, visibility)
+
+def _decide_remote(actor, view, budgets=None):
+    view.memory["grid_map"] = _worker_grid[1]
+    with PATH_CACHE.phase() as record:
+        intent = _decide(actor, view, budgets)
+    # decide で書き換わったアクターの状態と経路キャッシュへの登録・予算の集計を返し、親プロセス側に反映する
+    state = {k: v for k, v in actor.__dict__.items() if k != "config"}
+    return intent, state, record, budgets.stats if budgets is not None else None
+
+def _decide(actor, view, budgets=None):
+    if budgets is None:
+        return actor.decide(view)
+    return budgets.call(actor, view)
+
+def _decide_timed(actor, view, budgets=None):
+    return PROFILER.call(f"decide.{type(actor).__name__}", _decide, actor, view, budgets)
+
+class StepExecutor:
+    """
+    SimulationCore.step の視界構築と意思決定を回す。mode は "serial" / "thread" / "process"。
+    ordered_decision のアクター(クラス共有の状態を書き換える鬼)はメインスレッドで actor 順に
+    1体ずつ決め、その他を並行に決める。意図は常に actor_data の順で返すので直列と同じ結果になる。
+    budgets (DecisionBudgets) を渡せば、各 decide をアクタークラスごとの予算の下で呼ぶ。
+    """
+
+    MODES = ("serial", "thread", "process")
+
+    def __init__(self, mode="serial", max_workers=None, budgets=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown executor mode: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers
+        self.budgets = budgets
+        self._threads = ThreadPoolExecutor(max_workers) if mode != "serial" else None
+        self._processes = None
+        self._shared = None
+
+    def bind(self, grid):
+        """process モードで使う共有グリッドとワーカーを用意する"""
+        if self.mode != "process":
+            return
+        self.close_processes()
+        self._shared = SharedGrid(grid)
+        version = grid_version(grid)
+        self._processes = ProcessPoolExecutor(
+            self.max_workers,
+            initializer=_init_worker,
+            initargs=(self._shared.handle, PATH_CACHE.table(version), PATH_CACHE.visibility(version)),
+        )
+
+    def build_views(self, mediator, state):
+        if self._threads is None:
+            return mediator.get_local_views(state)
+        return mediator.get_local_views(state, map_fn=self._threads.map)
+
+    def decide(self, actors, views):
+        """actors: {a_id: actor}。戻り値は actors と同じ順の {a_id: intent}"""
+        decide = _decide_timed if PROFILER.enabled else _decide
+        budgets = self.budgets
+        with PATH_CACHE.phase():
+            if self.mode == "serial":
+                return {a_id: decide(actor, views[a_id], budgets) for a_id, actor in actors.items()}
+
+            ordered = [a_id for a_id, actor in actors.items() if actor.ordered_decision]
+            pending = {
+                a_id: self._submit(actor, views[a_id], decide)
+                for a_id, actor in actors.items() if not actor.ordered_decision
+            }
+            intents = {a_id: decide(actors[a_id], views[a_id], budgets) for a_id in ordered}
+            for a_id, future in pending.items():
+                if self.mode == "process":
+                    intent, state, record, stats = future.result()
+                    if stats:
+                        budgets.merge(stats)
+                    # 列に置かれた属性もあるので __dict__ ではなく setattr で戻す
+                    for name, value in state.items():
+                        setattr(actors[a_id], name, value)
+                    PATH_CACHE.absorb(record)
+                    intents[a_id] = intent
+                else:
+                    intents[a_id] = future.result()
+        return {a_id: intents[a_id] for a_id in actors}
+
+    def _submit(self, actor, view, decide=None):
+        if self.mode == "thread":
+            return self._threads.submit(decide or _decide, actor, view, self.budgets)
+        # グリッドは共有メモリ側を使い、プロセス内でしか意味を持たないプランナーは送らない
+        return self._processes.submit(
+            _decide_remote, actor, view.freeze(drop=("grid_map", "planner")), self.budgets
+        )
+
+    def close_processes(self):
+        if self._processes is not None:
+            self._processes.shutdown()
+            self._processes = None
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+
+    def close(self):
+        self.close_processes()
+        if self._threads is not None:
+            self._threads.shutdown()
+            self._threads = None
@@ -0,0 +1,221 @@
+import hashlib
+import weakref
+import numpy as np
+
+class _Revision:
+    # 同じデータを見るビューどうしで共有する版数と変更記録
+    __slots__ = ("version", "log", "key")
+
+    def __init__(self, version=0):
+        self.version = version
+        self.log = []
+        self.key = None
+
+_getitem = np.ndarray.__getitem__
+# Grid.read_only で渡したビューの id から元の Grid を引く。ビューが消えれば外れる
+_SOURCES = {}
+
+class Grid(np.ndarray):
+    """
+    版数と変更矩形の記録を持つ2次元グリッド (0=床, 1=壁)。
+    書き込みで中身が変わるたびに version を1つ進め、(version, 矩形) を記録する。
+    キャッシュは覚えておいた版から changes_since で変わった矩形だけを直せばよい。
+    view() など同じ並びのビューは版数を共有する。切り出し (grid[y0:y1, x0:x1] や grid[y]) は
+    ただの np.ndarray で返すので、書き換えは Grid に対して添字付きで行うこと。
+    np.ndarray として取り出したビュー越しの書き込みは記録されない。
+    """
+
+    FLOOR = 0
+    WALL = 1
+    MAX_LOG = 256
+
+    def __new__(cls, width, height=None, dtype=int):
+        height = width if height is None else height
+        grid = np.zeros((height, width), dtype=dtype).view(cls)
+        grid._rev = _Revision()
+        return grid
+
+    @classmethod
+    def from_array(cls, array):
+        """既存の配列をコピーせずに Grid として包む"""
+        if isinstance(array, cls):
+            return array
+        array = np.asarray(array)
+        if array.ndim != 2:
+            raise ValueError(f"Grid must be 2-dimensional: {array.shape}")
+        grid = array.view(cls)
+        grid._rev = _Revision()
+        return grid
+
+    def __array_finalize__(self, obj):
+        rev = getattr(obj, "_rev", None)
+        # 同じ形のビューだけが元の版数を共有する。コピーや切り出しは別物として 0 版から
+        if rev is not None and self.base is not None and self.shape == obj.shape:
+            self._rev = rev
+        else:
+            self._rev = _Revision()
+
+    def __getitem__(self, key):
+        item = _getitem(self, key)
+        # 切り出しや反転は座標がずれて変更矩形を正しく記録できないので、ただの配列として渡す
+        if item.__class__ is Grid and (
+            item.shape != self.shape or item.strides != self.strides
+            or item.__array_interface__["data"][0] != self.__array_interface__["data"][0]
+        ):
+            return item.view(np.ndarray)
+        return item
+
+    def __array_wrap__(self, array, context=None, return_scalar=False):
+        # 比較や演算の結果はただの配列として返す
+        result = array.view(np.ndarray)
+        return result[()] if return_scalar else result
+
+    def __reduce__(self):
+        constructor, args, state = super().__reduce__()
+        return constructor, args, (state, self._rev.version)
+
+    def __setstate__(self, state):
+        state, version = state
+        super().__setstate__(state)
+        self._rev = _Revision(version)
+
+    @property
+    def version(self):
+        return self._rev.version
+
+    def __setitem__(self, key, value):
+        raw = self.view(np.ndarray)
+        before = raw[key].copy()
+        raw[key] = value
+        if np.array_equal(before, raw[key]):
+            return
+        rect = _key_rect(key, self.shape)
+        if rect is None:
+            # 添字から矩形を求められない形 (np.newaxis など) は書いたセルの印から求める
+            mark = np.zeros(self.shape, dtype=bool)
+            mark[key] = True
+            ys, xs = np.nonzero(mark)
+            rect = (int(ys.min()), int(xs.min()), int(ys.max()) + 1, int(xs.max()) + 1)
+        self._record(rect)
+
+    def set_cells(self, cells, value):
+        """cells の各セルを value にし、変わったセルを囲む矩形1つとして記録する"""
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 2)
+        raw = self.view(np.ndarray)
+        changed = cells[raw[cells[:, 0], cells[:, 1]] != value]
+        if not len(changed):
+            return
+        raw[changed[:, 0], changed[:, 1]] = value
+        lo, hi = changed.min(axis=0), changed.max(axis=0) + 1
+        self._record((int(lo[0]), int(lo[1]), int(hi[0]), int(hi[1])))
+
+    def _record(self, rect):
+        rev = self._rev
+        rev.version += 1
+        rev.key = None
+        rev.log.append((rev.version, rect))
+        if len(rev.log) > self.MAX_LOG:
+            del rev.log[0]
+
+    def changes_since(self, version):
+        """version より後に変わった矩形 (y0, x0, y1, x1) のリスト。記録が残っていなければ全体1つ"""
+        rev = self._rev
+        if version >= rev.version:
+            return []
+        if not rev.log or rev.log[0][0] > version + 1:
+            return [(0, 0) + self.shape]
+        return [rect for v, rect in rev.log if v > version]
+
+    def dirty_since(self, version):
+        """changes_since をまとめて囲む矩形。変化がなければ None"""
+        rects = self.changes_since(version)
+        if not rects:
+            return None
+        return (min(r[0] for r in rects), min(r[1] for r in rects),
+                max(r[2] for r in rects), max(r[3] for r in rects))
+
+    def fork(self):
+        """中身をコピーした別の Grid。版数と変更記録は引き継ぐので、版で追うキャッシュはそのまま使える"""
+        twin = Grid.from_array(np.array(self.view(np.ndarray)))
+        twin._rev.version = self._rev.version
+        twin._rev.log = list(self._rev.log)
+        twin._rev.key = self._rev.key
+        return twin
+
+    def read_only(self):
+        """
+        書き込めない np.ndarray のビュー。添字は Python の __getitem__ を通らないので Grid より速く読める。
+        読むだけの側 (アクターの decide) にはこれを渡す。版数と中身のハッシュは source_grid で元の Grid から引く
+        """
+        view = self.view(np.ndarray)
+        view.flags.writeable = False
+        key = id(view)
+        _SOURCES[key] = self
+        weakref.finalize(view, _SOURCES.pop, key, None)
+        return view
+
+    def content_key(self):
+        """中身のハッシュ。プロセスをまたいで安定で、版が変わるまで使い回す"""
+        rev = self._rev
+        if rev.key is None:
+            rev.key = content_key(self)
+        return rev.key
+
+def _axis_span(index, n):
+    # 1軸分の添字が触る範囲 [lo, hi)。触らなければ None
+    if isinstance(index, slice):
+        start, stop, step = index.indices(n)
+        count = len(range(start, stop, step))
+        if not count:
+            return None
+        last = start + step * (count - 1)
+        return (min(start, last), max(start, last) + 1)
+    if isinstance(index, (int, np.integer)):
+        i = int(index) % n
+        return (i, i + 1)
+    idx = np.asarray(index)
+    if idx.dtype == bool:
+        idx = np.flatnonzero(idx)
+    if not idx.size:
+        return None
+    idx = idx % n
+    return (int(idx.min()), int(idx.max()) + 1)
+
+def _key_rect(key, shape):
+    """grid[key] が触るセルを囲む矩形。書き込み前の全面の印を作らずに添字から求める"""
+    if not isinstance(key, tuple):
+        key = (key,)
+    ellipsis = [i for i, k in enumerate(key) if k is Ellipsis]
+    if len(ellipsis) > 1 or any(k is None for k in key):
+        return None
+    if ellipsis:
+        at = ellipsis[0]
+        key = key[:at] + (slice(None),) * (3 - len(key)) + key[at + 1:]
+    if len(key) == 1:
+        first = np.asarray(key[0]) if not isinstance(key[0], (slice, int, np.integer)) else None
+        if first is not None and first.dtype == bool and first.ndim == 2:
+            # 全面の真偽値の印
+            ys, xs = np.nonzero(first)
+            if not len(ys):
+                return None
+            return (int(ys.min()), int(xs.min()), int(ys.max()) + 1, int(xs.max()) + 1)
+        key = key + (slice(None),)
+    if len(key) != 2:
+        return None
+    rows, cols = _axis_span(key[0], shape[0]), _axis_span(key[1], shape[1])
+    if rows is None or cols is None:
+        return None
+    return (rows[0], cols[0], rows[1], cols[1])
+
+def source_grid(array):
+    """array が Grid ならそれ、Grid.read_only のビューなら元の Grid、どちらでもなければ None"""
+    if isinstance(array, Grid):
+        return array
+    return _SOURCES.get(id(array))
+
+def content_key(array):
+    return hashlib.blake2b(np.ascontiguousarray(array).tobytes(), digest_size=8).hexdigest()
+
+def expand_rect(rect, margin, shape):
+    y0, x0, y1, x1 = rect
+    return (max(0, y0 - margin), max(0, x0 - margin), min(shape[0], y1 + margin), min(shape[1], x1 + margin))
@@ -0,0 +1,230 @@
+import heapq
+from collections import OrderedDict
+import numpy as np
+from pkg.engine.pathfinder import Pathfinder
+from pkg.engine.search import DistanceField, GridSearch
+
+_GOAL = -1
+
+class SectorGraph:
+    """
+    HPA* の抽象グラフ。グリッドを cluster_size 四方のセクタに分け、隣接セクタ境界の
+    通行可能区間ごとに出入口を置く。セクタ内の出入口間コストは初めて触れた時に距離場で求める。
+    ノードはセル平坦インデックス、コストは DistanceField と同じ 1000/1414 単位。
+    """
+
+    ENTRANCE_SPLIT = 6
+
+    def __init__(self, grid, cluster_size=16, max_segments=4096):
+        if cluster_size < 2:
+            raise ValueError(f"cluster_size must be at least 2: {cluster_size}")
+        self.height, self.width = grid.shape
+        self.cluster_size = cluster_size
+        self.max_segments = max_segments
+        self._walk = (grid != 1).ravel().tolist()
+        self._walls = grid == 1
+        self._entrances = {}
+        self._links = {}
+        self._edges = {}
+        self._sectors = {}
+        self._segments = OrderedDict()
+        self._find_entrances()
+
+    def sector_of(self, idx):
+        y, x = divmod(idx, self.width)
+        return (y // self.cluster_size, x // self.cluster_size)
+
+    def _find_entrances(self):
+        cs = self.cluster_size
+        walk = ~self._walls
+        for axis in (0, 1):
+            w = walk if axis == 0 else walk.T
+            # 境界を挟んだ手前の行と向こうの行が両方空いている所が通行可能区間
+            both = w[cs - 1:-1:cs] & w[cs::cs]
+            if both.size == 0:
+                continue
+            cols = np.arange(both.shape[1])
+            head = both & ((cols % cs == 0) | ~np.roll(both, 1, axis=1))
+            tail = both & ((cols % cs == cs - 1) | (cols == cols[-1]) | ~np.roll(both, -1, axis=1))
+            for (b, a), (_, z) in zip(np.argwhere(head).tolist(), np.argwhere(tail).tolist()):
+                y = b * cs + cs - 1
+                # 短い区間は中央に1つ、長い区間は両端に出入口を置く
+                for x in ((a, z) if z - a + 1 >= self.ENTRANCE_SPLIT else ((a + z) // 2,)):
+                    if axis == 0:
+                        self._connect(y * self.width + x, (y + 1) * self.width + x)
+                    else:
+                        self._connect(x * self.width + y, x * self.width + y + 1)
+
+    def _connect(self, a, b):
+        for near, far in ((a, b), (b, a)):
+            entrances = self._entrances.setdefault(self.sector_of(near), [])
+            if near not in self._links:
+                entrances.append(near)
+            self._links.setdefault(near, []).append((far, 1000))
+
+    def _sector(self, sector):
+        # (GridSearch, DistanceField, 原点) をセクタごとに作り置きする
+        local = self._sectors.get(sector)
+        if local is None:
+            cs = self.cluster_size
+            y0, x0 = sector[0] * cs, sector[1] * cs
+            sub = self._walls[y0:y0 + cs, x0:x0 + cs].astype(np.int8)
+            local = (GridSearch(sub), DistanceField(sub), (y0, x0))
+            self._sectors[sector] = local
+        return local
+
+    def _costs_from(self, sector, sources):
+        """sources の各セルからセクタ内の出入口までのコスト表 (セクタ外には出ない)"""
+        _, field, (y0, x0) = self._sector(sector)
+        seeds = np.zeros((len(sources), field.height, field.width), dtype=bool)
+        for i, idx in enumerate(sources):
+            y, x = divmod(idx, self.width)
+            seeds[i, y - y0, x - x0] = True
+        dist = field.compute_units(seeds)
+        costs = []
+        for i in range(len(sources)):
+            row = {}
+            for e in self._entrances.get(sector, ()):
+                y, x = divmod(e, self.width)
+                d = int(dist[i, y - y0, x - x0])
+                if d < DistanceField.UNREACHABLE:
+                    row[e] = d
+            costs.append(row)
+        return costs
+
+    def _neighbours(self, idx):
+        # セクタ内の辺はセクタ単位でまとめて求め、セクタ間の辺と連結して持つ
+        edges = self._edges.get(idx)
+        if edges is None:
+            sector = self.sector_of(idx)
+            entrances = self._entrances.get(sector, [])
+            if entrances:
+                for e, row in zip(entrances, self._costs_from(sector, entrances)):
+                    self._edges[e] = [(f, c) for f, c in row.items() if f != e] + self._links[e]
+            edges = self._edges.setdefault(idx, [])
+        return edges
+
+    def find_path(self, start, goal, max_steps=None):
+        """startからgoalへのセル列(start含む)。max_steps を渡すと先頭その手数分だけ具体化する"""
+        if not (0 <= start[0] < self.height and 0 <= start[1] < self.width):
+            return None
+        if not (0 <= goal[0] < self.height and 0 <= goal[1] < self.width):
+            return None
+        s = int(start[0]) * self.width + int(start[1])
+        t = int(goal[0]) * self.width + int(goal[1])
+        if not self._walk[t]:
+            return None
+        found = self._abstract_route(s, t)
+        if self.sector_of(s) == self.sector_of(t):
+            # セクタの中だけを通る経路が、一度外へ出て回り込む経路より安いとは限らない
+            path = self._segment(s, t)
+            if path is not None and (found is None or self._path_cost(path) <= found[1]):
+                return path
+        if found is None:
+            return None
+        return self._refine(found[0], max_steps)
+
+    @staticmethod
+    def _path_cost(path):
+        return sum(1414 if a[0] != b[0] and a[1] != b[1] else 1000 for a, b in zip(path, path[1:]))
+
+    def _abstract_route(self, s, t):
+        """出入口を経由した (ノード列, コスト)。つながらなければ None"""
+        w = self.width
+        ty, tx = divmod(t, w)
+        out = self._costs_from(self.sector_of(s), [s])[0]
+        into = self._costs_from(self.sector_of(t), [t])[0]
+        if not out or not into:
+            return None
+
+        g_score, parent, closed = {}, {}, set()
+        oheap = []
+        for e, c in out.items():
+            g_score[e] = c
+            parent[e] = s
+            oheap.append((c, e))
+        heapq.heapify(oheap)
+        heappush, heappop, neighbours = heapq.heappush, heapq.heappop, self._neighbours
+        inf = float('inf')
+        while oheap:
+            _, cur = heappop(oheap)
+            if cur == _GOAL:
+                break
+            if cur in closed:
+                continue
+            closed.add(cur)
+            g = g_score[cur]
+            if cur in into and g + into[cur] < g_score.get(_GOAL, inf):
+                g_score[_GOAL] = g + into[cur]
+                parent[_GOAL] = cur
+                heappush(oheap, (g_score[_GOAL], _GOAL))
+            for nxt, c in neighbours(cur):
+                tg = g + c
+                if tg < g_score.get(nxt, inf) and nxt not in closed:
+                    g_score[nxt] = tg
+                    parent[nxt] = cur
+                    dy, dx = divmod(nxt, w)
+                    dy = dy - ty if dy > ty else ty - dy
+                    dx = dx - tx if dx > tx else tx - dx
+                    heappush(oheap, (tg + 1000 * (dy + dx) - 586 * (dx if dx < dy else dy), nxt))
+        if _GOAL not in parent:
+            return None
+
+        route = [t]
+        cur = parent[_GOAL]
+        while cur != s:
+            route.append(cur)
+            cur = parent[cur]
+        route.append(s)
+        route.reverse()
+        return route, g_score[_GOAL]
+
+    def _refine(self, route, max_steps):
+        path = [divmod(route[0], self.width)]
+        for a, b in zip(route, route[1:]):
+            if self.sector_of(a) != self.sector_of(b):
+                path.append(divmod(b, self.width))
+            else:
+                path.extend(self._segment(a, b)[1:])
+            if max_steps is not None and len(path) > max_steps:
+                break
+        return path
+
+    def _segment(self, a, b):
+        # セクタ内の具体経路。出入口間は何度も通るのでLRUで持つ
+        key = (a, b)
+        path = self._segments.get(key)
+        if path is not None:
+            self._segments.move_to_end(key)
+            return path
+        engine, _, (y0, x0) = self._sector(self.sector_of(a))
+        ay, ax = divmod(a, self.width)
+        by, bx = divmod(b, self.width)
+        local = engine.find_path((ay - y0, ax - x0), (by - y0, bx - x0))
+        if local is None:
+            return None
+        path = [(y + y0, x + x0) for y, x in local]
+        self._segments[key] = path
+        if len(self._segments) > self.max_segments:
+            self._segments.popitem(last=False)
+        return path
+
+class HierarchicalPathfinder(Pathfinder):
+    mode = "hpa"
+    engine_class = SectorGraph
+
+    def __init__(self, grid, cluster_size=16, refine_steps=8, cache=None):
+        super().__init__(grid, cache=cache)
+        self.cluster_size = cluster_size
+        self.refine_steps = refine_steps
+        self.engine_args = (cluster_size,)
+
+    def _astar(self, start, goal):
+        # 返す経路は先頭 refine_steps 手分だけ。呼び出し側は最初の数手しか使わない
+        s = (int(start[0]), int(start[1]))
+        g = (int(goal[0]), int(goal[1]))
+        key = (self.mode, self.cluster_size, self.refine_steps, self.version)
+        path = self.cache.lookup(key, s, g)
+        if path is None:
+            path = self.cache.store(key, s, g, self.engine.find_path(s, g, self.refine_steps))
+        return [start, *path[1:]] if path else [start]
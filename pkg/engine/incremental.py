@@ -0,0 +1,316 @@
+import heapq
+import numpy as np
+from pkg.engine.budget import current_budget
+from pkg.engine.search import BUDGET_STRIDE, DIRECTIONS, move_masks, spend_remainder, window_masks
+from pkg.utils.profiler import PROFILER
+
+class AdaptivePlanner:
+    """
+    目標が動く前提の Generalized Adaptive A*。探索ごとに展開したセルの h を
+    「経路長 - g」に更新して次の探索に持ち越し、目標が動いたら deltah で補正する。
+    blocked (一時的な壁) が外れた時は h の一貫性を逆向きの Dijkstra で修復する。
+    セルは壁1枚で囲んだ平坦インデックス、コストは 1000/1414 単位。
+    """
+
+    def __init__(self, grid):
+        self.height, self.width = grid.shape
+        self.pitch = self.width + 2
+        walk = np.zeros((self.height + 2, self.width + 2), dtype=bool)
+        walk[1:-1, 1:-1] = grid != 1
+        self._walk = walk.ravel().tolist()
+        size = walk.size
+        self._ys, self._xs = (a.ravel().tolist() for a in np.divmod(np.arange(size), self.pitch))
+        self._h = [0] * size
+        self._g = [0] * size
+        self._parent = [-1] * size
+        self._search = [0] * size
+        # 静的な壁だけで決まる移動表。blocked は展開時に除外する
+        masks = np.zeros(walk.shape, dtype=np.uint8)
+        masks[1:-1, 1:-1] = move_masks(grid)
+        p = self.pitch
+        table = [
+            tuple(
+                (dy * p + dx, 1414 if dy and dx else 1000, dy * p if dx else 0, dx if dy else 0)
+                for k, (dy, dx) in enumerate(DIRECTIONS) if m >> k & 1
+            )
+            for m in range(256)
+        ]
+        self._table = table
+        self._moves = [table[m] for m in masks.ravel().tolist()]
+        self._counter = 0
+        self._pathcost = [None]
+        self._deltah = [0]
+        self._goal = None
+        self._blocked = frozenset()
+        self.expanded = 0
+        self.truncated = False
+
+    def refresh(self, grid, rect):
+        """
+        rect 内の壁が変わった時に通行表と移動表を直す。壁が増えただけなら学習した h は
+        許容的なまま使えるが、壁が消えたセルがあれば過大になりうるので True を返す
+        """
+        p = self.pitch
+        y0, x0, y1, x1 = rect
+        opened = False
+        for y, row in zip(range(y0, y1), (grid[y0:y1, x0:x1] != 1).tolist()):
+            for x, walk in zip(range(x0, x1), row):
+                n = (y + 1) * p + x + 1
+                opened |= walk and not self._walk[n]
+                self._walk[n] = walk
+        (y0, x0, y1, x1), masks = window_masks(grid, rect)
+        for y, row in zip(range(y0, y1), masks.tolist()):
+            for x, m in zip(range(x0, x1), row):
+                self._moves[(y + 1) * p + x + 1] = self._table[m]
+        return opened
+
+    def copy(self):
+        """学習した h と探索の記録ごと複製する。書き換わらない移動表は共有する"""
+        twin = object.__new__(AdaptivePlanner)
+        twin.__dict__.update(self.__dict__)
+        for name in ("_walk", "_h", "_g", "_parent", "_search", "_moves", "_pathcost", "_deltah"):
+            setattr(twin, name, list(getattr(self, name)))
+        return twin
+
+    def _index(self, pos):
+        return (int(pos[0]) + 1) * self.pitch + int(pos[1]) + 1
+
+    def _octile(self, a, b):
+        dy = self._ys[a] - self._ys[b]
+        dx = self._xs[a] - self._xs[b]
+        dy, dx = abs(dy), abs(dx)
+        return 1000 * (dy + dx) - 586 * (dx if dx < dy else dy)
+
+    def _open(self, n):
+        return self._walk[n] and n not in self._blocked
+
+    def _successors(self, n):
+        blocked = self._blocked
+        for off, cost, vertical, horizontal in self._moves[n]:
+            m = n + off
+            if m in blocked or (vertical and (n + vertical in blocked or n + horizontal in blocked)):
+                continue
+            yield m, cost
+
+    def _initialize(self, n):
+        # 前回以前の探索で触れたセルの h を学習結果と目標移動の補正で更新する
+        stamp = self._search[n]
+        if stamp == self._counter:
+            return
+        if stamp:
+            cost = self._pathcost[stamp]
+            h = self._h[n]
+            if cost is not None and self._g[n] + h < cost:
+                h = cost - self._g[n]
+            h -= self._deltah[self._counter] - self._deltah[stamp]
+            self._h[n] = max(h, self._octile(n, self._goal))
+        else:
+            self._h[n] = self._octile(n, self._goal)
+        self._g[n] = float('inf')
+        self._search[n] = self._counter
+
+    def find_path(self, start, goal, blocked=()):
+        """
+        startからgoalまでのセル列(start含む)。blocked のセルは壁として扱う。到達不能ならNone。
+        decide の予算が尽きたら goal に一番近い開いたセルまでの経路を返す (truncated)。
+        その探索の経路長は記録しないので、学習した h は許容的なまま
+        """
+        self.truncated = False
+        if not (0 <= start[0] < self.height and 0 <= start[1] < self.width):
+            return None
+        if not (0 <= goal[0] < self.height and 0 <= goal[1] < self.width):
+            return None
+        s, t = self._index(start), self._index(goal)
+
+        if self._goal is None:
+            self._goal = t
+        if t != self._goal:
+            # 古い目標基準の h(新目標) だけ全セルの h を下げれば許容性が保たれる
+            self._initialize(t)
+            cost = self._pathcost[self._counter]
+            if cost is not None and self._g[t] + self._h[t] < cost:
+                self._h[t] = cost - self._g[t]
+            shift = self._h[t]
+        else:
+            shift = 0
+        self._deltah.append(self._deltah[-1] + shift)
+        self._pathcost.append(None)
+        self._counter += 1
+        self._goal = t
+
+        blocked = frozenset(self._index(p) for p in blocked)
+        freed = self._blocked - blocked
+        self._blocked = blocked
+        if freed:
+            self._repair(freed)
+
+        if not self._open(t):
+            return None
+        if PROFILER.enabled:
+            expanded = self.expanded
+            path = self._search_path(s, t)
+            PROFILER.count("astar_searches")
+            PROFILER.count("astar_expanded", self.expanded - expanded)
+            return path
+        return self._search_path(s, t)
+
+    def _search_path(self, s, t):
+        g, h, parent, search = self._g, self._h, self._parent, self._search
+        moves, blocked, ys, xs = self._moves, self._blocked, self._ys, self._xs
+        counter, pathcost, deltah = self._counter, self._pathcost, self._deltah
+        ty, tx = ys[t], xs[t]
+        heappush, heappop = heapq.heappush, heapq.heappop
+        self._initialize(s)
+        g[s] = 0
+        parent[s] = -1
+        # 同じ f なら g の大きい方を先に展開する
+        oheap = [(h[s], 0, s)]
+        closed = set()
+        expanded = 0
+        budget = current_budget()
+        while oheap:
+            _, _, cur = heappop(oheap)
+            if cur == t:
+                pathcost[counter] = g[t]
+                self.expanded += expanded
+                spend_remainder(budget, expanded)
+                return self._reconstruct(s, t)
+            if cur in closed:
+                continue
+            closed.add(cur)
+            expanded += 1
+            if budget is not None and not expanded % BUDGET_STRIDE and budget.spend(BUDGET_STRIDE):
+                self.expanded += expanded
+                self.truncated = True
+                return self._reconstruct(s, self._nearest_open(oheap, cur, t))
+            g_cur = g[cur]
+            for off, cost, vertical, horizontal in moves[cur]:
+                n = cur + off
+                if blocked and (n in blocked or (vertical and (cur + vertical in blocked or cur + horizontal in blocked))):
+                    continue
+                stamp = search[n]
+                if stamp != counter:
+                    # _initialize を展開したもの
+                    dy = ys[n] - ty
+                    dx = xs[n] - tx
+                    if dy < 0:
+                        dy = -dy
+                    if dx < 0:
+                        dx = -dx
+                    octile = 1000 * (dy + dx) - 586 * (dx if dx < dy else dy)
+                    if stamp:
+                        hn = h[n]
+                        c = pathcost[stamp]
+                        if c is not None and g[n] + hn < c:
+                            hn = c - g[n]
+                        hn -= deltah[counter] - deltah[stamp]
+                        h[n] = hn if hn > octile else octile
+                    else:
+                        h[n] = octile
+                    search[n] = counter
+                    g[n] = tg = g_cur + cost
+                    parent[n] = cur
+                    heappush(oheap, (tg + h[n], -tg, n))
+                    continue
+                tg = g_cur + cost
+                if tg < g[n]:
+                    g[n] = tg
+                    parent[n] = cur
+                    heappush(oheap, (tg + h[n], -tg, n))
+        self.expanded += expanded
+        spend_remainder(budget, expanded)
+        return None
+
+    def _nearest_open(self, oheap, cur, t):
+        # 打ち切った時の行き先。goal への octile 距離が最小 (同点なら f が小さい) のセル
+        best, best_key = cur, None
+        for f, _, n in [(0, 0, cur), *oheap]:
+            key = (self._octile(n, t), f)
+            if best_key is None or key < best_key:
+                best, best_key = n, key
+        return best
+
+    def _repair(self, freed):
+        # 壁が外れてコストが下がった辺の始点から h を下げ、先行セルへ伝播させる
+        h = self._h
+        touched = set()
+        for c in freed:
+            touched.add(c)
+            touched.update(m for m, _ in self._successors(c))
+        oheap = []
+        for n in touched:
+            if not self._open(n):
+                continue
+            self._initialize(n)
+            for m, cost in self._successors(n):
+                self._initialize(m)
+                if cost + h[m] < h[n]:
+                    h[n] = cost + h[m]
+            heapq.heappush(oheap, (h[n], n))
+        while oheap:
+            value, n = heapq.heappop(oheap)
+            if value != h[n]:
+                continue
+            for m, cost in self._successors(n):
+                self._initialize(m)
+                if cost + h[n] < h[m]:
+                    h[m] = cost + h[n]
+                    heapq.heappush(oheap, (h[m], m))
+
+    def _reconstruct(self, s, t):
+        p = self.pitch
+        path = []
+        cur = t
+        while cur != s:
+            y, x = divmod(cur, p)
+            path.append((y - 1, x - 1))
+            cur = self._parent[cur]
+        y, x = divmod(s, p)
+        path.append((y - 1, x - 1))
+        path.reverse()
+        return path
+
+class PlannerRegistry:
+    """actor id ごとの AdaptivePlanner。用途(channel)が違えば目標も違うので別々に持つ"""
+
+    def __init__(self, grid):
+        self.grid = grid
+        self._planners = {}
+        self._synced = getattr(grid, "version", 0)
+
+    def sync(self):
+        """グリッドの変更を各プランナーに反映する。壁が消えたプランナーは作り直す"""
+        rects = self.grid.changes_since(self._synced)
+        self._synced = self.grid.version
+        for key, planner in list(self._planners.items()):
+            opened = False
+            for rect in rects:
+                opened |= planner.refresh(self.grid, rect)
+            if opened:
+                del self._planners[key]
+
+    def get(self, a_id, channel="decide"):
+        if getattr(self.grid, "version", 0) != self._synced:
+            self.sync()
+        key = (a_id, channel)
+        planner = self._planners.get(key)
+        if planner is None:
+            planner = AdaptivePlanner(self.grid)
+            self._planners[key] = planner
+        return planner
+
+    def copy(self):
+        twin = PlannerRegistry(self.grid)
+        twin._synced = self._synced
+        twin._planners = {key: planner.copy() for key, planner in self._planners.items()}
+        return twin
+
+    def release(self, a_id):
+        for key in [k for k in self._planners if k[0] == a_id]:
+            del self._planners[key]
+
+    def clear(self):
+        self._planners.clear()
+
+    def __len__(self):
+        return len(self._planners)
@@ -0,0 +1,188 @@
+import heapq
+import numpy as np
+from pkg.engine.pathfinder import Pathfinder
+
+_ALL_DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+class JumpPointSearch:
+    """
+    角抜け禁止(斜め移動は縦横両方が空いている時のみ)版の Jump Point Search。
+    セルは壁1枚で囲んだ平坦インデックスで持ち、境界判定を省く。
+    """
+
+    def __init__(self, grid):
+        self.height, self.width = grid.shape
+        self.pitch = self.width + 2
+        walk = np.zeros((self.height + 2, self.width + 2), dtype=bool)
+        walk[1:-1, 1:-1] = grid != 1
+        self._walk = walk.ravel().tolist()
+        self._stops = self._straight_stops(walk)
+        self.expanded = 0
+
+    def _straight_stops(self, walk):
+        """直進ジャンプの停止点表: 各方向について、そのセル以降で最初に壁か強制近傍に当たる位置"""
+        p = self.pitch
+        flat = walk.ravel()
+        index = np.arange(flat.size)
+        stops = {}
+        for step, side in ((1, p), (-1, p), (p, 1), (-p, 1)):
+            forced = (np.roll(flat, -side) & ~np.roll(flat, step - side)) | \
+                     (np.roll(flat, side) & ~np.roll(flat, side + step))
+            stop = (~flat | forced).reshape(walk.shape)
+            idx = index.reshape(walk.shape)
+            axis = 1 if abs(step) == 1 else 0
+            if step > 0:
+                cand = np.flip(np.where(stop, idx, flat.size), axis=axis)
+                first = np.flip(np.minimum.accumulate(cand, axis=axis), axis=axis)
+            else:
+                first = np.maximum.accumulate(np.where(stop, idx, -1), axis=axis)
+            stops[step] = first.ravel().tolist()
+        return stops
+
+    def _index(self, pos):
+        return (int(pos[0]) + 1) * self.pitch + int(pos[1]) + 1
+
+    def _cell(self, idx):
+        y, x = divmod(idx, self.pitch)
+        return (y - 1, x - 1)
+
+    def find_path(self, start, goal):
+        """startからgoalまでのセル列(start含む)。到達不能ならNone"""
+        if not (0 <= start[0] < self.height and 0 <= start[1] < self.width):
+            return None
+        if not (0 <= goal[0] < self.height and 0 <= goal[1] < self.width):
+            return None
+        s, t = self._index(start), self._index(goal)
+        if not self._walk[t]:
+            return None
+
+        p = self.pitch
+        ty, tx = divmod(t, p)
+        g_score = {s: 0}
+        came_from = {}
+        closed = set()
+        oheap = [(0, s)]
+        expanded = 0
+        while oheap:
+            _, cur = heapq.heappop(oheap)
+            if cur == t:
+                self.expanded += expanded
+                return self._expand(start, s, t, came_from)
+            if cur in closed:
+                continue
+            closed.add(cur)
+            expanded += 1
+            cy, cx = divmod(cur, p)
+            for dy, dx in self._successor_dirs(cur, came_from.get(cur)):
+                jp = self._jump(cur + dy * p + dx, dy, dx, t)
+                if jp < 0 or jp in closed:
+                    continue
+                jy, jx = divmod(jp, p)
+                tg = g_score[cur] + _octile(abs(jy - cy), abs(jx - cx))
+                if tg < g_score.get(jp, float('inf')):
+                    g_score[jp] = tg
+                    came_from[jp] = cur
+                    heapq.heappush(oheap, (tg + _octile(abs(jy - ty), abs(jx - tx)), jp))
+        self.expanded += expanded
+        return None
+
+    def _successor_dirs(self, n, parent):
+        walk, p = self._walk, self.pitch
+        if parent is None:
+            return [
+                (dy, dx) for dy, dx in _ALL_DIRECTIONS
+                if walk[n + dy * p + dx] and (not (dy and dx) or (walk[n + dy * p] and walk[n + dx]))
+            ]
+        ny, nx = divmod(n, p)
+        py, px = divmod(parent, p)
+        dy = (ny > py) - (ny < py)
+        dx = (nx > px) - (nx < px)
+        dirs = []
+        if dy and dx:
+            vertical, horizontal = walk[n + dy * p], walk[n + dx]
+            if vertical:
+                dirs.append((dy, 0))
+            if horizontal:
+                dirs.append((0, dx))
+            if vertical and horizontal:
+                dirs.append((dy, dx))
+        elif dx:
+            ahead, up, down = walk[n + dx], walk[n - p], walk[n + p]
+            if ahead:
+                dirs.append((0, dx))
+                if up:
+                    dirs.append((-1, dx))
+                if down:
+                    dirs.append((1, dx))
+            if up:
+                dirs.append((-1, 0))
+            if down:
+                dirs.append((1, 0))
+        else:
+            ahead, left, right = walk[n + dy * p], walk[n - 1], walk[n + 1]
+            if ahead:
+                dirs.append((dy, 0))
+                if left:
+                    dirs.append((dy, -1))
+                if right:
+                    dirs.append((dy, 1))
+            if left:
+                dirs.append((0, -1))
+            if right:
+                dirs.append((0, 1))
+        return dirs
+
+    def _jump(self, n, dy, dx, goal):
+        walk, p = self._walk, self.pitch
+        if not (dy and dx):
+            return self._jump_straight(n, dy * p + dx, 1 if dy else p, goal)
+        step, vertical = dy * p + dx, dy * p
+        h_stops, v_stops = self._stops[dx], self._stops[vertical]
+        while True:
+            if not walk[n]:
+                return -1
+            if n == goal:
+                return n
+            # 横・縦の直進ジャンプ(_jump_straight を展開したもの)が何か見つければ n がジャンプ点
+            a, b = n + dx, n + vertical
+            m = h_stops[a]
+            if walk[m] or ((a <= goal <= m) if dx > 0 else (m <= goal <= a)):
+                return n
+            m = v_stops[b]
+            if walk[m] or ((b <= goal <= m) if dy > 0 else (m <= goal <= b)) and (goal - b) % p == 0:
+                return n
+            if not (walk[a] and walk[b]):
+                return -1
+            n += step
+
+    def _jump_straight(self, n, step, side, goal):
+        # 停止点(壁か強制近傍)までの間にゴールがあればゴールで止まる
+        m = self._stops[step][n]
+        lo, hi = (n, m) if step > 0 else (m, n)
+        if lo <= goal <= hi and (goal - n) % step == 0:
+            return goal
+        return m if self._walk[m] else -1
+
+    def _expand(self, start, s, t, came_from):
+        # ジャンプ点列を ActionResolver が path[:speed + 1] で切れるよう1マスずつに展開する
+        points = [t]
+        while points[-1] != s:
+            points.append(came_from[points[-1]])
+        points.reverse()
+        p = self.pitch
+        path = [start]
+        for a, b in zip(points, points[1:]):
+            ay, ax = divmod(a, p)
+            by, bx = divmod(b, p)
+            dy = (by > ay) - (by < ay)
+            dx = (bx > ax) - (bx < ax)
+            for i in range(1, max(abs(by - ay), abs(bx - ax)) + 1):
+                path.append((ay + dy * i - 1, ax + dx * i - 1))
+        return path
+
+def _octile(dy, dx):
+    return 1000 * (dy + dx) - 586 * (dx if dx < dy else dy)
+
+class JumpPointPathfinder(Pathfinder):
+    mode = "jps"
+    engine_class = JumpPointSearch
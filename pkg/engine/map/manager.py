@@ -1,13 +1,15 @@
 import numpy as np
 from typing import Dict, Tuple, Optional, Any, Set
 from pkg.schema.models import Element
+from pkg.engine.grid import Grid
 
 class MapManager:
     def __init__(self, config: Dict):
         self._size = config["world"]["grid_size"]
-        self.grid = np.zeros((self._size, self._size), dtype=int)
+        self.grid = Grid(self._size, self._size)
         self.elements: Dict[Tuple[int, int], Element] = {}
         self._walkable_cache: Set[Tuple[int, int]] = set()
+        self._synced = self.grid.version
 
     @property
     def shape(self) -> Tuple[int, int]:
@@ -20,12 +22,29 @@ class MapManager:
     def set_grid(self, grid: np.ndarray):
         if grid.shape != (self._size, self._size):
             raise ValueError("Grid shape mismatch")
-        self.grid = grid.astype(int)
+        if grid is self.grid:
+            self._sync_walkable()
+            return
+        # int の Grid ならそのまま持ち、以降の書き換えは版数から差分で追う
+        self.grid = grid if isinstance(grid, Grid) and grid.dtype == int else Grid.from_array(grid.astype(int))
         self._walkable_cache = {
             (int(y), int(x)) for y, x in zip(*np.where(self.grid == 0))
         }
+        self._synced = self.grid.version
+
+    def _sync_walkable(self):
+        for y0, x0, y1, x1 in self.grid.changes_since(self._synced):
+            for y, row in zip(range(y0, y1), (self.grid[y0:y1, x0:x1] == 0).tolist()):
+                for x, walkable in zip(range(x0, x1), row):
+                    if walkable:
+                        self._walkable_cache.add((y, x))
+                    else:
+                        self._walkable_cache.discard((y, x))
+        self._synced = self.grid.version
 
     def is_walkable(self, pos: Tuple[int, int]) -> bool:
+        if self.grid.version != self._synced:
+            self._sync_walkable()
         return pos in self._walkable_cache
 
     def add_element(self, pos: Tuple[int, int], kind: str, properties: Optional[Dict[str, Any]] = None):
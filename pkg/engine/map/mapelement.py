@@ -1,12 +1,26 @@
-from enum import Enum, auto
+from enum import Enum
 from typing import Dict, Any, Tuple, Optional
 from pkg.schema.models import Element
 
-class ElementType(Enum):
-    KEY = auto()
-    EXIT = auto()
-    TRAP = auto()
-    DOLL = auto()
+class ElementType(str, Enum):
+    # 値を名前と同じ文字列にして、item.type == "KEY" のような比較もできるようにする
+    KEY = "KEY"
+    EXIT = "EXIT"
+    TRAP = "TRAP"
+    DOLL = "DOLL"
+    MP_POTION = "MP_POTION"
+
+class MapItem:
+    """WorldState.grid_items に置くアイテム。鍵は identified になるまで本物か偽物か分からない"""
+
+    def __init__(self, pos: Tuple[int, int], type: ElementType, properties: Optional[Dict[str, Any]] = None):
+        self.pos = tuple(pos)
+        self.type = type
+        self.properties = properties or {}
+        self.identified = False
+
+    def __repr__(self):
+        return f"MapItem({self.type.name}, {self.pos})"
 
 class ElementInteractor:
     @staticmethod
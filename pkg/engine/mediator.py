@@ -1,81 +1,101 @@
+from types import MappingProxyType
 import numpy as np
-from pkg.schema.models import LocalView
+from pkg.schema.views import LazyLocalView
+from pkg.engine.visibility import ActorVisibility, has_wall_between
+from pkg.utils.profiler import PROFILER
 
 class InformationMediator:
     def __init__(self, config):
         self.config = config
+        self.visibility = None
+        self._grid_view = None
 
-    def get_local_views(self, state):
+    def get_local_views(self, state, map_fn=map):
+        """map_fn にスレッドプールの map を渡せば並列に組み立てる(各視界は互いに独立)"""
         alive_actors = [a for a in state.actor_data.values() if a.alive and not a.escaped]
-        return {
-            actor.a_id: self._build_view(actor, state, alive_actors)
-            for actor in alive_actors
-        }
+        self.actor_visibility(state)
+        views = map_fn(lambda actor: self._build_view(actor, state), alive_actors)
+        if PROFILER.enabled:
+            PROFILER.count("views_built", len(alive_actors))
+        return {actor.a_id: view for actor, view in zip(alive_actors, views)}
 
-    def _build_view(self, actor, state, all_alive_actors):
+    def _build_view(self, actor, state):
         v_range = getattr(actor, 'vision_range', 5)
         if getattr(actor, 'stamina', 100) < 10:
             v_range = max(1, v_range // 2)
+        # 中身は読まれた時に visible_actors / visible_elements / view_memory で組み立てる
+        return LazyLocalView(self, actor, state, v_range)
+
+    def actor_visibility(self, state):
+        """このターンのアクター間の視線行列。state に載せて視界・学習・戦闘判定で共有する"""
+        if state.actor_visibility is None:
+            field = [a for a in state.actor_data.values() if a.alive and not a.escaped]
+            radius = max((getattr(a, 'vision_range', 5) for a in field), default=0)
+            state.actor_visibility = ActorVisibility(
+                [a.a_id for a in field], [a.pos for a in field], radius, state.grid, self.visibility,
+                spatial=state.actor_index,
+            )
+            if PROFILER.enabled:
+                PROFILER.count("los_checks", state.actor_visibility.pairs)
+        return state.actor_visibility
 
-        visible_actors = [
-            other.get_public_status() for other in all_alive_actors
-            if other.a_id != actor.a_id and self._is_visible(actor.pos, other.pos, v_range, state.grid)
+    def visible_actors(self, actor, state, v_range):
+        return [
+            state.actor_data[o_id].get_public_status()
+            for o_id in state.actor_visibility.visible_from(actor.a_id, v_range)
         ]
 
-        visible_elements = [
-            (pos, el) for pos, el in state.grid_items.items()
+    def visible_elements(self, actor, state, v_range):
+        return [
+            (pos, state.grid_items[pos]) for pos, _ in state.item_index.query(actor.pos, v_range)
             if self._is_visible(actor.pos, pos, v_range, state.grid)
         ]
 
-        mem = actor.memory.get_relevant(state.turn)
-        mem["grid_map"] = state.grid
+    def view_memory(self, actor, state):
+        """アクターの記憶はコピーせず読み取り専用で見せる。グリッドも書き込み不可のビューで渡す"""
+        memory = actor.memory
+        mem = {
+            "elements": MappingProxyType(memory.known_elements),
+            "actors": MappingProxyType(memory.seen_actors),
+            "prediction_map": MappingProxyType(memory.prediction_map),
+            "grid_map": self._read_only_grid(state.grid),
+            "current_turn": state.turn,
+        }
+        # プランナーを使うのは鬼の decide だけなので、他のアクターの分は作らない
+        if self.config["world"].get("incremental_planner") and actor.is_oni:
+            mem["planner"] = state.planners.get(actor.a_id)
+        return mem
 
-        return LocalView(
-            pos=actor.pos, 
-            actors=visible_actors, 
-            elements=visible_elements, 
-            memory=mem
-        )
+    def _read_only_grid(self, grid):
+        cached = self._grid_view
+        if cached is not None and cached[0] is grid:
+            return cached[1]
+        view = grid.read_only()
+        self._grid_view = (grid, view)
+        return view
 
     def _is_visible(self, p1, p2, v_range, grid):
         p1 = (int(p1[0]), int(p1[1]))
         p2 = (int(p2[0]), int(p2[1]))
         if (abs(p1[0] - p2[0]) + abs(p1[1] - p2[1])) > v_range:
             return False
+        if PROFILER.enabled:
+            PROFILER.count("los_checks")
+        if self.visibility is not None:
+            return self.visibility.visible(p1, p2)
         return not self._has_wall_between(p1, p2, grid)
 
     def _has_wall_between(self, p1, p2, grid):
-        y0, x0 = p1
-        y1, x1 = p2
-        dy, dx = abs(y1 - y0), abs(x1 - x0)
-        y, x = y0, x0
-        n = 1 + dx + dy
-        y_inc = 1 if y1 > y0 else -1
-        x_inc = 1 if x1 > x0 else -1
-        error = dx - dy
-        dx *= 2
-        dy *= 2
-        for _ in range(n):
-            if 0 <= y < grid.shape[0] and 0 <= x < grid.shape[1]:
-                if grid[y, x] == 1:
-                    if (y, x) != p1 and (y, x) != p2:
-                        return True
-            if error > 0:
-                x += x_inc
-                error -= dy
-            else:
-                y += y_inc
-                error += dx
-        return False
+        return has_wall_between(p1, p2, grid)
 
     def inject_learning(self, state, resolved_actions):
         onis = [a for a in state.actor_data.values() if getattr(a, 'is_oni', False) and a.alive]
-        humans = [a for a in state.actor_data.values() if not getattr(a, 'is_oni', False) and a.alive]
+        visibility = self.actor_visibility(state)
         for oni in onis:
-            v_range = getattr(oni, 'vision_range', 5)
-            for h in humans:
-                if self._is_visible(oni.pos, h.pos, v_range, state.grid):
-                    oni.memory.update_prediction(h.a_id, h.pos)
+            for h_id in visibility.visible_from(oni.a_id, getattr(oni, 'vision_range', 5)):
+                h = state.actor_data[h_id]
+                if not getattr(h, 'is_oni', False):
+                    oni.memory.update_prediction(h_id, h.pos)
         self._process_oracle_transmission(state)
 
     def _process_oracle_transmission(self, state):
@@ -0,0 +1,138 @@
+from pathlib import Path
+import numpy as np
+from pkg.engine.path_cache import grid_fingerprint
+from pkg.engine.search import DIRECTIONS, DistanceField, move_masks
+
+class NextHopTable:
+    """
+    小さな静的マップ向けの全点対 次の一歩/歩数 表 (uint16, [start, goal] をセル平坦インデックスで引く)。
+    壁が変わらない前提なので、マップごとに一度だけ作って使い回す。
+    最短の一歩が複数あれば DIRECTIONS 順で最初のものを取る。A* はヒープの取り出し順で決まるので
+    歩数は同じでも一歩目が違うことがある (25x25・壁 20% でおよそ 16%)。A* と同じ動きが要るなら使わないこと。
+    """
+
+    NO_ROUTE = 0xFFFF
+    DEFAULT_MAX_CELLS = 1024
+
+    def __init__(self, shape, next_hop, hops, fingerprint):
+        self.height, self.width = shape
+        self.next_hop = next_hop
+        self.hops = hops
+        self.fingerprint = fingerprint
+
+    @staticmethod
+    def fingerprint_of(grid):
+        return grid_fingerprint(grid)
+
+    @classmethod
+    def fits(cls, grid, max_cells=DEFAULT_MAX_CELLS):
+        return grid.size <= min(max_cells, cls.NO_ROUTE)
+
+    @classmethod
+    def build(cls, grid):
+        h, w = grid.shape
+        cells = h * w
+        if cells > cls.NO_ROUTE:
+            raise ValueError(f"Grid too large for next-hop table: {grid.shape}")
+
+        # dist[g, c] = c から g までのコスト(移動は対称なので g を始点にした距離場で求まる)
+        seeds = np.zeros((cells, cells), dtype=bool)
+        seeds[np.arange(cells), np.arange(cells)] = True
+        dist = DistanceField(grid).compute_units(seeds.reshape(cells, h, w))
+        reachable = (dist < DistanceField.UNREACHABLE).reshape(cells, cells)
+
+        padded = np.full((cells, h + 2, w + 2), DistanceField.UNREACHABLE, dtype=np.int64)
+        padded[:, 1:-1, 1:-1] = dist
+        masks = move_masks(grid)
+        best = np.full((cells, h, w), np.iinfo(np.int64).max, dtype=np.int64)
+        best_dir = np.full((cells, h, w), -1, dtype=np.int8)
+        for k, (dy, dx) in enumerate(DIRECTIONS):
+            cost = 1414 if dy and dx else 1000
+            cand = padded[:, 1 + dy:h + 1 + dy, 1 + dx:w + 1 + dx] + cost
+            better = (cand < best) & (masks >> k & 1).astype(bool)
+            best[better] = cand[better]
+            best_dir[better] = k
+
+        offsets = np.array([dy * w + dx for dy, dx in DIRECTIONS] + [0], dtype=np.int64)
+        here = np.broadcast_to(np.arange(cells), (cells, cells))
+        step = here + offsets[best_dir.reshape(cells, cells)]
+        goal_cell = np.eye(cells, dtype=bool)
+        step = np.where(reachable & ~goal_cell, step, here)
+
+        # ポインタ倍化で各 (goal, cell) の歩数を数える
+        count = (reachable & ~goal_cell).astype(np.int64)
+        pointer = step
+        while True:
+            count = count + np.take_along_axis(count, pointer, axis=1)
+            nxt = np.take_along_axis(pointer, pointer, axis=1)
+            if np.array_equal(nxt, pointer):
+                break
+            pointer = nxt
+
+        next_hop = np.where(reachable, step, cls.NO_ROUTE).astype(np.uint16).T.copy()
+        hops = np.where(reachable, count, cls.NO_ROUTE).astype(np.uint16).T.copy()
+        return cls(grid.shape, next_hop, hops, cls.fingerprint_of(grid))
+
+    @classmethod
+    def load(cls, path, grid=None):
+        """保存済みの表を読む。grid を渡した場合、壁配置が一致しなければ None"""
+        with np.load(path) as data:
+            fingerprint = str(data["fingerprint"])
+            if grid is not None and fingerprint != cls.fingerprint_of(grid):
+                return None
+            return cls(tuple(data["shape"]), data["next_hop"], data["hops"], fingerprint)
+
+    @classmethod
+    def load_or_build(cls, grid, cache_dir=None):
+        path = None
+        if cache_dir is not None:
+            path = Path(cache_dir) / f"{cls.fingerprint_of(grid)}.nexthop.npz"
+            if path.exists():
+                table = cls.load(path, grid)
+                if table is not None:
+                    return table
+        table = cls.build(grid)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            table.save(path)
+        return table
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            next_hop=self.next_hop,
+            hops=self.hops,
+            shape=np.asarray((self.height, self.width)),
+            fingerprint=np.asarray(self.fingerprint),
+        )
+
+    def next_step(self, start, goal):
+        s, g = self._index(start), self._index(goal)
+        if s is None or g is None:
+            return tuple(start)
+        n = int(self.next_hop[s, g])
+        if n == self.NO_ROUTE:
+            return tuple(start)
+        return divmod(n, self.width)
+
+    def path_length(self, start, goal):
+        """start から goal までの歩数。到達不能なら None"""
+        s, g = self._index(start), self._index(goal)
+        if s is None or g is None:
+            return None
+        n = int(self.hops[s, g])
+        return None if n == self.NO_ROUTE else n
+
+    def path(self, start, goal):
+        path = [tuple(start)]
+        if self.path_length(start, goal) is None:
+            return path
+        while path[-1] != tuple(goal):
+            path.append(self.next_step(path[-1], goal))
+        return path
+
+    def _index(self, pos):
+        y, x = int(pos[0]), int(pos[1])
+        if not (0 <= y < self.height and 0 <= x < self.width):
+            return None
+        return y * self.width + x
@@ -0,0 +1,182 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from pkg.engine.grid import content_key, source_grid
+from pkg.engine.search import GridSearch
+
+def grid_version(grid):
+    # ワーカープロセスと突き合わせるので、プロセスごとに変わる hash() ではなく中身のハッシュを使う。
+    # Grid (か Grid.read_only のビュー) なら版が変わるまで計算済みのものを使い回す
+    source = source_grid(grid)
+    return (grid.shape, source.content_key() if source is not None else content_key(grid))
+
+def grid_fingerprint(grid):
+    """壁配置のプロセスをまたいで安定なハッシュ(ディスクキャッシュのキー用)"""
+    walls = np.packbits(np.ascontiguousarray(grid == 1))
+    return hashlib.sha1(np.asarray(grid.shape, dtype=np.int64).tobytes() + walls.tobytes()).hexdigest()
+
+class PathCache:
+    """
+    (grid_version, start, goal) をキーにした経路LRU。完全一致だけを返す。
+    同じゴールへの既存の経路の接尾辞も最短ではあるが、同点の崩し方が新しく探索した経路と違いうるので、
+    返すと結果がそれまでにプロセスで探索した内容に依存してしまう。
+    複数スレッドから引けるようロックで守り、状態を持つ探索エンジンはスレッドごとに持つ。
+    """
+
+    def __init__(self, max_entries=4096, max_engines=8, max_tables=8):
+        self.max_entries = max_entries
+        self.max_engines = max_engines
+        # 版ごとの次の一歩表と視線表。エピソードを続けて回すワーカーで溜まり続けないよう、
+        # 長く引かれていない版から捨てる。生きている SimulationCore (retain の数) より少なくはしない
+        self.max_tables = max_tables
+        self._live = 0
+        self._paths = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._phase = None
+        self._touched = None
+        self._tables = OrderedDict()
+        self._visibility = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def engine(self, grid, version, engine_class=GridSearch, *args):
+        engines = getattr(self._local, "engines", None)
+        if engines is None:
+            engines = self._local.engines = OrderedDict()
+        key = (engine_class, version, args)
+        engine = engines.get(key)
+        if engine is None:
+            engine = engine_class(grid, *args)
+            engines[key] = engine
+            if len(engines) > self.max_engines:
+                engines.popitem(last=False)
+        else:
+            engines.move_to_end(key)
+        return engine
+
+    def attach_table(self, version, table):
+        """全点対の次の一歩表(NextHopTable)をこのグリッドに紐付ける"""
+        self._attach(self._tables, version, table)
+
+    def table(self, version):
+        return self._get(self._tables, version)
+
+    def attach_visibility(self, version, index):
+        self._attach(self._visibility, version, index)
+
+    def visibility(self, version):
+        return self._get(self._visibility, version)
+
+    def retain(self):
+        """SimulationCore が1つ動き始めた。表は動いているコアの数までは捨てない"""
+        with self._lock:
+            self._live += 1
+
+    def release(self):
+        with self._lock:
+            self._live = max(0, self._live - 1)
+
+    def _get(self, tables, version):
+        # 引かれた版は新しい側へ回し、動いているコアの表が先に捨てられないようにする
+        with self._lock:
+            table = tables.get(version)
+            if table is not None:
+                tables.move_to_end(version)
+            return table
+
+    def _attach(self, tables, version, table):
+        with self._lock:
+            tables[version] = table
+            tables.move_to_end(version)
+            while len(tables) > max(self.max_tables, self._live):
+                tables.popitem(last=False)
+
+    @contextmanager
+    def phase(self):
+        """
+        並列に引かれる区間。区間中に登録した経路は同じ区間の中でも引けるが、
+        登録と LRU の更新は溜めておいて抜ける時にキー順で反映する。
+        こうしておけば結果も抜けた後の中身も問い合わせの順序に依存しない。
+        溜めた (登録, 参照) を返すので、別プロセスの分は absorb で取り込める。
+        """
+        with self._lock:
+            self._phase, self._touched = {}, set()
+        record = (self._phase, self._touched)
+        try:
+            yield record
+        finally:
+            with self._lock:
+                self._phase = self._touched = None
+                stored, touched = record
+                for key in sorted(touched):
+                    if key in self._paths:
+                        self._paths.move_to_end(key)
+                for key in sorted(stored):
+                    self._store(key, stored[key])
+
+    def absorb(self, record):
+        """別プロセスの phase で溜まった分を、いま開いている phase に合流させる"""
+        stored, touched = record
+        with self._lock:
+            if self._phase is None:
+                raise ValueError("absorb() must be called inside phase()")
+            self._phase.update(stored)
+            self._touched.update(touched)
+
+    def lookup(self, version, start, goal):
+        """キャッシュ済みの経路(start含むタプル)。到達不能は()、未登録はNone"""
+        key = (version, start, goal)
+        with self._lock:
+            path = self._paths.get(key)
+            if path is None and self._phase is not None:
+                path = self._phase.get(key)
+            if path is not None:
+                self._touch(key)
+                self.hits += 1
+                return path
+            self.misses += 1
+            return None
+
+    def _touch(self, key):
+        if self._touched is not None:
+            self._touched.add(key)
+        elif key in self._paths:
+            self._paths.move_to_end(key)
+
+    def store(self, version, start, goal, path):
+        key = (version, start, goal)
+        path = tuple(path) if path else ()
+        with self._lock:
+            if self._phase is not None:
+                self._phase[key] = path
+            else:
+                self._store(key, path)
+        return path
+
+    def _store(self, key, path):
+        self._paths[key] = path
+        self._paths.move_to_end(key)
+        while len(self._paths) > self.max_entries:
+            self._paths.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+            self._local = threading.local()
+            self._tables.clear()
+            self._visibility.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._paths),
+        }
+
+PATH_CACHE = PathCache()
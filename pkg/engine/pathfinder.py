@@ -1,76 +1,172 @@
-import heapq
 import numpy as np
 from collections import defaultdict
+from pkg.engine.grid import source_grid
+from pkg.engine.path_cache import PATH_CACHE, grid_version
+from pkg.engine.search import DistanceField, GridSearch
+from pkg.engine.visibility import has_wall_between
+from pkg.utils.profiler import PROFILER
+
+def create_pathfinder(grid, config=None):
+    """config の world.pathfinder ("astar" / "jps" / "hpa") に応じた Pathfinder を返す"""
+    world = (config or {}).get("world", {})
+    mode = world.get("pathfinder", "astar")
+    if mode == "astar":
+        return Pathfinder(grid)
+    if mode == "jps":
+        from pkg.engine.jps import JumpPointPathfinder
+        return JumpPointPathfinder(grid)
+    if mode == "hpa":
+        from pkg.engine.hierarchy import HierarchicalPathfinder
+        return HierarchicalPathfinder(
+            grid,
+            cluster_size=world.get("hpa_cluster_size", 16),
+            refine_steps=world.get("hpa_refine_steps", 8),
+        )
+    raise ValueError(f"Unknown pathfinder mode: {mode}")
 
 class Pathfinder:
-    def __init__(self, grid):
+    mode = "astar"
+    engine_class = GridSearch
+    engine_args = ()
+
+    def __init__(self, grid, cache=None):
         self.grid = grid
+        # 版数を追う Grid。アクターには Grid.read_only のビューが渡るので、そこから引いておく
+        self._source = source_grid(grid)
         self.height, self.width = grid.shape
+        self.cache = cache if cache is not None else PATH_CACHE
+        self._version = None
+        self._revision = None
+        self._field = None
+
+    def __getstate__(self):
+        # プロセスをまたぐ時はキャッシュを持ち出さず、受け取った側の PATH_CACHE を使う
+        state = self.__dict__.copy()
+        state["cache"] = None if self.cache is PATH_CACHE else self.cache
+        state["_version"] = None
+        state["_source"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.cache is None:
+            self.cache = PATH_CACHE
+        self._source = source_grid(self.grid)
+
+    @property
+    def version(self):
+        # Grid の版が進んだ時だけ引き直す。距離場も壁配置から作るので一緒に捨てる
+        revision = self._source.version if self._source is not None else None
+        if self._version is None or revision != self._revision:
+            self._version = grid_version(self.grid)
+            self._revision = revision
+            self._field = None
+        return self._version
+
+    @property
+    def engine(self):
+        # 探索エンジンは状態を持つので、インスタンスには保持せず呼んだスレッドの分を受け取る
+        return self.cache.engine(self.grid, self.version, self.engine_class, *self.engine_args)
+
+    @property
+    def distance_field(self):
+        self.version
+        if self._field is None:
+            self._field = DistanceField(self.grid)
+        return self._field
 
     def get_next_step(self, start, goal):
         s, g = tuple(start), tuple(goal)
         if s == g: return s
+        table = self.cache.table(self.version)
+        if table is not None:
+            return table.next_step(s, g)
         path = self._astar(s, g)
         return path[1] if len(path) > 1 else s
 
+    def get_path(self, start, goal):
+        s, g = tuple(start), tuple(goal)
+        if s == g: return [s]
+        return self._astar(s, g)
+
+    def get_safe_direction(self, start, threats, distance=8):
+        """
+        start から distance 以内で行ける所のうち、threats から一番遠いセル。
+        同じ遠さなら start に近い方、さらに同じなら行優先で先のセル
+        """
+        s = (int(start[0]), int(start[1]))
+        if not threats:
+            return s
+        fields = self.generate_dijkstra_maps([[s], threats])
+        own, danger = fields[0], fields[1]
+        reachable = own <= distance
+        if not reachable.any():
+            return s
+        # 鬼から行けない所は最も安全として有限の大きな値にそろえる
+        danger = np.where(np.isinf(danger), np.float32(self.height * self.width * 2), danger)
+        score = np.where(reachable, danger, -np.inf)
+        best = np.flatnonzero(score == score.max())
+        idx = int(best[np.argmin(own.ravel()[best])])
+        return divmod(idx, self.width)
+
+    def generate_dijkstra_map(self, seeds, out=None):
+        """seeds(1点または点の列)からの距離場 (H, W) float32。outを渡せば再利用する"""
+        return self.distance_field.compute(self._seed_mask(seeds), out=out)
+
+    def generate_dijkstra_maps(self, seed_groups):
+        """seed_groups の各要素ごとの距離場を一括で (N, H, W) に求める"""
+        seeds = np.stack([self._seed_mask(group) for group in seed_groups])
+        return self.distance_field.compute(seeds)
+
+    def _seed_mask(self, seeds):
+        pts = np.asarray(seeds, dtype=int).reshape(-1, 2)
+        inside = (pts[:, 0] >= 0) & (pts[:, 0] < self.height) & (pts[:, 1] >= 0) & (pts[:, 1] < self.width)
+        pts = pts[inside]
+        mask = np.zeros((self.height, self.width), dtype=bool)
+        mask[pts[:, 0], pts[:, 1]] = True
+        return mask
+
     def has_los(self, start, end):
-        y0, x0 = start
-        y1, x1 = end
-        dy, dx = abs(y1 - y0), abs(x1 - x0)
-        sy = 1 if y0 < y1 else -1
-        sx = 1 if x0 < x1 else -1
-        err = dx - dy
-        curr_y, curr_x = y0, x0
-        while (curr_y, curr_x) != (y1, x1):
-            if not (0 <= curr_y < self.height and 0 <= curr_x < self.width):
-                return False
-            if self.grid[curr_y, curr_x] == 1:
-                return False
-            e2 = 2 * err
-            if e2 > -dy:
-                err -= dy
-                curr_x += sx
-            if e2 < dx:
-                err += dx
-                curr_y += sy
-        return True
+        if PROFILER.enabled:
+            PROFILER.count("los_checks")
+        index = self.cache.visibility(self.version)
+        if index is not None:
+            return index.visible(start, end)
+        return not has_wall_between(start, end, self.grid)
+
+    def has_los_many(self, starts, ends):
+        """(N, 2) の始点と終点の組ごとの has_los をまとめて返す"""
+        starts = np.asarray(starts, dtype=np.int64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.int64).reshape(-1, 2)
+        out = np.zeros(len(starts), dtype=bool)
+        if PROFILER.enabled:
+            PROFILER.count("los_checks", len(starts))
+        index = self.cache.visibility(self.version)
+        near = np.zeros(len(starts), dtype=bool)
+        if index is not None:
+            near = (np.abs(ends - starts).sum(axis=1) <= index.radius) & \
+                (starts[:, 0] >= 0) & (starts[:, 0] < self.height) & (starts[:, 1] >= 0) & (starts[:, 1] < self.width)
+            out[near] = index.visible_pairs(starts[near], ends[near])
+        for i in np.flatnonzero(~near).tolist():
+            out[i] = not has_wall_between(starts[i], ends[i], self.grid)
+        return out
 
     def _astar(self, start, goal):
-        if not (0 <= goal[0] < self.height and 0 <= goal[1] < self.width) or self.grid[goal] == 1:
-            return [start]
-        oheap = [(0, start)]
-        came_from = {}
-        g_score = {start: 0}
-        close_set = set()
-        c1, c2 = 1.0, 1.414
-        while oheap:
-            _, current = heapq.heappop(oheap)
-            if current == goal:
-                path = []
-                while current in came_from:
-                    path.append(current)
-                    current = came_from[current]
-                return [start] + path[::-1]
-            if current in close_set: continue
-            close_set.add(current)
-            for di, dj in [(0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)]:
-                ni, nj = current[0] + di, current[1] + dj
-                neighbor = (ni, nj)
-                if not (0 <= ni < self.height and 0 <= nj < self.width) or self.grid[neighbor] == 1:
-                    continue
-                if di != 0 and dj != 0:
-                    if self.grid[current[0] + di, current[1]] == 1 or self.grid[current[0], current[1] + dj] == 1:
-                        continue
-                    cost = c2
-                else:
-                    cost = c1
-                tg = g_score[current] + cost
-                if tg < g_score.get(neighbor, float('inf')):
-                    came_from[neighbor] = current
-                    g_score[neighbor] = tg
-                    f = tg + self._dist(neighbor, goal)
-                    heapq.heappush(oheap, (f, neighbor))
-        return [start]
+        s = (int(start[0]), int(start[1]))
+        g = (int(goal[0]), int(goal[1]))
+        key = (self.mode, self.version)
+        path = self.cache.lookup(key, s, g)
+        if path is None:
+            engine = self.engine
+            expanded = engine.expanded
+            path = engine.find_path(s, g)
+            # 予算切れで途中までの経路は最短経路ではないので登録しない
+            if not getattr(engine, "truncated", False):
+                path = self.cache.store(key, s, g, path)
+            if PROFILER.enabled:
+                PROFILER.count("astar_searches")
+                PROFILER.count("astar_expanded", engine.expanded - expanded)
+        return [start, *path[1:]] if path else [start]
 
     def _dist(self, a, b):
         dx, dy = abs(a[0] - b[0]), abs(a[1] - b[1])
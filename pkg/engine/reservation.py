@@ -0,0 +1,130 @@
+from pkg.engine.search import DIRECTIONS, move_masks, window_masks
+
+# 待機を先に試す。以降は Pathfinder._astar と同じ近傍順
+_MOVES = ((0, 0),) + DIRECTIONS
+
+class ReservationTable:
+    """
+    1ターンを ticks 個の刻みに分けた時空間予約表 (窓幅 ticks の協調 A*)。
+    アクターは優先度順に plan を呼び、先に予約した者のセルと辺を避けて動く。
+    まだ計画していないアクターは hold で現在地を全刻み押さえておく。
+    同じ陣営どうしのすれ違いは禁止し、鬼と人間のすれ違いは戦闘判定に任せる。
+    """
+
+    def __init__(self, grid):
+        self.height, self.width = grid.shape
+        self.ticks = 1
+        self._masks = move_masks(grid).tolist()
+        self._grid = grid
+        self._synced = getattr(grid, "version", 0)
+        self._cells = {}
+        self._edges = {}
+        self._teams = {}
+        self._holds = {}
+
+    def sync(self):
+        """グリッドの変わった矩形の周りだけ移動表を作り直す"""
+        grid = self._grid
+        if getattr(grid, "version", 0) == self._synced:
+            return
+        for rect in grid.changes_since(self._synced):
+            (y0, x0, y1, x1), masks = window_masks(grid, rect)
+            for y, row in zip(range(y0, y1), masks.tolist()):
+                self._masks[y][x0:x1] = row
+        self._synced = grid.version
+
+    def reset(self, ticks=1):
+        if ticks < 1:
+            raise ValueError(f"ticks must be positive: {ticks}")
+        self.ticks = ticks
+        self._cells.clear()
+        self._edges.clear()
+        self._teams.clear()
+        self._holds.clear()
+
+    def hold(self, a_id, pos):
+        """計画前のアクターの現在地を全刻み押さえる"""
+        pos = (int(pos[0]), int(pos[1]))
+        self._holds[a_id] = pos
+        for t in range(1, self.ticks + 1):
+            self._cells[(t, pos)] = a_id
+
+    def _release(self, a_id):
+        pos = self._holds.pop(a_id, None)
+        if pos is None:
+            return
+        for t in range(1, self.ticks + 1):
+            if self._cells.get((t, pos)) == a_id:
+                del self._cells[(t, pos)]
+
+    def plan(self, a_id, start, guide, speed=1, team=None):
+        """
+        guide (start を先頭とする希望経路) に沿って最大 speed 歩進む予約を取る。
+        guide の speed 歩目(短ければ終点)に最も近づく手を選び、同点なら guide 上で止まる手、
+        歩数の少ない手、guide そのものの順に優先する。戻り値は刻みごとのセル (ticks + 1 個)
+        """
+        self._release(a_id)
+        start = (int(start[0]), int(start[1]))
+        speed = min(speed, self.ticks)
+        preferred = [tuple(int(v) for v in p) for p in guide[:speed + 1]] or [start]
+        goal = preferred[-1]
+        on_guide = set(preferred)
+        preferred += [goal] * (self.ticks + 1 - len(preferred))
+
+        best, best_key = None, None
+        for cells in self._sequences(start, speed, team):
+            end = cells[-1]
+            moves = sum(1 for p, q in zip(cells, cells[1:]) if p != q)
+            key = (self._octile(end, goal), end not in on_guide, moves, cells != preferred)
+            if best_key is None or key < best_key:
+                best, best_key = cells, key
+        if best is None:
+            # 逃げ場がなければその場に留まる (hold していたので通常は起きない)
+            best = [start] * (self.ticks + 1)
+        self._reserve(a_id, best, team)
+        return best
+
+    def _sequences(self, start, speed, team):
+        # speed 歩までの移動列を深さ優先で列挙し、残りの刻みは終点で待つ
+        ticks = self.ticks
+        stack = [[start]]
+        while stack:
+            cells = stack.pop()
+            t = len(cells)
+            if t > speed:
+                end = cells[-1]
+                if all(self._cells.get((k, end)) is None for k in range(t, ticks + 1)):
+                    yield cells + [end] * (ticks + 1 - t)
+                continue
+            cur = cells[-1]
+            mask = self._masks[cur[0]][cur[1]] if self._inside(cur) else 0
+            children = []
+            for k, (dy, dx) in enumerate(_MOVES):
+                if k and not mask >> (k - 1) & 1:
+                    continue
+                nxt = (cur[0] + dy, cur[1] + dx)
+                if self._cells.get((t, nxt)) is not None:
+                    continue
+                if k and self._crosses(cur, nxt, t, team):
+                    continue
+                children.append(cells + [nxt])
+            # スタックなので逆順に積み、_MOVES の順に列挙されるようにする
+            stack.extend(reversed(children))
+
+    def _crosses(self, frm, to, t, team):
+        other = self._edges.get((t, to, frm))
+        return other is not None and self._teams[other] == team
+
+    def _reserve(self, a_id, cells, team):
+        self._teams[a_id] = team
+        for t in range(1, len(cells)):
+            self._cells[(t, cells[t])] = a_id
+            if cells[t] != cells[t - 1]:
+                self._edges[(t, cells[t - 1], cells[t])] = a_id
+
+    def _inside(self, pos):
+        return 0 <= pos[0] < self.height and 0 <= pos[1] < self.width
+
+    def _octile(self, a, b):
+        dy, dx = abs(a[0] - b[0]), abs(a[1] - b[1])
+        return 1000 * (dy + dx) - 586 * (dx if dx < dy else dy)
@@ -1,16 +1,21 @@
 import numpy as np
 from collections import defaultdict
-from pkg.schema.models import Intent, Priority, ActionType
-from pkg.engine.pathfinder import Pathfinder
+from pkg.schema.models import Action, ActionType
+from pkg.engine.collision import first_contacts, pad_paths
+from pkg.engine.pathfinder import create_pathfinder
+from pkg.engine.reservation import ReservationTable
 
 class ActionResolver:
     def __init__(self, config):
         self.config = config
         self.pathfinder = None
+        self.reservations = None
 
     def resolve(self, intents, state):
-        if self.pathfinder is None:
-            self.pathfinder = Pathfinder(state.grid)
+        # 同じグリッドの壁の変更は両者が版数で追う。作り直すのは別のグリッドに切り替わった時だけ
+        if self.pathfinder is None or self.pathfinder.grid is not state.grid:
+            self.pathfinder = create_pathfinder(state.grid, self.config)
+            self.reservations = ReservationTable(state.grid)
         sorted_ids = sorted(
             intents.keys(),
             key=lambda x: (intents[x].priority, state.actor_data[x].is_oni),
@@ -27,12 +32,7 @@ class ActionResolver:
         self._resolve_items(final_positions, state, status_updates)
         self._finalize_actions(state, status_updates, skill_executed)
         return {
-            a_id: Intent(
-                target_pos=pos,
-                priority=intents[a_id].priority,
-                action_type=intents[a_id].action_type,
-                metadata=status_updates[a_id]
-            )
+            a_id: Action(target_pos=pos, status_update=status_updates[a_id])
             for a_id, pos in final_positions.items()
         }
 
@@ -48,55 +48,65 @@ class ActionResolver:
 
     def _resolve_movement_collision(self, sorted_ids, intents, state, status_updates, planned_paths):
         final_positions = {}
-        occupied = {tuple(a.pos) for a in state.actor_data.values() if a.alive and not getattr(a, 'escaped', False)}
-        for a_id in sorted_ids:
+        movers = [
+            a_id for a_id in sorted_ids
+            if state.actor_data[a_id].alive and not getattr(state.actor_data[a_id], 'escaped', False)
+        ]
+        speeds = {
+            a_id: 2 if status_updates[a_id].get("asclepius_active") or getattr(state.actor_data[a_id], 'asclepius_active', False) else 1
+            for a_id in movers
+        }
+        # 加速中のアクターがいるターンは2刻みに分け、1歩ずつ予約させる
+        table = self.reservations
+        table.sync()
+        table.reset(max(speeds.values(), default=1))
+        for a_id, actor in state.actor_data.items():
+            if actor.alive and not getattr(actor, 'escaped', False):
+                table.hold(a_id, actor.pos)
+        for a_id in movers:
             actor = state.actor_data[a_id]
-            if not actor.alive or getattr(actor, 'escaped', False):
-                continue
             current_pos = tuple(actor.pos)
-            if current_pos in occupied:
-                occupied.remove(current_pos)
             target_pos = tuple(intents[a_id].target_pos)
-            speed = 2 if status_updates[a_id].get("asclepius_active") or getattr(actor, 'asclepius_active', False) else 1
+            speed = speeds[a_id]
             if current_pos == target_pos:
-                path = [current_pos]
+                guide = [current_pos]
             else:
+                # 移動の解決は常に world.pathfinder で行う (incremental_planner は鬼の decide にだけ効く)
                 full_path = self.pathfinder._astar(current_pos, target_pos)
-                path = (full_path or [current_pos])[:speed + 1]
-            while len(path) > 1 and path[-1] in occupied:
-                path.pop()
-            final_pos = path[-1]
-            final_positions[a_id] = list(final_pos)
+                guide = (full_path or [current_pos])[:speed + 1]
+            cells = table.plan(a_id, current_pos, guide, speed, actor.is_oni)
+            path = [cells[0]] + [q for p, q in zip(cells, cells[1:]) if q != p]
+            final_positions[a_id] = list(path[-1])
             planned_paths[a_id] = path
-            occupied.add(final_pos)
         return final_positions
 
     def _resolve_combat_refined(self, final_positions, state, planned_paths, status_updates):
-        onis = [a_id for a_id, a in state.actor_data.items() if a.is_oni]
-        humans = [a_id for a_id, a in state.actor_data.items() if not a.is_oni and a.alive]
-        for h_id in humans:
-            h_actor = state.actor_data[h_id]
-            if getattr(h_actor, 'invincible', False) or status_updates[h_id].get('alive') is False:
+        onis = [a_id for a_id, a in state.actor_data.items() if a.is_oni and planned_paths.get(a_id)]
+        humans = [
+            a_id for a_id, a in state.actor_data.items()
+            if not a.is_oni and a.alive and planned_paths.get(a_id)
+            and not getattr(a, 'invincible', False) and status_updates[a_id].get('alive') is not False
+        ]
+        if not onis or not humans:
+            return
+        # 全員の経路を同じ長さの配列にそろえ、人間 × 鬼の接触を一括で判定する
+        width = max(len(planned_paths[a_id]) for a_id in onis + humans)
+        h_cells, h_len = pad_paths([planned_paths[h_id] for h_id in humans], width)
+        o_cells, o_len = pad_paths([planned_paths[o_id] for o_id in onis], width)
+        caught = first_contacts(
+            h_cells, h_len, o_cells, o_len,
+            lambda h, o: self._has_los(state, humans[h], onis[o], h_cells[h, 0], o_cells[o, 0]),
+            self.pathfinder.has_los_many,
+        )
+        for h, o in enumerate(caught.tolist()):
+            if o < 0:
                 continue
-            h_path = [tuple(p) for p in planned_paths.get(h_id, [])]
-            for o_id in onis:
-                o_path = [tuple(p) for p in planned_paths.get(o_id, [])]
-                if not h_path or not o_path: continue
-                collision = False
-                if h_path[-1] == o_path[-1]:
-                    if self.pathfinder.has_los(h_path[0], o_path[0]):
-                        collision = True
-                elif len(set(h_path) & set(o_path)) > 1:
-                    if any(self.pathfinder.has_los(h_p, o_p) for h_p, o_p in zip(h_path, o_path)):
-                        collision = True
-                if collision:
-                    if getattr(h_actor, 'has_doll', False):
-                        status_updates[h_id]['has_doll'] = False
-                        final_positions[h_id] = list(h_path[0])
-                    else:
-                        status_updates[h_id]['alive'] = False
-                        final_positions[h_id] = list(h_path[0])
-                    break
+            h_id = humans[h]
+            if getattr(state.actor_data[h_id], 'has_doll', False):
+                status_updates[h_id]['has_doll'] = False
+            else:
+                status_updates[h_id]['alive'] = False
+            final_positions[h_id] = list(h_cells[h, 0].tolist())
 
     def _prepare_skills(self, intents, state, status_updates):
         executed = set()
@@ -106,14 +116,14 @@ class ActionResolver:
                 actor = state.actor_data[a_id]
                 if getattr(actor, 'mp_charge', 0) >= 1000:
                     executed.add(a_id)
-                    for t_id, t_actor in state.actor_data.items():
-                        if not t_actor.is_oni and self.pathfinder.has_los(actor.pos, t_actor.pos):
-                            if self._l1_dist(actor.pos, t_actor.pos) <= 10:
-                                status_updates[t_id].update({
-                                    "asclepius_active": True,
-                                    "asclepius_duration": 5,
-                                    "stamina_rate": 0.3
-                                })
+                    for t_id, t_pos in state.actor_index.query(actor.pos, 10):
+                        t_actor = state.actor_data[t_id]
+                        if not t_actor.is_oni and self._has_los(state, a_id, t_id, actor.pos, t_pos):
+                            status_updates[t_id].update({
+                                "asclepius_active": True,
+                                "asclepius_duration": 5,
+                                "stamina_rate": 0.3
+                            })
         return executed
 
     def _finalize_actions(self, state, status_updates, skill_executed):
@@ -132,13 +142,22 @@ class ActionResolver:
             if item:
                 if item.type == "DOLL":
                     status_updates[a_id]['has_doll'] = True
-                    status_updates.setdefault('removed_items', []).append(pos_tuple)
+                    status_updates[a_id].setdefault('removed_items', []).append(pos_tuple)
                     taken_items.add(pos_tuple)
                 elif item.type == "MP_POTION":
                     actor = state.actor_data[a_id]
                     status_updates[a_id]['mp_charge'] = min(actor.mp_charge + 500, 1000)
-                    status_updates.setdefault('removed_items', []).append(pos_tuple)
+                    status_updates[a_id].setdefault('removed_items', []).append(pos_tuple)
                     taken_items.add(pos_tuple)
 
+    def _has_los(self, state, a_id, b_id, p1, p2):
+        # p1, p2 が移動前の a_id, b_id の位置である時だけ使える
+        visibility = state.actor_visibility
+        if visibility is not None:
+            seen = visibility.sees(a_id, b_id)
+            if seen is not None:
+                return seen
+        return self.pathfinder.has_los(p1, p2)
+
     def _l1_dist(self, p1, p2):
         return abs(p1[0] - p2[0]) + abs(p1[1] - p2[1])
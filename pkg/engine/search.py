@@ -0,0 +1,249 @@
+import heapq
+import itertools
+import numpy as np
+from pkg.engine.budget import current_budget
+
+STRAIGHT_COST = 1.0
+DIAGONAL_COST = 1.414
+# _astar と同じ浮動小数の丸めで同点を崩すため、ヒューリスティックも同じ式で計算する
+_DIAGONAL_DELTA = 1.414 - 2.0
+
+# 予算を確かめる間隔 (展開数)
+BUDGET_STRIDE = 64
+
+def spend_remainder(budget, expanded):
+    """探索を終える時に、BUDGET_STRIDE ごとの確認でまだ払っていない展開数を予算から払う"""
+    rest = expanded % BUDGET_STRIDE
+    if budget is not None and rest:
+        budget.spend(rest)
+
+# Pathfinder._astar と同じ近傍順
+DIRECTIONS = ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1))
+
+def move_masks(grid):
+    """各セルから移動可能な方向をビットマスク(bit k = DIRECTIONS[k])で返す"""
+    h, w = grid.shape
+    padded = np.zeros((h + 2, w + 2), dtype=bool)
+    padded[1:-1, 1:-1] = grid != 1
+    masks = np.zeros((h, w), dtype=np.uint8)
+    for k, (dy, dx) in enumerate(DIRECTIONS):
+        ok = padded[1 + dy:h + 1 + dy, 1 + dx:w + 1 + dx]
+        if dy != 0 and dx != 0:
+            # 角抜け禁止: 縦横どちらかが壁なら斜め移動不可
+            ok = ok & padded[1 + dy:h + 1 + dy, 1:w + 1] & padded[1:h + 1, 1 + dx:w + 1 + dx]
+        masks |= ok.astype(np.uint8) << k
+    return masks
+
+def window_masks(grid, rect):
+    """rect 内のセルが変わった時に移動可能方向が変わりうる範囲 (rect を1マス広げた矩形) とその masks"""
+    h, w = grid.shape
+    y0, x0, y1, x1 = rect
+    outer = (max(0, y0 - 2), max(0, x0 - 2), min(h, y1 + 2), min(w, x1 + 2))
+    inner = (max(0, y0 - 1), max(0, x0 - 1), min(h, y1 + 1), min(w, x1 + 1))
+    # 窓の外は壁扱いになるが、inner のセルの近傍は outer に収まっている
+    sub = move_masks(grid[outer[0]:outer[2], outer[1]:outer[3]])
+    return inner, sub[inner[0] - outer[0]:inner[2] - outer[0], inner[1] - outer[1]:inner[3] - outer[1]]
+
+class DistanceField:
+    """
+    多始点オクタイル距離場。行単位のラスタ走査(下向き→上向き)を収束まで繰り返す。
+    各行では上(下)の行からの縦・斜め緩和の後、壁で区切った区間ごとの累積最小で
+    横方向へ一度に伝播させる。反復回数は最短路が上下に折り返す回数程度で済む。
+    """
+
+    UNREACHABLE = 1 << 30
+    _RUN_STRIDE = 1 << 31
+    _BLOCKED = 1 << 40
+
+    def __init__(self, grid):
+        self.height, self.width = grid.shape[-2:]
+        masks = move_masks(grid) if grid.ndim == 2 else np.stack([move_masks(g) for g in grid])
+        masks = np.where(grid != 1, masks, 0)
+        valid = {d: (masks >> k & 1).astype(bool) for k, d in enumerate(DIRECTIONS)}
+        # 行 y のセルへ上(y-1)/下(y+1)の行から入るコスト。移動できない所は _BLOCKED を足す
+        cost = lambda ok, c: np.where(ok, c, self._BLOCKED).astype(np.int64)
+        self._from_above = (cost(valid[(-1, 0)], 1000), cost(valid[(-1, -1)][..., 1:], 1414),
+                            cost(valid[(-1, 1)][..., :-1], 1414))
+        self._from_below = (cost(valid[(1, 0)], 1000), cost(valid[(1, -1)][..., 1:], 1414),
+                            cost(valid[(1, 1)][..., :-1], 1414))
+
+        x_cost = np.arange(self.width, dtype=np.int64) * 1000
+        right = np.concatenate([np.zeros(masks.shape[:-1] + (1,), dtype=bool), valid[(0, -1)][..., 1:]], axis=-1)
+        left = np.concatenate([np.zeros(masks.shape[:-1] + (1,), dtype=bool), valid[(0, 1)][..., -2::-1]], axis=-1)
+        self._right_off = np.cumsum(~right, axis=-1, dtype=np.int64) * self._RUN_STRIDE + x_cost
+        self._left_off = np.cumsum(~left, axis=-1, dtype=np.int64) * self._RUN_STRIDE + x_cost
+
+    def assign(self, index, other, rows=slice(None)):
+        """まとめて持つ世界のうち index 番の表を、other (同じ大きさの DistanceField) の rows 番で置き換える"""
+        for mine, theirs in zip(self._tables(), other._tables()):
+            mine[index] = theirs[rows]
+
+    def _tables(self):
+        return (*self._from_above, *self._from_below, self._right_off, self._left_off)
+
+    def compute(self, seeds, out=None):
+        """seeds: (..., H, W) の bool。戻り値は float32 (..., H, W)、到達不能は inf"""
+        dist = self.compute_units(seeds)
+        if out is None:
+            out = np.empty(dist.shape, dtype=np.float32)
+        np.multiply(dist, 1e-3, out=out, casting="unsafe")
+        out[dist >= self.UNREACHABLE] = np.inf
+        return out
+
+    def compute_units(self, seeds):
+        """compute と同じだが 1000/1414 単位の int64 のまま返す(到達不能は UNREACHABLE 以上)"""
+        h = self.height
+        dist = np.full(seeds.shape, self.UNREACHABLE, dtype=np.int64)
+        dist[seeds] = 0
+        prev = np.empty_like(dist)
+        down = (range(1, h), -1, self._from_above)
+        up = (range(h - 2, -1, -1), 1, self._from_below)
+        self._sweep_row(dist, 0)
+        self._relax_pass(dist, *down)
+        # 各パスは冪等なので、逆向きのパスの直後に変化がなければ収束している
+        for rows, step, entry in itertools.cycle((up, down)):
+            prev[...] = dist
+            self._relax_pass(dist, rows, step, entry)
+            if np.array_equal(prev, dist):
+                break
+        return dist
+
+    def _relax_pass(self, dist, rows, step, entry):
+        straight, from_left, from_right = entry
+        for y in rows:
+            row, src = dist[..., y, :], dist[..., y + step, :]
+            np.minimum(row, src + straight[..., y, :], out=row)
+            np.minimum(row[..., 1:], src[..., :-1] + from_left[..., y, :], out=row[..., 1:])
+            np.minimum(row[..., :-1], src[..., 1:] + from_right[..., y, :], out=row[..., :-1])
+            self._sweep_row(dist, y)
+
+    def _sweep_row(self, dist, y):
+        # 区間付き累積最小: 区間番号 * _RUN_STRIDE を引いておけば前の区間の値は選ばれても UNREACHABLE を超える
+        row = dist[..., y, :]
+        for line, off in ((row, self._right_off[..., y, :]), (row[..., ::-1], self._left_off[..., y, :])):
+            v = line - off
+            np.minimum.accumulate(v, axis=-1, out=v)
+            v += off
+            np.minimum(line, v, out=line)
+
+class GridSearch:
+    """平坦化インデックス上のA*。スコア/親配列は探索ごとに再利用する"""
+
+    def __init__(self, grid):
+        self.height, self.width = grid.shape
+        self.size = self.height * self.width
+        w = self.width
+        self._walkable = (grid != 1).ravel().tolist()
+        self._mask = move_masks(grid).ravel().tolist()
+        self._moves = [
+            tuple(
+                (dy * w + dx, DIAGONAL_COST if dy and dx else STRAIGHT_COST)
+                for k, (dy, dx) in enumerate(DIRECTIONS) if m >> k & 1
+            )
+            for m in range(256)
+        ]
+        ys, xs = np.divmod(np.arange(self.size), w)
+        self._ys = ys.tolist()
+        self._xs = xs.tolist()
+        self._g = [0] * self.size
+        self._parent = [-1] * self.size
+        self._seen = [0] * self.size
+        self._closed = [0] * self.size
+        self._search_id = 0
+        self.expanded = 0
+        # 直前の find_path が予算切れで途中までの経路を返したか
+        self.truncated = False
+
+    def index(self, pos):
+        return int(pos[0]) * self.width + int(pos[1])
+
+    def cell(self, idx):
+        return (self._ys[idx], self._xs[idx])
+
+    def in_bounds(self, pos):
+        return 0 <= pos[0] < self.height and 0 <= pos[1] < self.width
+
+    def is_walkable(self, pos):
+        return self.in_bounds(pos) and self._walkable[self.index(pos)]
+
+    def find_path(self, start, goal):
+        """
+        startからgoalまでのセル列(start含む)。到達不能ならNone。
+        decide の予算が尽きたら、開いているセルのうち goal に一番近いものまでの経路を返す (truncated)
+        """
+        self.truncated = False
+        if not self.in_bounds(start) or not self.is_walkable(goal):
+            return None
+        budget = current_budget()
+        s = self.index(start)
+        t = self.index(goal)
+        gy, gx = self._ys[t], self._xs[t]
+
+        self._search_id += 1
+        sid = self._search_id
+        g, parent, seen, closed = self._g, self._parent, self._seen, self._closed
+        mask, moves, ys, xs = self._mask, self._moves, self._ys, self._xs
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        g[s] = 0
+        parent[s] = -1
+        seen[s] = sid
+        oheap = [(0, s)]
+        expanded = 0
+        while oheap:
+            _, cur = heappop(oheap)
+            if cur == t:
+                self.expanded += expanded
+                spend_remainder(budget, expanded)
+                return self._reconstruct(start, s, t)
+            if closed[cur] == sid:
+                continue
+            closed[cur] = sid
+            expanded += 1
+            if budget is not None and not expanded % BUDGET_STRIDE and budget.spend(BUDGET_STRIDE):
+                self.expanded += expanded
+                self.truncated = True
+                return self._reconstruct(start, s, self._nearest_open(oheap, cur, gy, gx))
+            g_cur = g[cur]
+            for off, cost in moves[mask[cur]]:
+                n = cur + off
+                tg = g_cur + cost
+                if seen[n] != sid or tg < g[n]:
+                    seen[n] = sid
+                    g[n] = tg
+                    parent[n] = cur
+                    dy = ys[n] - gy
+                    dx = xs[n] - gx
+                    if dy < 0:
+                        dy = -dy
+                    if dx < 0:
+                        dx = -dx
+                    # 元の tg + _dist(...) と同じく h を先に求めてから足す (浮動小数の丸めをそろえる)
+                    h = dy + dx + _DIAGONAL_DELTA * (dy if dy < dx else dx)
+                    heappush(oheap, (tg + h, n))
+        self.expanded += expanded
+        spend_remainder(budget, expanded)
+        return None
+
+    def _nearest_open(self, oheap, cur, gy, gx):
+        # 打ち切った時の行き先。ヒューリスティックが最小 (同点なら f が小さい) のセル
+        ys, xs = self._ys, self._xs
+        best, best_key = cur, None
+        for f, n in [(0, cur), *oheap]:
+            dy = abs(ys[n] - gy)
+            dx = abs(xs[n] - gx)
+            key = (dy + dx + _DIAGONAL_DELTA * (dy if dy < dx else dx), f)
+            if best_key is None or key < best_key:
+                best, best_key = n, key
+        return best
+
+    def _reconstruct(self, start, s, t):
+        parent, ys, xs = self._parent, self._ys, self._xs
+        path = []
+        cur = t
+        while cur != s:
+            path.append((ys[cur], xs[cur]))
+            cur = parent[cur]
+        path.append(start)
+        path.reverse()
+        return path
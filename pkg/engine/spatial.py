@@ -0,0 +1,81 @@
+class SpatialHash:
+    """
+    一様グリッドのバケットに key ごとの位置を持ち、L1 半径で範囲検索する。
+    検索結果は登録順に並べて返すので、全件走査していた頃と順序が変わらない。
+    """
+
+    def __init__(self, cell_size=8):
+        if cell_size < 1:
+            raise ValueError(f"cell_size must be positive: {cell_size}")
+        self.cell_size = cell_size
+        self._buckets = {}
+        self._entries = {}
+        self._seq = 0
+
+    def _bucket(self, pos):
+        return (pos[0] // self.cell_size, pos[1] // self.cell_size)
+
+    def insert(self, key, pos):
+        """key を pos に登録する。登録済みなら移動として扱う"""
+        pos = (int(pos[0]), int(pos[1]))
+        entry = self._entries.get(key)
+        if entry is not None:
+            old, bucket, seq = entry
+            if old == pos:
+                return
+            new_bucket = self._bucket(pos)
+            if new_bucket != bucket:
+                self._discard(key, bucket)
+                self._buckets.setdefault(new_bucket, {})[key] = pos
+            else:
+                self._buckets[bucket][key] = pos
+            self._entries[key] = (pos, new_bucket, seq)
+            return
+        bucket = self._bucket(pos)
+        self._buckets.setdefault(bucket, {})[key] = pos
+        self._entries[key] = (pos, bucket, self._seq)
+        self._seq += 1
+
+    def copy(self):
+        twin = SpatialHash(self.cell_size)
+        twin._buckets = {bucket: dict(members) for bucket, members in self._buckets.items()}
+        twin._entries = dict(self._entries)
+        twin._seq = self._seq
+        return twin
+
+    def remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._discard(key, entry[1])
+
+    def _discard(self, key, bucket):
+        members = self._buckets[bucket]
+        del members[key]
+        if not members:
+            del self._buckets[bucket]
+
+    def query(self, pos, radius):
+        """pos から L1 距離 radius 以内の (key, 位置) のリスト"""
+        y, x = int(pos[0]), int(pos[1])
+        cs = self.cell_size
+        found = []
+        for by in range((y - radius) // cs, (y + radius) // cs + 1):
+            for bx in range((x - radius) // cs, (x + radius) // cs + 1):
+                members = self._buckets.get((by, bx))
+                if not members:
+                    continue
+                for key, (py, px) in members.items():
+                    if abs(py - y) + abs(px - x) <= radius:
+                        found.append((key, (py, px)))
+        found.sort(key=lambda kv: self._entries[kv[0]][2])
+        return found
+
+    def position(self, key):
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,8 +1,20 @@
 import numpy as np
+from pkg.engine.actor_store import ActorStore, ForkedActors
+from pkg.engine.grid import Grid
+from pkg.engine.incremental import PlannerRegistry
+from pkg.engine.spatial import SpatialHash
+from pkg.entities.actor import BaseActor
+from pkg.schema.models import StepResult
 
 class WorldState:
-    def __init__(self, grid, actor_data, map_elements, config):
-        self.grid = grid
+    # 保存せずに他の属性から作り直すもの
+    _DERIVED = (
+        "grid", "actor_data", "grid_items", "config", "store", "planners",
+        "actor_index", "item_index", "actor_visibility", "_shared", "_custom_tick",
+    )
+
+    def __init__(self, grid, actor_data, map_elements, config, exit_pos=None):
+        self.grid = Grid.from_array(grid)
         self.actor_data = actor_data
         self.grid_items = map_elements.get("items", {})
         self.config = config
@@ -10,19 +22,141 @@ class WorldState:
         self.is_terminal = False
         self.termination_reason = ""
         self.exit_open = False
-        self.exit_pos = tuple(config["world"]["exit_pos"])
+        # 出口は渡されたものを使い、なければ設定の world.exit_pos
+        self.exit_pos = tuple(exit_pos if exit_pos is not None else config["world"]["exit_pos"])
+        # アクターの状態は列指向のストアに置き、actor_data の各アクターはその窓口になる
+        self.store = ActorStore(len(actor_data))
+        for actor in actor_data.values():
+            self.store.add(actor)
+        self._custom_tick = [a_id for a_id, a in actor_data.items() if type(a).tick is not BaseActor.tick]
+        # fork した相手と共有していて、書き込む前にコピーが要るもの
+        self._shared = set()
+        self.planners = PlannerRegistry(self.grid)
+        # 位置が変わるまで有効なアクター間の視線行列。InformationMediator が作る
+        self.actor_visibility = None
+        cell_size = config["world"].get("spatial_cell_size", 8)
+        self.actor_index = SpatialHash(cell_size)
+        self.item_index = SpatialHash(cell_size)
+        for pos in self.grid_items:
+            self.item_index.insert(pos, pos)
+        self._sync_actor_index()
 
     def apply(self, resolved_actions):
         self.turn += 1
-        for a_id, actor in self.actor_data.items():
+        for a_id in self.store.ids:
             action = resolved_actions.get(a_id)
             if action:
-                actor.commit_status(action.target_pos, action.status_update)
-            actor.tick()
+                self.actor_data[a_id].commit_status(action.target_pos, action.status_update)
+                for pos in action.status_update.get("removed_items", ()):
+                    self._remove_item(pos)
+        # tick_fields のカウントダウンは全員分まとめて減らし、tick を書き換えたクラスだけ個別に呼ぶ
+        self.store.tick()
+        for a_id in self._custom_tick:
+            self.actor_data[a_id].tick()
         self._check_exit_condition()
+        self.actor_visibility = None
+        self._sync_actor_index()
+        self._release_planners()
         self._check_termination()
         return self
 
+    def export_step_result(self, intents, resolved_actions):
+        """1ターン分の StepResult。snapshot は全アクターの get_public_status"""
+        return StepResult(
+            turn=self.turn,
+            snapshot={a_id: self.actor_data[a_id].get_public_status() for a_id in self.store.ids},
+            intents=intents,
+            actions=resolved_actions,
+            is_terminal=self.is_terminal,
+            termination_reason=self.termination_reason,
+        )
+
+    def fork(self):
+        """
+        構造を共有した分岐。グリッド・アイテム・空間インデックスは書き込むまで、アクターの列は
+        列ごとに書き込むまで共有し、アクター本体は最初に引かれた時に clone する。
+        fork の後は元の状態の側も actor_data から引き直すこと (手元のアクターは分岐点で止まる)。
+        経路プランナーは学習した h が分岐どうしで混ざらないよう分岐ごとに作り直す。
+        """
+        twin = object.__new__(WorldState)
+        twin.__dict__.update(self.__dict__)
+        twin.store = self.store.fork()
+        # 分岐点のアクターはどちらの側からも書き換えず、両側とも clone して使う
+        frozen = self.actor_data
+        if isinstance(frozen, ForkedActors):
+            # 分岐を重ねても包みを入れ子にしない。手元で clone 済みなら、それを含む今のアクターの dict にする
+            frozen = {a_id: frozen[a_id] for a_id in frozen} if frozen._clones else frozen._source
+        self.actor_data = ForkedActors(frozen, self.store)
+        twin.actor_data = ForkedActors(frozen, twin.store)
+        twin.planners = PlannerRegistry(self.grid)
+        twin._custom_tick = list(self._custom_tick)
+        shared = {"grid", "items", "actor_index"}
+        twin._shared = set(shared)
+        self._shared |= shared
+        return twin
+
+    def export_checkpoint(self):
+        """保存用の中身。アクターは列の値を持った状態で pickle される"""
+        return {
+            "grid": self.grid,
+            "items": dict(self.grid_items),
+            "actors": {a_id: self.actor_data[a_id] for a_id in self.store.ids},
+            "planners": self.planners,
+            "attrs": {k: v for k, v in self.__dict__.items() if k not in self._DERIVED},
+        }
+
+    @classmethod
+    def from_checkpoint(cls, data, config):
+        # 出口などの属性は保存したものを使うので、読み込んだばかりの設定に exit_pos がなくてよい
+        attrs = data["attrs"]
+        state = cls(data["grid"], data["actors"], {"items": data["items"]}, config, exit_pos=attrs["exit_pos"])
+        state.__dict__.update(attrs)
+        planners = data["planners"]
+        planners.grid = state.grid
+        state.planners = planners
+        return state
+
+    def _own(self, name):
+        if name not in self._shared:
+            return
+        self._shared.discard(name)
+        if name == "grid":
+            # fork した Grid は版数と変更記録を引き継ぐので、プランナーは付け替えるだけでよい
+            self.grid = self.grid.fork()
+            self.planners.grid = self.grid
+        elif name == "items":
+            self.grid_items = dict(self.grid_items)
+            self.item_index = self.item_index.copy()
+        elif name == "actor_index":
+            self.actor_index = self.actor_index.copy()
+
+    def edit_grid(self):
+        """壁や扉を書き換える時に使うグリッド。fork 相手と共有していれば先にコピーする"""
+        self._own("grid")
+        return self.grid
+
+    def _sync_actor_index(self):
+        # 空間インデックスには場に残っている(生存かつ未脱出の)アクターだけを置く
+        self._own("actor_index")
+        store = self.store
+        for a_id, in_field, pos in zip(store.ids, store.in_field().tolist(), store.column("pos").tolist()):
+            if in_field:
+                self.actor_index.insert(a_id, pos)
+            else:
+                self.actor_index.remove(a_id)
+
+    def _remove_item(self, pos):
+        pos = tuple(pos)
+        self._own("items")
+        if self.grid_items.pop(pos, None) is not None:
+            self.item_index.remove(pos)
+
+    def _release_planners(self):
+        store = self.store
+        for a_id, in_field in zip(store.ids, store.in_field().tolist()):
+            if not in_field:
+                self.planners.release(a_id)
+
     def get_local_view(self, a_id, pathfinder):
         actor = self.actor_data[a_id]
         # 占い師(Oracle)なら視界を広げる、またはLoSを一部無視する
@@ -56,23 +190,24 @@ class WorldState:
     def _check_exit_condition(self):
         if not self.exit_open:
             return
-        for a_id, actor in self.actor_data.items():
-            if not actor.is_oni and actor.alive and not actor.escaped:
-                if tuple(actor.pos) == self.exit_pos:
-                    actor.escaped = True
+        store = self.store
+        at_exit = (store.column("pos") == self.exit_pos).all(axis=1)
+        escaping = ~store.column("is_oni") & store.in_field() & at_exit
+        if escaping.any():
+            store.column("escaped", write=True)[escaping] = True
 
     def _check_termination(self):
-        humans = [a for a in self.actor_data.values() if not a.is_oni]
-        total_humans = len(humans)
-        alive_not_escaped = [h for h in humans if h.alive and not h.escaped]
-        escaped_humans = [h for h in humans if h.escaped]
+        store = self.store
+        humans = ~store.column("is_oni")
+        total_humans = int(np.count_nonzero(humans))
+        alive_not_escaped = int(np.count_nonzero(humans & store.in_field()))
+        escaped_humans = int(np.count_nonzero(humans & store.column("escaped")))
 
         if not alive_not_escaped:
             self.is_terminal = True
-            e_count = len(escaped_humans)
-            if e_count == total_humans:
+            if escaped_humans == total_humans:
                 self.termination_reason = "PERFECT_ESCAPE"
-            elif e_count > 0:
+            elif escaped_humans > 0:
                 self.termination_reason = "PARTIAL_ESCAPE_AND_DEATH"
             else:
                 self.termination_reason = "TOTAL_ANNIHILATION"
@@ -83,11 +218,12 @@ class WorldState:
             self.termination_reason = "MAX_TURNS_REACHED"
 
     def get_summary(self):
+        store = self.store
         return {
             "turn": self.turn,
-            "alive_in_field": len([a for a in self.actor_data.values() if a.alive and not a.escaped]),
-            "escaped": len([a for a in self.actor_data.values() if a.escaped]),
-            "dead": len([a for a in self.actor_data.values() if not a.is_oni and not a.alive]),
+            "alive_in_field": int(np.count_nonzero(store.in_field())),
+            "escaped": int(np.count_nonzero(store.column("escaped"))),
+            "dead": int(np.count_nonzero(~store.column("is_oni") & ~store.column("alive"))),
             "terminal": self.is_terminal,
             "reason": self.termination_reason
         }
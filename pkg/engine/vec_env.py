@@ -0,0 +1,279 @@
+import numpy as np
+from pkg.engine.collision import find_contacts
+from pkg.engine.search import DIRECTIONS, DistanceField, move_masks
+from pkg.engine.visibility import VisibilityIndex, line_offsets
+
+# 行動番号 0 は待機、k (1..8) は DIRECTIONS[k - 1] への移動
+MOVES = np.array(((0, 0),) + DIRECTIONS, dtype=np.int64)
+UNREACHABLE = DistanceField.UNREACHABLE
+
+class LineTable:
+    """
+    L1 距離 radius 以内の相対位置ごとに、視線が通る中間セルを同じ長さに揃えて並べた表。
+    短い視線は始点 (0, 0) で埋める。始点は床なので判定は変わらない
+    """
+
+    def __init__(self, radius):
+        self.radius = radius
+        offsets = VisibilityIndex.offsets(radius)
+        width = max(1, 2 * radius - 1)
+        self.cells = np.zeros((2 * radius + 1, 2 * radius + 1, width, 2), dtype=np.int64)
+        for dy, dx in offsets:
+            line = line_offsets(dy, dx)
+            if line:
+                self.cells[dy + radius, dx + radius, :len(line)] = line
+
+    def visible(self, walls, world, src, dst):
+        """
+        walls: radius 分の余白を付けた (B, H + 2r, W + 2r) の壁。world, src, dst は同じ形の組で、
+        戻り値は has_wall_between の否定 (グリッド外は遮らない)。radius より遠い組は False
+        """
+        r = self.radius
+        delta = dst - src
+        near = np.abs(delta).sum(axis=-1) <= r
+        delta = np.where(near[..., None], delta, 0)
+        cells = src[..., None, :] + self.cells[delta[..., 0] + r, delta[..., 1] + r] + r
+        blocked = walls[world[..., None], cells[..., 0], cells[..., 1]].any(axis=-1)
+        return near & ~blocked
+
+class VecEnv:
+    """
+    小さな世界を B 個まとめて同じ歩調で進める学習用の環境。
+    グリッドは (B, H, W)、アクターの列は (B, N, ...) の配列で持ち、視界・距離場・接触判定を
+    全世界まとめて配列演算で行う。アクターは人間 n_humans 体の後に鬼 n_onis 体が並ぶ。
+    step(actions) は鬼の行動番号 (B, n_onis) を受け取り、None なら learning.yaml の
+    Oni_adaptation で動く組み込みの追跡方策を使う。人間は脱出口への距離場を下る組み込みの方策で、
+    見えた鬼が fear_radius 以内にいれば鬼から遠ざかる。
+    終わった世界はその場で作り直し、obs はリセット後のもの、info["final"] に終了時の集計を入れる。
+
+    SimulationCore の規則を配列向けに絞ったもので、鍵・アイテム・スキルは扱わず、出口は常に開いている。
+    """
+
+    def __init__(self, config, learning_cfg, num_envs, seed=None):
+        if num_envs < 1:
+            raise ValueError(f"num_envs must be positive: {num_envs}")
+        world, entities = config["world"], config["entities"]
+        self.num_envs = num_envs
+        self.height = self.width = world["grid_size"]
+        self.wall_density = world.get("wall_density", 0.2)
+        self.max_turns = world["max_turns"]
+        self.fixed_exit = tuple(world["exit_pos"]) if world.get("exit_pos") is not None else None
+        self.n_humans = entities["human"]["count"]
+        self.n_onis = entities["oni"]["count"]
+        self.n_actors = self.n_humans + self.n_onis
+        self.is_oni = np.arange(self.n_actors) >= self.n_humans
+        self.vision = np.where(self.is_oni, entities["oni"]["vision_range"], entities["human"]["vision_range"])
+        oni_cfg = learning_cfg.get("Oni_adaptation", {})
+        human_cfg = learning_cfg.get("human_adaptation", {})
+        self.prediction_weight = oni_cfg.get("prediction_weight", 0.7)
+        self.exploration_rate = oni_cfg.get("exploration_rate", 0.1)
+        self.random_move_chance = human_cfg.get("random_move_chance", 0.3)
+        self.fear_radius = human_cfg.get("fear_radius", 4)
+        self.rng = np.random.default_rng(seed)
+        self._lines = LineTable(int(self.vision.max()))
+
+        b, n = num_envs, self.n_actors
+        self.grids = np.zeros((b, self.height, self.width), dtype=np.int8)
+        self.exit_pos = np.zeros((b, 2), dtype=np.int64)
+        self.pos = np.zeros((b, n, 2), dtype=np.int64)
+        self.prev_pos = np.zeros((b, n, 2), dtype=np.int64)
+        self.alive = np.zeros((b, n), dtype=bool)
+        self.escaped = np.zeros((b, n), dtype=bool)
+        self.turn = np.zeros(b, dtype=np.int64)
+        self._masks = np.zeros((b, self.height, self.width), dtype=np.uint8)
+        self._exit_dist = np.zeros((b, self.height, self.width), dtype=np.int64)
+        # 余白付きの壁と距離場の移動表は全世界分まとめて持ち、作り直した世界の分だけ書き換える
+        r = self._lines.radius
+        self._walls = np.zeros((b, self.height + 2 * r, self.width + 2 * r), dtype=bool)
+        self._distance = DistanceField(self.grids)
+        self._seen = None
+
+    def reset(self):
+        self._regenerate(np.arange(self.num_envs))
+        return self._observe()
+
+    def step(self, actions=None):
+        """戻り値は (obs, reward, done, info)。reward は鬼側から見た (捕獲数 - 脱出数)"""
+        if self._seen is None:
+            raise ValueError("VecEnv.step() called before reset()")
+        b = np.arange(self.num_envs)[:, None]
+        in_field = self.alive & ~self.escaped
+        # 位置は前回の観測から変わっていないので、その時の視界をそのまま使う
+        visible = self._seen
+
+        moves = np.zeros((self.num_envs, self.n_actors), dtype=np.int64)
+        moves[:, ~self.is_oni] = self._human_moves(visible)
+        if actions is None:
+            moves[:, self.is_oni] = self._oni_moves(visible, in_field)
+        else:
+            moves[:, self.is_oni] = np.asarray(actions, dtype=np.int64).reshape(self.num_envs, self.n_onis)
+
+        # 移動できない方向と場にいないアクターは待機に直す
+        y, x = self.pos[..., 0], self.pos[..., 1]
+        allowed = (moves == 0) | (self._masks[b, y, x] >> np.maximum(moves - 1, 0) & 1).astype(bool)
+        moves = np.where(allowed & in_field, moves, 0)
+        self.prev_pos = self.pos.copy()
+        self.pos = self.pos + MOVES[moves]
+
+        captured = self._contacts(in_field)
+        self.alive &= ~captured
+        at_exit = (self.pos == self.exit_pos[:, None, :]).all(axis=-1)
+        escaping = ~self.is_oni & self.alive & ~self.escaped & at_exit
+        self.escaped |= escaping
+        self.turn += 1
+        reward = captured.sum(axis=1) - escaping.sum(axis=1)
+
+        humans = ~self.is_oni
+        remaining = (self.alive & ~self.escaped & humans).any(axis=1)
+        done = ~remaining | (self.turn >= self.max_turns)
+        info = {}
+        finished = np.flatnonzero(done)
+        if len(finished):
+            info["final"] = {
+                "turn": self.turn[finished].copy(),
+                "escaped": self.escaped[finished][:, humans].sum(axis=1),
+                "captured": (~self.alive[finished][:, humans]).sum(axis=1),
+                "envs": finished,
+            }
+            self._regenerate(finished)
+        return self._observe(), reward, done, info
+
+    def _observe(self):
+        self._seen = self._visibility(self.alive & ~self.escaped)
+        return {
+            "grid": self.grids.copy(),
+            "pos": self.pos.copy(),
+            "alive": self.alive.copy(),
+            "escaped": self.escaped.copy(),
+            "visible": self._seen.copy(),
+            "exit": self.exit_pos.copy(),
+            "turn": self.turn.copy(),
+        }
+
+    def _visibility(self, in_field):
+        """(B, N, N) の視界。i が j を見ているか (場にいる者どうし、視界半径内で視線が通る)"""
+        n = self.n_actors
+        world = np.broadcast_to(np.arange(self.num_envs)[:, None, None], (self.num_envs, n, n))
+        src = np.broadcast_to(self.pos[:, :, None, :], (self.num_envs, n, n, 2))
+        dst = np.broadcast_to(self.pos[:, None, :, :], (self.num_envs, n, n, 2))
+        seen = self._lines.visible(self._walls, world, src, dst)
+        seen &= np.abs(dst - src).sum(axis=-1) <= self.vision[None, :, None]
+        seen &= in_field[:, :, None] & in_field[:, None, :]
+        seen[:, np.arange(n), np.arange(n)] = False
+        return seen
+
+    def _field(self, cells, active):
+        """各世界で active な cells を始点にした距離場 (B, H, W)。始点がない世界は全て UNREACHABLE"""
+        if not active.any():
+            return np.full(self.grids.shape, UNREACHABLE, dtype=np.int64)
+        seeds = np.zeros(self.grids.shape, dtype=bool)
+        w, k = np.nonzero(active)
+        seeds[w, cells[w, k, 0], cells[w, k, 1]] = True
+        return self._distance.compute_units(seeds)
+
+    def _allowed(self, cells):
+        """cells (B, K, 2) から取れる行動 (B, K, 9)。待機はいつでも取れる"""
+        b = np.arange(self.num_envs)[:, None]
+        masks = self._masks[b, cells[..., 0], cells[..., 1]][..., None]
+        return np.concatenate([np.ones(masks.shape, dtype=bool), (masks >> np.arange(8) & 1).astype(bool)], axis=-1)
+
+    def _neighbour_values(self, field, cells):
+        """cells (B, K, 2) から各行動で移る先の field の値 (B, K, 9)。移れない方向は UNREACHABLE"""
+        b = np.arange(self.num_envs)[:, None, None]
+        dest = cells[:, :, None, :] + MOVES
+        dy = np.clip(dest[..., 0], 0, self.height - 1)
+        dx = np.clip(dest[..., 1], 0, self.width - 1)
+        return np.where(self._allowed(cells), field[b, dy, dx], UNREACHABLE)
+
+    def _random_moves(self, cells):
+        # 移動できる方向 (待機を含む) から一様に選ぶ
+        keys = np.where(self._allowed(cells), self.rng.random(cells.shape[:2] + (len(MOVES),)), -1.0)
+        return keys.argmax(axis=-1)
+
+    def _human_moves(self, visible):
+        humans = self.pos[:, ~self.is_oni]
+        toward_exit = self._neighbour_values(self._exit_dist, humans).argmin(axis=-1)
+        # 見えている鬼が fear_radius 以内にいれば、その鬼たちから最も離れる手を選ぶ
+        onis = self.pos[:, self.is_oni]
+        gap = np.abs(humans[:, :, None, :] - onis[:, None, :, :]).sum(axis=-1)
+        threat = visible[:, ~self.is_oni][:, :, self.is_oni] & (gap <= self.fear_radius)
+        near = threat.any(axis=-1)
+        dest = humans[:, :, None, None, :] + MOVES[:, None, :]
+        d = np.abs(dest - onis[:, None, None, :, :])
+        octile = 1000 * d.sum(axis=-1) - 586 * d.min(axis=-1)
+        clearance = np.where(threat[:, :, None, :], octile, UNREACHABLE).min(axis=-1)
+        away = np.where(self._allowed(humans), clearance, -1).argmax(axis=-1)
+        moves = np.where(near, away, toward_exit)
+        wander = self.rng.random(moves.shape) < self.random_move_chance
+        return np.where(wander & ~near, self._random_moves(humans), moves)
+
+    def _oni_moves(self, visible, in_field):
+        # 鬼は視界を共有し、見えている人間の予測位置 (速度 × prediction_weight 先) を目指す
+        humans = ~self.is_oni
+        spotted = visible[:, self.is_oni][:, :, humans].any(axis=1)
+        velocity = self.pos[:, humans] - self.prev_pos[:, humans]
+        predicted = self.pos[:, humans] + np.rint(velocity * self.prediction_weight).astype(np.int64)
+        predicted[..., 0] = predicted[..., 0].clip(0, self.height - 1)
+        predicted[..., 1] = predicted[..., 1].clip(0, self.width - 1)
+        b, k = np.nonzero(spotted)
+        blocked = self.grids[b, predicted[b, k, 0], predicted[b, k, 1]] == 1
+        predicted[b[blocked], k[blocked]] = self.pos[:, humans][b[blocked], k[blocked]]
+        target = self._field(predicted, spotted)
+        onis = self.pos[:, self.is_oni]
+        chase = self._neighbour_values(target, onis).argmin(axis=-1)
+        explore = ~spotted.any(axis=1)[:, None] | (self.rng.random(chase.shape) < self.exploration_rate)
+        return np.where(explore, self._random_moves(onis), chase)
+
+    def _contacts(self, in_field):
+        """この手番で捕まった人間 (B, N)。終点が同じ組は移動前の視線、すれ違った組は接触で捕獲"""
+        humans, onis = ~self.is_oni, self.is_oni
+        path = np.stack([self.prev_pos, self.pos], axis=2)
+        h_len = np.full((self.num_envs, self.n_humans), 2)
+        o_len = np.full((self.num_envs, self.n_onis), 2)
+        end, cross = find_contacts(path[:, humans], h_len, path[:, onis], o_len)
+        pair = in_field[:, humans][:, :, None] & in_field[:, onis][:, None, :]
+        world = np.broadcast_to(np.arange(self.num_envs)[:, None, None], end.shape)
+        src = np.broadcast_to(self.prev_pos[:, humans][:, :, None, :], end.shape + (2,))
+        dst = np.broadcast_to(self.prev_pos[:, onis][:, None, :, :], end.shape + (2,))
+        start_los = self._lines.visible(self._walls, world, src, dst)
+        hit = pair & ((end & start_los) | cross)
+        captured = np.zeros((self.num_envs, self.n_actors), dtype=bool)
+        captured[:, humans] = hit.any(axis=-1)
+        return captured
+
+    def _regenerate(self, envs):
+        """envs の世界を新しい地図と配置で作り直す。出口から届かないセルには誰も置かない"""
+        h, w, n = self.height, self.width, self.n_actors
+        r = self._lines.radius
+        pending = np.asarray(envs)
+        while len(pending):
+            k = len(pending)
+            grids = (self.rng.random((k, h, w)) < self.wall_density).astype(np.int8)
+            if self.fixed_exit is not None:
+                exits = np.tile(self.fixed_exit, (k, 1))
+            else:
+                exits = np.stack([self.rng.integers(0, h, k), self.rng.integers(0, w, k)], axis=1)
+            grids[np.arange(k), exits[:, 0], exits[:, 1]] = 0
+            seeds = np.zeros(grids.shape, dtype=bool)
+            seeds[np.arange(k), exits[:, 0], exits[:, 1]] = True
+            field = DistanceField(grids)
+            dist = field.compute_units(seeds)
+            reachable = (dist < UNREACHABLE).reshape(k, -1)
+            reachable[np.arange(k), exits[:, 0] * w + exits[:, 1]] = False
+            ok = reachable.sum(axis=1) >= n
+            keys = np.where(reachable, self.rng.random(reachable.shape), 2.0)
+            cells = np.argsort(keys, axis=1)[:, :n]
+            done = pending[ok]
+            self.grids[done] = grids[ok]
+            self.exit_pos[done] = exits[ok]
+            self._exit_dist[done] = dist[ok]
+            self._walls[done, r:r + h, r:r + w] = grids[ok] == 1
+            self._distance.assign(done, field, ok)
+            self.pos[done] = np.stack(np.divmod(cells[ok], w), axis=-1)
+            pending = pending[~ok]
+        envs = np.asarray(envs)
+        self.prev_pos[envs] = self.pos[envs]
+        self.alive[envs] = True
+        self.escaped[envs] = False
+        self.turn[envs] = 0
+        self._masks[envs] = np.stack([move_masks(g) for g in self.grids[envs]])
@@ -0,0 +1,219 @@
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
+from pkg.engine.grid import expand_rect
+from pkg.engine.path_cache import grid_fingerprint
+from pkg.engine.spatial import SpatialHash
+
+@lru_cache(maxsize=None)
+def line_offsets(dy, dx):
+    """(0, 0) から (dy, dx) への視線が通る中間セルの相対位置 (両端は含まない)"""
+    ady, adx = abs(dy), abs(dx)
+    y_inc = 1 if dy > 0 else -1
+    x_inc = 1 if dx > 0 else -1
+    error = adx - ady
+    y = x = 0
+    cells = []
+    for _ in range(ady + adx - 1):
+        if error > 0:
+            x += x_inc
+            error -= 2 * ady
+        else:
+            y += y_inc
+            error += 2 * adx
+        cells.append((y, x))
+    return tuple(cells)
+
+def has_wall_between(p1, p2, grid):
+    """視線判定の基準実装。端点以外の中間セルに壁があれば True、グリッド外は遮らない"""
+    y0, x0 = int(p1[0]), int(p1[1])
+    h, w = grid.shape
+    for oy, ox in line_offsets(int(p2[0]) - y0, int(p2[1]) - x0):
+        y, x = y0 + oy, x0 + ox
+        if 0 <= y < h and 0 <= x < w and grid[y, x] == 1:
+            return True
+    return False
+
+class VisibilityIndex:
+    """
+    静的グリッドの視線表。各セルについて L1 距離 radius 以内の相対位置ごとに
+    見えるかどうかを1ビットで持つ。視線は平行移動で形が変わらないので、
+    表は相対位置ごとにグリッド全体をずらして一括で作る。
+    """
+
+    def __init__(self, grid, radius, bits, fingerprint):
+        self.height, self.width = grid.shape
+        self.radius = radius
+        self.bits = bits
+        self.fingerprint = fingerprint
+        self._grid = grid
+        self._slot = {o: k for k, o in enumerate(self.offsets(radius))}
+        slots = np.full((2 * radius + 1, 2 * radius + 1), -1, dtype=np.int64)
+        for (dy, dx), k in self._slot.items():
+            slots[dy + radius, dx + radius] = k
+        self._slots = slots
+        # 1セル分のビット列を Python の int にしておけばビット検査が安い
+        row = bits.shape[-1]
+        raw = bits.tobytes()
+        self._rows = [int.from_bytes(raw[i:i + row], "little") for i in range(0, len(raw), row)]
+        self._synced = getattr(grid, "version", 0)
+
+    @staticmethod
+    def offsets(radius):
+        return [
+            (dy, dx)
+            for dy in range(-radius, radius + 1)
+            for dx in range(-(radius - abs(dy)), radius - abs(dy) + 1)
+        ]
+
+    @classmethod
+    def build(cls, grid, radius):
+        return cls(grid, radius, cls._window_bits(grid, radius, (0, 0) + grid.shape), grid_fingerprint(grid))
+
+    @classmethod
+    def _window_bits(cls, grid, radius, rect):
+        # rect 内のセルを始点とするビット列。視線は radius 先までしか見ないので壁もその分だけ切り出す
+        y0, x0, y1, x1 = rect
+        h, w = y1 - y0, x1 - x0
+        r = radius
+        offsets = cls.offsets(radius)
+        walls = np.pad(grid == 1, r, constant_values=False)[y0:y1 + 2 * r, x0:x1 + 2 * r]
+        bits = np.zeros((h, w, (len(offsets) + 7) // 8), dtype=np.uint8)
+        for k, (dy, dx) in enumerate(offsets):
+            ok = np.ones((h, w), dtype=bool)
+            for oy, ox in line_offsets(dy, dx):
+                ok &= ~walls[r + oy:r + oy + h, r + ox:r + ox + w]
+            bits[:, :, k >> 3] |= ok.astype(np.uint8) << (k & 7)
+        return bits
+
+    def copy(self):
+        twin = object.__new__(VisibilityIndex)
+        twin.__dict__.update(self.__dict__)
+        twin.bits = self.bits.copy()
+        twin._rows = list(self._rows)
+        return twin
+
+    def sync(self, grid):
+        """
+        grid の変わった矩形から radius 以内のセルだけ表を作り直す。それより遠い始点の視線は
+        変わった矩形を通らない。作り直したら True
+        """
+        if not hasattr(grid, "changes_since") or grid.version == self._synced:
+            return False
+        row = self.bits.shape[-1]
+        for rect in grid.changes_since(self._synced):
+            y0, x0, y1, x1 = expand_rect(rect, self.radius, grid.shape)
+            self.bits[y0:y1, x0:x1] = self._window_bits(grid, self.radius, (y0, x0, y1, x1))
+            for y in range(y0, y1):
+                raw = self.bits[y, x0:x1].tobytes()
+                for i, x in enumerate(range(x0, x1)):
+                    self._rows[y * self.width + x] = int.from_bytes(raw[i * row:(i + 1) * row], "little")
+        self._grid = grid
+        self._synced = grid.version
+        self.fingerprint = grid_fingerprint(grid)
+        return True
+
+    @classmethod
+    def load(cls, path, grid):
+        """保存済みの表を読む。壁配置が一致しなければ None"""
+        with np.load(path) as data:
+            fingerprint = str(data["fingerprint"])
+            if fingerprint != grid_fingerprint(grid):
+                return None
+            return cls(grid, int(data["radius"]), data["bits"], fingerprint)
+
+    @classmethod
+    def load_or_build(cls, grid, radius, cache_dir=None):
+        path = None
+        if cache_dir is not None:
+            path = Path(cache_dir) / f"{grid_fingerprint(grid)}.vis{radius}.npz"
+            if path.exists():
+                index = cls.load(path, grid)
+                if index is not None:
+                    return index
+        index = cls.build(grid, radius)
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            index.save(path)
+        return index
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            bits=self.bits,
+            radius=np.asarray(self.radius),
+            fingerprint=np.asarray(self.fingerprint),
+        )
+
+    def visible(self, p1, p2):
+        """p1 から p2 が見えるか。radius を超える組は基準実装で直接判定する"""
+        y0, x0 = int(p1[0]), int(p1[1])
+        k = self._slot.get((int(p2[0]) - y0, int(p2[1]) - x0))
+        if k is None or not (0 <= y0 < self.height and 0 <= x0 < self.width):
+            return not has_wall_between(p1, p2, self._grid)
+        return bool(self._rows[y0 * self.width + x0] >> k & 1)
+
+    def visible_pairs(self, src, dst):
+        """(N, 2) の始点と終点の組をまとめて判定する。組は表の半径内かつ始点がグリッド内であること"""
+        r = self.radius
+        k = self._slots[dst[:, 0] - src[:, 0] + r, dst[:, 1] - src[:, 1] + r]
+        byte = self.bits[src[:, 0], src[:, 1], k >> 3]
+        return (byte >> (k & 7) & 1).astype(bool)
+
+class ActorVisibility:
+    """
+    ある時点の場にいるアクター同士の視線。L1 距離 radius 以内の組だけを判定し、見える相手を
+    始点ごとに疎に持つ。radius を超える組については sees が None を返す。
+    候補の組は spatial (a_id を位置で引く SpatialHash。普通は WorldState.actor_index) から引くので、
+    アクター数の2乗の配列は作らず、手間は近くにいる組の数で決まる。
+    """
+
+    def __init__(self, ids, positions, radius, grid, index=None, spatial=None):
+        self.ids = ids
+        self.radius = radius
+        self._row = {a_id: i for i, a_id in enumerate(ids)}
+        pos = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        self._pos = [tuple(p) for p in pos.tolist()]
+        if spatial is None:
+            spatial = SpatialHash(max(radius, 1))
+            for a_id, p in zip(ids, self._pos):
+                spatial.insert(a_id, p)
+        src, dst = [], []
+        row = self._row
+        for i, p in enumerate(self._pos):
+            for key, _ in spatial.query(p, radius):
+                j = row.get(key)
+                if j is not None and j != i:
+                    src.append(i)
+                    dst.append(j)
+        # 実際に視線を判定した組の数
+        self.pairs = len(src)
+        if index is not None and index.radius >= radius:
+            seen = index.visible_pairs(pos[src], pos[dst]).tolist() if src else []
+        else:
+            seen = [not has_wall_between(pos[i], pos[j], grid) for i, j in zip(src, dst)]
+        visible = [[] for _ in ids]
+        for i, j, ok in zip(src, dst, seen):
+            if ok:
+                visible[i].append(j)
+        for targets in visible:
+            targets.sort()
+        self._visible = visible
+
+    def _distance(self, i, j):
+        (y0, x0), (y1, x1) = self._pos[i], self._pos[j]
+        return abs(y0 - y1) + abs(x0 - x1)
+
+    def sees(self, a_id, b_id):
+        i = self._row.get(a_id)
+        j = self._row.get(b_id)
+        if i is None or j is None or self._distance(i, j) > self.radius:
+            return None
+        return i == j or j in self._visible[i]
+
+    def visible_from(self, a_id, v_range):
+        """a_id から L1 距離 v_range 以内で見えるアクターの id (ids の順)"""
+        i = self._row.get(a_id)
+        if i is None:
+            return []
+        return [self.ids[j] for j in self._visible[i] if self._distance(i, j) <= v_range]
@@ -1,7 +1,20 @@
+import copy
 import numpy as np
+from pkg.engine.actor_store import Column, columns_of
 from pkg.entities.traits.memory import EntityMemory
 
 class BaseActor:
+    # True のアクターはクラス共有の状態を書き換えるので、並列実行時も actor 順に1体ずつ決める
+    ordered_decision = False
+    # tick ごとに 0 まで1ずつ減らす残りターンの属性 (Column であること)
+    tick_fields = ()
+
+    pos = Column()
+    prev_pos = Column()
+    alive = Column()
+    escaped = Column()
+    is_oni = Column()
+
     def __init__(self, a_id, pos, config):
         self.a_id = a_id
         self.pos = tuple(pos)
@@ -12,6 +25,45 @@ class BaseActor:
         self.is_oni = False
         self.vision_range = 0
         self.memory = EntityMemory()
+        self.rng = self._make_rng(config)
+
+    def _make_rng(self, config):
+        # 実行順やスレッドに依らないよう、乱数はアクターごとに world.seed と id から作る
+        seed = config.get("world", {}).get("seed")
+        if seed is None:
+            return np.random.default_rng()
+        return np.random.default_rng([int(seed), *str(self.a_id).encode()])
+
+    def __getstate__(self):
+        # ストアは持ち出さず、列の値を普通の属性に戻して渡す
+        state = self.__dict__.copy()
+        store = state.pop("_store", None)
+        slot = state.pop("_slot", None)
+        if store is not None:
+            for name in columns_of(type(self)):
+                state[name] = store.get(name, slot)
+        return state
+
+    def clone(self, store=None):
+        """
+        分岐用の複製。記憶・乱数と dict / list / set / ndarray の属性は複製し、config などは共有する。
+        store を渡せば列の値はコピーせず、その store の同じ a_id のスロットに結び付ける
+        """
+        state = self.__dict__.copy() if store is not None else self.__getstate__()
+        state.pop("_store", None)
+        state.pop("_slot", None)
+        twin = object.__new__(type(self))
+        for name, value in state.items():
+            if isinstance(value, EntityMemory):
+                value = value.clone()
+            elif isinstance(value, np.random.Generator):
+                value = copy.deepcopy(value)
+            elif isinstance(value, (dict, list, set, np.ndarray)) and name != "config":
+                value = value.copy()
+            twin.__dict__[name] = value
+        if store is not None:
+            store.bind(twin, store.slots[self.a_id])
+        return twin
 
     def get_public_status(self):
         return {
@@ -32,9 +84,18 @@ class BaseActor:
                 setattr(self, attr, value)
 
     def tick(self):
-        pass
+        for name in self.tick_fields:
+            value = getattr(self, name)
+            if value > 0:
+                setattr(self, name, value - 1)
 
 class Human(BaseActor):
+    tick_fields = ("stun", "dream_mode")
+
+    stamina = Column()
+    stun = Column()
+    dream_mode = Column()
+
     def __init__(self, a_id, pos, config):
         super().__init__(a_id, pos, config)
         self.is_human = True
@@ -59,13 +120,11 @@ class Human(BaseActor):
             "metadata": {"ignore_walls": False}
         })
 
-    def tick(self):
-        if self.stun > 0:
-            self.stun -= 1
-        if self.dream_mode > 0:
-            self.dream_mode -= 1
-
 class Oni(BaseActor):
+    tick_fields = ("confused",)
+
+    confused = Column()
+
     def __init__(self, a_id, pos, config):
         super().__init__(a_id, pos, config)
         self.is_oni = True
@@ -85,7 +144,3 @@ class Oni(BaseActor):
             "priority": self.config["entities"]["oni"]["move_priority"],
             "metadata": {"ignore_walls": False}
         })
-
-    def tick(self):
-        if self.confused > 0:
-            self.confused -= 1
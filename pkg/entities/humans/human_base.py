@@ -1,10 +1,13 @@
-import random
 import numpy as np
+from pkg.engine.actor_store import Column
 from pkg.entities.actor import BaseActor
-from pkg.engine.pathfinder import Pathfinder
+from pkg.engine.pathfinder import create_pathfinder
 from pkg.schema.models import Intent
 
 class Human(BaseActor):
+    stamina = Column()
+    stun = Column()
+
     def __init__(self, a_id, pos, config):
         super().__init__(a_id, pos, config)
         self.is_oni = False
@@ -32,7 +35,7 @@ class Human(BaseActor):
         if grid is None:
             return Intent(target_pos=self.pos, priority=0, metadata={})
 
-        finder = Pathfinder(grid)
+        finder = create_pathfinder(grid, self.config)
         self._update_knowledge(view, grid)
 
         onis = [a for a in view.actors if a.get("is_oni")]
@@ -108,7 +111,7 @@ class Human(BaseActor):
         h, w = grid.shape
         candidates = []
         for _ in range(15):
-            ty, tx = random.randint(0, h-1), random.randint(0, w-1)
+            ty, tx = int(self.rng.integers(0, h)), int(self.rng.integers(0, w))
             if grid[ty, tx] == 0:
                 score = self.exploration_map[ty, tx]
                 candidates.append(((ty, tx), score))
@@ -1,18 +1,22 @@
 import numpy as np
 from collections import deque
 from typing import Optional
+from pkg.engine.actor_store import Column
+from pkg.engine.budget import current_budget
 from pkg.entities.actor import BaseActor
-from pkg.engine.pathfinder import Pathfinder
+from pkg.engine.pathfinder import create_pathfinder
 from pkg.schema.models import Intent, ActionType
 
 class Oracle(BaseActor):
+    mp_charge = Column()
+
     def __init__(self, a_id, pos, config):
         super().__init__(a_id, pos, config)
         self.is_oni = False
+        self.vision_range = config["entities"].get("oracle", {}).get("vision_range", 0)
         self.mp_charge = 500
         self.max_mp_charge = 1500
         self._pathfinder = None
-        self._last_grid_hash = None
         self._oni_history = {}
         self._failure_memory = {}
 
@@ -21,10 +25,9 @@ class Oracle(BaseActor):
         if grid is None: 
             return Intent(target_pos=self.pos, priority=0)
 
-        grid_hash = hash(grid.tobytes())
-        if self._pathfinder is None or self._last_grid_hash != grid_hash:
-            self._pathfinder = Pathfinder(grid)
-            self._last_grid_hash = grid_hash
+        # 壁の変更は Pathfinder が grid の版数で追うので、作り直すのは別のグリッドを渡された時だけ
+        if self._pathfinder is None or self._pathfinder.grid is not grid:
+            self._pathfinder = create_pathfinder(grid, self.config)
 
         self._recover_mp()
         self._update_oni_history(view)
@@ -106,33 +109,45 @@ class Oracle(BaseActor):
         return None
 
     def _find_best_cell(self, grid, threats, search_range, deep_scan):
+        """
+        周囲の候補セルを近い順に評価する。decide の予算が尽きたらそこまでの最良を返す。
+        同点は走査順 (dx, dy の辞書順) の早いものを取るので、最後まで評価すれば結果は順序に依らない
+        """
+        budget = current_budget()
         best_pos = self.pos
         max_score = -float('inf')
+        best_order = None
         conn_depth = 6 if deep_scan else 3
         px, py = self.pos
-        for dx in range(-search_range, search_range + 1):
-            for dy in range(-search_range, search_range + 1):
-                candidate = (px + dx, py + dy)
-                if not self._is_valid(candidate, grid): continue
-                max_individual_threat = 0
-                for t in threats:
-                    t_pos = t["pos"]
-                    t_vel = t.get("vel", (0, 0))
-                    dist = self._l1_dist(candidate, t_pos)
-                    danger = 100 / (dist + 0.5)
-                    to_cand = np.array([candidate[0]-t_pos[0], candidate[1]-t_pos[1]])
-                    dot = np.dot(t_vel, to_cand) if np.linalg.norm(t_vel) > 0 else 0
-                    weight = 2.5 if dot > 0 else 1.0
-                    max_individual_threat = max(max_individual_threat, danger * weight)
-                connectivity = self._get_connectivity(candidate, grid, depth=conn_depth)
-                failure_penalty = self._failure_memory.get(candidate, 0) * 15
-                score = (connectivity * 10) - (max_individual_threat * 15) - (self._l1_dist(candidate, self.pos) * 2) - failure_penalty
-                if score > max_score:
-                    max_score = score
-                    best_pos = candidate
+        offsets = [
+            (dx, dy) for dx in range(-search_range, search_range + 1) for dy in range(-search_range, search_range + 1)
+        ]
+        for order in sorted(range(len(offsets)), key=lambda i: abs(offsets[i][0]) + abs(offsets[i][1])):
+            dx, dy = offsets[order]
+            candidate = (px + dx, py + dy)
+            if not self._is_valid(candidate, grid): continue
+            max_individual_threat = 0
+            for t in threats:
+                t_pos = t["pos"]
+                t_vel = t.get("vel", (0, 0))
+                dist = self._l1_dist(candidate, t_pos)
+                danger = 100 / (dist + 0.5)
+                to_cand = np.array([candidate[0]-t_pos[0], candidate[1]-t_pos[1]])
+                dot = np.dot(t_vel, to_cand) if np.linalg.norm(t_vel) > 0 else 0
+                weight = 2.5 if dot > 0 else 1.0
+                max_individual_threat = max(max_individual_threat, danger * weight)
+            connectivity, visited = self._get_connectivity(candidate, grid, depth=conn_depth, with_count=True)
+            failure_penalty = self._failure_memory.get(candidate, 0) * 15
+            score = (connectivity * 10) - (max_individual_threat * 15) - (self._l1_dist(candidate, self.pos) * 2) - failure_penalty
+            if score > max_score or (score == max_score and order < best_order):
+                max_score = score
+                best_pos = candidate
+                best_order = order
+            if budget is not None and budget.spend(visited):
+                break
         return best_pos
 
-    def _get_connectivity(self, pos, grid, depth):
+    def _get_connectivity(self, pos, grid, depth, with_count=False):
         visited = {pos}
         queue = deque([(pos, 0, 1)])
         total_score = 0
@@ -145,6 +160,8 @@ class Oracle(BaseActor):
                     visited.add(nxt)
                     queue.append((nxt, d + 1, weight))
                     total_score += (1.0 / (d + 1))
+        if with_count:
+            return total_score, len(visited)
         return total_score
 
     def _get_emergency_step(self, pos, grid):
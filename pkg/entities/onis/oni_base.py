@@ -1,9 +1,13 @@
+import copy
 import numpy as np
+from pkg.engine.actor_store import Column
+from pkg.engine.budget import current_budget
 from pkg.entities.actor import BaseActor
-from pkg.engine.pathfinder import Pathfinder
+from pkg.engine.pathfinder import create_pathfinder
 from pkg.schema.models import Intent
 
 class Oni(BaseActor):
+    ordered_decision = True
     shared_targets = {}
     shared_onis = {}
     _dijkstra_maps = {}
@@ -11,6 +15,8 @@ class Oni(BaseActor):
     _common_pathfinder = None
     _last_sync_turn = -1
 
+    role = Column()
+
     @classmethod
     def reset_shared_memory(cls):
         cls.shared_targets.clear()
@@ -20,9 +26,40 @@ class Oni(BaseActor):
         cls._common_pathfinder = None
         cls._last_sync_turn = -1
 
+    @classmethod
+    def snapshot_shared(cls, portable=False):
+        """
+        鬼の共有記憶の控え。世界を分岐させる時に restore_shared で分岐点へ戻す。
+        _global_sync と同じく派生クラスからでも Oni 自身の属性を読み書きする。
+        portable なら保存用に、作り直せる経路探索器を含めない
+        """
+        return {
+            "shared_targets": copy.deepcopy(Oni.shared_targets),
+            "shared_onis": copy.deepcopy(Oni.shared_onis),
+            # 距離場の配列は作り直されるだけで書き換えられないので共有する
+            "_dijkstra_maps": dict(Oni._dijkstra_maps),
+            "_next_intent_map": dict(Oni._next_intent_map),
+            "_common_pathfinder": None if portable else Oni._common_pathfinder,
+            "_last_sync_turn": Oni._last_sync_turn,
+        }
+
+    @classmethod
+    def restore_shared(cls, snapshot):
+        snapshot = dict(snapshot)
+        for name in ("shared_targets", "shared_onis"):
+            snapshot[name] = copy.deepcopy(snapshot[name])
+        # 共有の dict は同じオブジェクトのまま中身を入れ替える
+        for name in ("shared_targets", "shared_onis", "_dijkstra_maps", "_next_intent_map"):
+            current = getattr(Oni, name)
+            current.clear()
+            current.update(snapshot[name])
+        Oni._common_pathfinder = snapshot["_common_pathfinder"]
+        Oni._last_sync_turn = snapshot["_last_sync_turn"]
+
     def __init__(self, a_id, pos, config, role="CHASER"):
         super().__init__(a_id, pos, config)
         self.is_oni = True
+        self.vision_range = config["entities"]["oni"]["vision_range"]
         self.role = role
         self.target_id = None
 
@@ -44,11 +81,12 @@ class Oni(BaseActor):
             target_pos = self._get_strategic_patrol(grid, turn)
             priority = 20
 
-        return self._hierarchical_move(target_pos, grid, priority)
+        return self._hierarchical_move(target_pos, grid, priority, view.memory.get("planner"))
 
     def _global_sync(self, view, grid, turn):
         if Oni._last_sync_turn != turn:
-            Oni._common_pathfinder = Pathfinder(grid)
+            if Oni._common_pathfinder is None or Oni._common_pathfinder.grid is not grid:
+                Oni._common_pathfinder = create_pathfinder(grid, self.config)
             Oni._last_sync_turn = turn
             Oni._dijkstra_maps.clear()
             Oni._next_intent_map.clear()
@@ -67,7 +105,16 @@ class Oni(BaseActor):
                     eval_pos = pred_pos if self._is_valid(pred_pos, grid) else n_pos
                     
                     Oni.shared_targets[tid] = {"pos": n_pos, "pred_pos": eval_pos, "turn": turn}
-                    Oni._dijkstra_maps[tid] = Oni._common_pathfinder.generate_dijkstra_map(eval_pos)
+
+            # 前のターンまでに見た相手も _select_best_target で選ばれうるので、その分の距離場も作る
+            eval_targets = {
+                tid: info["pred_pos"] for tid, info in Oni.shared_targets.items() if turn - info["turn"] < 5
+            }
+
+            # 全ターゲットの距離場を1回の一括計算で求める
+            if eval_targets:
+                maps = Oni._common_pathfinder.generate_dijkstra_maps(list(eval_targets.values()))
+                Oni._dijkstra_maps.update(zip(eval_targets.keys(), maps))
 
     def _calculate_predatory_pos(self, info, grid):
         t_pos = np.array(info["pos"])
@@ -101,22 +148,23 @@ class Oni(BaseActor):
 
     def _get_jitter_pos(self, center, grid):
         """目的地の周辺1マスでランダムに揺らす（封鎖の厚みを出す）"""
-        rng = np.random.default_rng()
+        rng = self.rng
         candidates = [(center[0]+dx, center[1]+dy) for dx, dy in [(0,0),(0,1),(0,-1),(1,0),(-1,0)]]
         valid = [c for c in candidates if self._is_valid(c, grid)]
         return tuple(rng.choice(valid)) if valid else center
 
-    def _hierarchical_move(self, target_pos, grid, priority):
-        temp_grid = grid.copy()
-        for pos, oid in Oni._next_intent_map.items():
-            if oid < self.a_id: temp_grid[pos] = 1
-        
+    def _hierarchical_move(self, target_pos, grid, priority, planner=None):
+        # 鬼どうしの行き先の衝突は ActionResolver の予約表で解くので、ここでは最短の一歩を選ぶ
         try:
-            nxt = Pathfinder(temp_grid).get_next_step(self.pos, target_pos)
+            if planner is not None:
+                path = planner.find_path(self.pos, target_pos)
+                nxt = path[1] if path and len(path) > 1 else self.pos
+            else:
+                nxt = Oni._common_pathfinder.get_next_step(self.pos, target_pos)
             if nxt is None: raise ValueError
         except:
             # 3. 譲り合いのデッドロック解消（低確率でランダム移動）
-            rng = np.random.default_rng()
+            rng = self.rng
             if rng.random() < 0.2:
                 moves = [(self.pos[0]+dx, self.pos[1]+dy) for dx, dy in [(0,1),(0,-1),(1,0),(-1,0)]]
                 valid = [m for m in moves if self._is_valid(m, grid) and m not in Oni._next_intent_map]
@@ -136,21 +184,34 @@ class Oni(BaseActor):
 
     def _select_best_target(self, turn):
         valid_tids = [tid for tid, info in Oni.shared_targets.items() if turn - info["turn"] < 5]
-        if not valid_tids: return
+        if not valid_tids:
+            # 見失って久しい相手は追わない (距離場も作られていない)
+            self.target_id = None
+            return
         self.target_id = min(valid_tids, key=lambda tid: self._l1_dist(self.pos, Oni.shared_targets[tid]["pos"]))
 
     def _find_active_ambush(self, pred_pos, grid):
-        best_trap, min_conn = tuple(pred_pos.astype(int)), 5
-        for dx in range(-3, 4):
-            for dy in range(-3, 4):
-                p = (int(pred_pos[0]+dx), int(pred_pos[1]+dy))
-                if self._is_valid(p, grid):
-                    conn = sum(1 for m in [(0,1),(0,-1),(1,0),(-1,0)] if self._is_valid((p[0]+m[0], p[1]+m[1]), grid))
-                    if conn < min_conn:
-                        min_conn, best_trap = conn, p
+        # 予測位置に近い候補から調べ、decide の予算が尽きたらそこまでの最良を返す。同点は dx, dy の辞書順
+        budget = current_budget()
+        best_trap, min_conn, best_order = tuple(pred_pos.astype(int)), 5, None
+        offsets = [(dx, dy) for dx in range(-3, 4) for dy in range(-3, 4)]
+        for order in sorted(range(len(offsets)), key=lambda i: abs(offsets[i][0]) + abs(offsets[i][1])):
+            dx, dy = offsets[order]
+            p = (int(pred_pos[0]+dx), int(pred_pos[1]+dy))
+            if self._is_valid(p, grid):
+                conn = sum(1 for m in [(0,1),(0,-1),(1,0),(-1,0)] if self._is_valid((p[0]+m[0], p[1]+m[1]), grid))
+                if conn < min_conn or (conn == min_conn and best_order is not None and order < best_order):
+                    min_conn, best_trap, best_order = conn, p, order
+                if budget is not None and budget.spend(5):
+                    break
         return best_trap
 
     def _get_strategic_patrol(self, grid, turn):
         w, h = grid.shape
-        rng = np.random.default_rng(hash(self.a_id) + turn)
-        return (rng.integers(0, w), rng.integers(0, h))
+        # 巡回先はターンごとに決め直す。_make_rng と同じく world.seed と id から作り、プロセスに依らない
+        seed = self.config.get("world", {}).get("seed")
+        if seed is None:
+            rng = self.rng
+        else:
+            rng = np.random.default_rng([int(seed), *str(self.a_id).encode(), int(turn)])
+        return (int(rng.integers(0, w)), int(rng.integers(0, h)))
@@ -7,6 +7,14 @@ class EntityMemory:
         self.prediction_map = {}
         self.grid_map = None
 
+    def clone(self):
+        twin = EntityMemory()
+        twin.known_elements = dict(self.known_elements)
+        twin.seen_actors = dict(self.seen_actors)
+        twin.prediction_map = {a_id: list(trail) for a_id, trail in self.prediction_map.items()}
+        twin.grid_map = self.grid_map
+        return twin
+
     def update_prediction(self, a_id, pos):
         if a_id not in self.prediction_map:
             self.prediction_map[a_id] = []
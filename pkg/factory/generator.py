@@ -3,7 +3,6 @@ import yaml
 import os
 from pathlib import Path
 import numpy as np
-import random
 import heapq
 import copy
 from enum import Enum, IntEnum
@@ -173,21 +172,94 @@ class WorldState:
         return new_state
 
 class WorldGenerator:
+    """
+    設定から初期の pkg.engine.state.WorldState を作る。盤面は world.grid_size / wall_density の
+    乱数の壁で、中央から行けない所は壁で埋めるので、開いたセルはすべてつながっている。
+    出口は world.exit_pos (なければ中央から一番遠いセル) で、決めた位置は状態の exit_pos に入る。
+    config は書き換えないので、同じ設定を種を変えて使い回してよい。
+    アクターは entities の human / oracle / oni の count 体ずつ。鬼は人間から遠い側に置き、
+    役割は ONI_ROLES を順に割り当てる。鍵は game_rules.total_keys_spawned 個で、
+    fake_key_ratio の割合を偽物にする。同じ seed なら同じ世界になる。
+    """
+
+    ONI_ROLES = ("CHASER", "BLOCKER", "AMBUSHER")
+
     def __init__(self, seed=None):
-        self.seed=seed
-        if seed is not None:
-            random.seed(seed)
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
     def build_initial_state(self, config):
-        from pkg.engine.grid import Grid
-        from pkg.engine.actor import Actor
-        grid=Grid(config["world"]["width"],config["world"]["height"])
-        actors={}
-        for a_cfg in config["actors"]:
-            actors[a_cfg["id"]]=Actor(**a_cfg)
-        elements={}
-        exit_pos=tuple(config["world"]["exit_pos"])
-        max_turns=config["world"]["max_turns"]
-        return WorldState(grid,actors,elements,exit_pos,max_turns)
+        from pkg.engine.map.mapelement import ElementType, MapItem
+        from pkg.engine.search import DistanceField
+        from pkg.engine.state import WorldState
+        from pkg.entities.humans.human_base import Human
+        from pkg.entities.humans.oracle import Oracle
+        from pkg.entities.onis.oni_base import Oni
+
+        world = config["world"]
+        entities = config["entities"]
+        rules = config.get("game_rules", {})
+        size = world["grid_size"]
+        rng = self.rng
+
+        grid = (rng.random((size, size)) < world.get("wall_density", 0.2)).astype(int)
+        center = (size // 2, size // 2)
+        grid[center] = 0
+        field = DistanceField(grid)
+        seeds = np.zeros(grid.shape, dtype=bool)
+        seeds[center] = True
+        from_center = field.compute(seeds)
+        grid[np.isinf(from_center)] = 1
+
+        if world.get("exit_pos") is not None:
+            exit_pos = tuple(int(v) for v in world["exit_pos"])
+            if grid[exit_pos] != 0:
+                raise ValueError(f"exit_pos is not an open cell: {exit_pos}")
+        else:
+            exit_pos = tuple(int(v) for v in np.unravel_index(np.argmax(np.where(grid == 0, from_center, -1)), grid.shape))
+
+        free = [tuple(int(v) for v in cell) for cell in np.argwhere(grid == 0) if tuple(cell) != exit_pos]
+        counts = {kind: entities.get(kind, {}).get("count", 0) for kind in ("human", "oracle", "oni")}
+        needed = sum(counts.values()) + rules.get("total_keys_spawned", 0)
+        if needed > len(free):
+            raise ValueError(f"Not enough open cells: {needed} needed, {len(free)} available")
+        order = rng.permutation(len(free)).tolist()
+
+        actor_data = {}
+        taken = set()
+        human_cells = []
+        for kind, cls in (("human", Human), ("oracle", Oracle)):
+            for i in range(counts[kind]):
+                pos = free[order.pop()]
+                taken.add(pos)
+                human_cells.append(pos)
+                a_id = f"{kind}_{i}"
+                actor_data[a_id] = cls(a_id, pos, config)
+
+        # 鬼は人間からの距離が中央値以上のセルから選ぶ
+        if counts["oni"]:
+            seeds = np.zeros(grid.shape, dtype=bool)
+            for pos in human_cells:
+                seeds[pos] = True
+            from_humans = field.compute(seeds) if human_cells else from_center
+            cutoff = np.median([from_humans[free[i]] for i in order])
+            far = [i for i in order if from_humans[free[i]] >= cutoff]
+            for i in range(counts["oni"]):
+                cell = far.pop()
+                order.remove(cell)
+                pos = free[cell]
+                taken.add(pos)
+                a_id = f"oni_{i}"
+                actor_data[a_id] = Oni(a_id, pos, config, role=self.ONI_ROLES[i % len(self.ONI_ROLES)])
+
+        items = {exit_pos: MapItem(exit_pos, ElementType.EXIT)}
+        n_keys = rules.get("total_keys_spawned", 0)
+        n_fake = int(round(n_keys * rules.get("fake_key_ratio", 0.0)))
+        for i in range(n_keys):
+            pos = free[order.pop()]
+            items[pos] = MapItem(pos, ElementType.KEY, {"fake": i < n_fake})
+
+        return WorldState(grid, actor_data, {"items": items}, config, exit_pos=exit_pos)
 
 def load_config(config_path: str) -> dict:
     with open(config_path, "r", encoding="utf-8") as f:
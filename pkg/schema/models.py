@@ -1,4 +1,4 @@
-from enum import Enum, auto
+from enum import Enum, IntEnum, auto
 from typing import List, Dict, Tuple, Optional, Any
 from pydantic import BaseModel, Field
 
@@ -7,7 +7,7 @@ class ActionType(Enum):
     STAY = auto()
     SKILL = auto()
 
-class Priority(Enum):
+class Priority(IntEnum):
     LOW = 0
     WAIT = 10
     MOVE_DEFAULT = 20
@@ -40,6 +40,19 @@ class LocalView(BaseModel):
 
 class Intent(BaseModel):
     target_pos: Tuple[int, int]
-    priority: Priority = Priority.MOVE_DEFAULT
+    # Priority の値に限らない整数 (大きいほど先に動く)
+    priority: int = Priority.MOVE_DEFAULT
     action_type: ActionType = ActionType.MOVE
     metadata: Dict[str, Any] = Field(default_factory=dict)
+
+class Action(BaseModel):
+    target_pos: Optional[Tuple[int, int]]
+    status_update: Dict[str, Any] = Field(default_factory=dict)
+
+class StepResult(BaseModel):
+    turn: int
+    snapshot: Dict[str, Dict[str, Any]]
+    intents: Dict[str, Intent]
+    actions: Dict[str, Action]
+    is_terminal: bool
+    termination_reason: str = ""
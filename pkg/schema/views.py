@@ -0,0 +1,48 @@
+from types import MappingProxyType, SimpleNamespace
+
+_UNSET = object()
+
+class LazyLocalView:
+    """
+    LocalView と同じ属性 (pos / actors / elements / memory) を持つ遅延版の視界。
+    actors / elements / memory は最初に読まれた時に source から組み立てるので、
+    スタン中などで視界を読まないアクターには何も確保しない。
+    """
+
+    __slots__ = ("pos", "_source", "_actor", "_state", "_v_range", "_actors", "_elements", "_memory")
+
+    def __init__(self, source, actor, state, v_range):
+        self.pos = actor.pos
+        self._source = source
+        self._actor = actor
+        self._state = state
+        self._v_range = v_range
+        self._actors = _UNSET
+        self._elements = _UNSET
+        self._memory = _UNSET
+
+    @property
+    def actors(self):
+        if self._actors is _UNSET:
+            self._actors = self._source.visible_actors(self._actor, self._state, self._v_range)
+        return self._actors
+
+    @property
+    def elements(self):
+        if self._elements is _UNSET:
+            self._elements = self._source.visible_elements(self._actor, self._state, self._v_range)
+        return self._elements
+
+    @property
+    def memory(self):
+        if self._memory is _UNSET:
+            self._memory = MappingProxyType(self._source.view_memory(self._actor, self._state))
+        return self._memory
+
+    def freeze(self, drop=()):
+        """全フィールドを確定させた pickle できる複製。memory は読み取り専用の包みを外した dict にする"""
+        memory = {
+            k: dict(v) if isinstance(v, MappingProxyType) else v
+            for k, v in self.memory.items() if k not in drop
+        }
+        return SimpleNamespace(pos=self.pos, actors=self.actors, elements=self.elements, memory=memory)
@@ -0,0 +1,339 @@
+import asyncio
+import copy
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from pkg.engine.core import SimulationCore
+from pkg.entities.onis.oni_base import Oni
+from pkg.factory.generator import WorldGenerator
+from pkg.utils.random_manager import RandomManager
+
+_END = object()
+
+def session_config(config, seed, world=None):
+    """1セッション分の設定。ターン中のスレッド並列と保存は切り、world で個別に上書きできる"""
+    config = copy.deepcopy(config)
+    config["seed"] = seed
+    base = config["world"]
+    base["seed"] = seed
+    base["executor"] = "serial"
+    base["checkpoint_dir"] = None
+    base["replay_path"] = None
+    base["keep_history"] = False
+    base.update(world or {})
+    return config
+
+class Subscription:
+    """
+    1つの購読者に渡す step の結果の列。async for で読み、セッションが終われば止まる。
+    列は maxsize 件まで。満杯の時、drop=False ならセッションは読まれるまで次のターンへ進まず、
+    drop=True なら古いものから捨てて進む (観戦用。捨てた数は dropped)。
+    """
+
+    def __init__(self, session, maxsize, drop=False):
+        if maxsize < 1:
+            raise ValueError(f"subscription maxsize must be positive: {maxsize}")
+        self.session = session
+        self.queue = asyncio.Queue(maxsize)
+        self.drop = drop
+        self.dropped = 0
+        self._closed = False
+
+    async def put(self, item):
+        if self.drop:
+            if self.queue.full():
+                self.queue.get_nowait()
+                self.dropped += 1
+            self.queue.put_nowait(item)
+        else:
+            await self.queue.put(item)
+
+    def finish(self):
+        self._closed = True
+        if not self.queue.full():
+            self.queue.put_nowait(_END)
+
+    def unsubscribe(self):
+        """購読をやめる。読み残しは捨て、書き込みで待っているセッションも先へ進める"""
+        self.session._subscribers.remove(self)
+        self._closed = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed and self.queue.empty():
+            raise StopAsyncIteration
+        item = await self.queue.get()
+        if item is _END:
+            raise StopAsyncIteration
+        return item
+
+class Session:
+    """
+    SessionManager の上で回る1つのシミュレーション。pause / resume / step(n) で進め方を変え、
+    apply(fn) でターンの合間に状態へ手を入れる。作った時点では running なので、
+    最初のターンから結果を受けたい時は paused で作り、subscribe してから resume する。
+    """
+
+    def __init__(self, manager, session_id, core, turn_interval=0):
+        self.id = session_id
+        self.core = core
+        self.turn_interval = turn_interval
+        self.error = None
+        self.finished = False
+        self._manager = manager
+        # 他のセッションとの切り替えで退避するグローバルな状態 (乱数と鬼の共有記憶)
+        self._context = None
+        self._shared_classes = {
+            type(a) for a in core.state.actor_data.values() if hasattr(type(a), "snapshot_shared")
+        }
+        self._running = asyncio.Event()
+        self._running.set()
+        self._credits = 0
+        self._subscribers = []
+        self._task = None
+
+    @property
+    def status(self):
+        if self.finished:
+            return "failed" if self.error else "finished"
+        return "running" if self._running.is_set() else "paused"
+
+    def describe(self):
+        state = self.core.state
+        return {
+            "session": self.id,
+            "status": self.status,
+            "turn": state.turn,
+            "is_terminal": state.is_terminal,
+            "termination_reason": state.termination_reason,
+            "subscribers": len(self._subscribers),
+            "error": self.error,
+        }
+
+    def pause(self):
+        self._credits = 0
+        self._running.clear()
+
+    def resume(self):
+        self._credits = 0
+        self._running.set()
+
+    def step(self, n=1):
+        """n ターン進めて止まる"""
+        if n < 1:
+            raise ValueError(f"step count must be positive: {n}")
+        self._credits = n
+        self._running.set()
+
+    def subscribe(self, maxsize=None, drop=False):
+        subscription = Subscription(self, maxsize or self._manager.buffer, drop)
+        if self.finished:
+            subscription.finish()
+        else:
+            self._subscribers.append(subscription)
+        return subscription
+
+    async def apply(self, fn):
+        """ターンの合間に fn(core) を呼び、その戻り値を返す (壁を変える・アクターを動かすなど)"""
+        return await self._manager._turn(self, fn, self.core)
+
+    async def wait(self):
+        """セッションが終わるまで待つ"""
+        await asyncio.shield(self._task)
+
+    async def _run(self):
+        try:
+            while not self.core.state.is_terminal:
+                await self._running.wait()
+                result = await self._manager._turn(self, self.core.step)
+                if self._credits:
+                    self._credits -= 1
+                    if not self._credits:
+                        self._running.clear()
+                for subscription in list(self._subscribers):
+                    await subscription.put(result)
+                # 他のセッションの番を挟むため、間を置かない時も一度ループへ戻る
+                await asyncio.sleep(self.turn_interval)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.finished = True
+            self._running.clear()
+            self.core.close()
+            self._manager._release(self)
+            for subscription in self._subscribers:
+                subscription.finish()
+
+class SessionManager:
+    """
+    多数のシミュレーションを1つのイベントループで回す。各セッションは自分のタスクで1ターンずつ進み、
+    ターンの計算は専用のワーカースレッドに渡すので、その間もループは他のセッションや制御を捌ける。
+
+    ターンは1つずつ、待ちに来た順に回す。鬼の共有記憶・大域の乱数・PATH_CACHE の phase は
+    プロセスで1つなので、ターンを並べて走らせると混ざるため。セッションを切り替える時には
+    乱数と共有記憶を退避・復元する。PATH_CACHE はセッションどうしで共有したままだが、
+    完全一致の経路 (探索し直しても同じになるもの) しか返さないので結果には効かない。
+    このため各セッションの結果は単独で回した時と同じになる。
+
+    結果は購読 (Subscription) ごとの有限の列に流す。読み遅れた購読者がいれば、そのセッションだけが止まる。
+    handle は辞書のメッセージを受ける入口で、LocalClient や通信層はここを通す。
+    """
+
+    def __init__(self, config, learning_cfg, max_sessions=None, buffer=None, turn_interval=None):
+        server = config.get("server", {})
+        self.config = config
+        self.learning_cfg = learning_cfg
+        self.max_sessions = max_sessions or server.get("max_sessions")
+        self.buffer = buffer or server.get("buffer", 8)
+        self.turn_interval = turn_interval if turn_interval is not None else server.get("turn_interval", 0)
+        self.sessions = {}
+        self._ids = itertools.count(1)
+        self._lock = asyncio.Lock()
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="session-turn")
+        self._loaded = None
+
+    async def create(self, seed=None, world=None, paused=False):
+        """seed から世界を作ってセッションを始める。world で world 設定の一部を上書きできる"""
+        config = session_config(self.config, seed, world)
+
+        def build():
+            Oni.reset_shared_memory()
+            random_manager = RandomManager(seed)
+            state = WorldGenerator(seed=seed).build_initial_state(config)
+            return SimulationCore(state, config, self.learning_cfg, random_manager=random_manager)
+
+        return await self.open(build, paused)
+
+    async def open(self, build, paused=False):
+        """
+        build() が返す SimulationCore をセッションとして回す。build はターンと同じワーカーで呼ぶので、
+        中で乱数や鬼の共有記憶を初期化してよい (他のセッションの分は退避済み)
+        """
+        # 終わっても close されていないセッションも数える
+        if self.max_sessions is not None and len(self.sessions) >= self.max_sessions:
+            raise ValueError(f"Too many sessions: {self.max_sessions}")
+        session_id = f"s{next(self._ids)}"
+        core = await self._turn(None, build)
+        session = Session(self, session_id, core, self.turn_interval)
+        # build 直後のグローバルな状態が、このセッションの初期状態
+        self._loaded = session
+        self.sessions[session_id] = session
+        if paused:
+            session.pause()
+        session._task = asyncio.get_running_loop().create_task(session._run())
+        return session
+
+    def get(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise ValueError(f"Unknown session: {session_id}")
+        return session
+
+    async def close_session(self, session_id):
+        """止めて一覧から外す。終わったセッションも close されるまでは状態を問い合わせられる"""
+        session = self.get(session_id)
+        session._task.cancel()
+        try:
+            await session._task
+        except asyncio.CancelledError:
+            pass
+        del self.sessions[session_id]
+
+    async def _turn(self, session, fn, *args):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._call, session, fn, args)
+
+    def _call(self, session, fn, args):
+        # ワーカースレッドで動く。前と違うセッションなら、グローバルな状態を入れ替えてから呼ぶ
+        if self._loaded is not session:
+            if self._loaded is not None:
+                self._loaded._context = self._capture(self._loaded)
+            if session is not None:
+                self._restore(session)
+            self._loaded = session
+        return fn(*args)
+
+    def _capture(self, session):
+        return {
+            "random": session.core.random_manager.get_state(),
+            "shared": {cls: cls.snapshot_shared() for cls in session._shared_classes},
+        }
+
+    def _restore(self, session):
+        context = session._context
+        session.core.random_manager.set_state(context["random"])
+        for cls, snapshot in context["shared"].items():
+            cls.restore_shared(snapshot)
+
+    def _release(self, session):
+        if self._loaded is session:
+            self._loaded = None
+
+    async def close(self):
+        for session_id in list(self.sessions):
+            await self.close_session(session_id)
+        self._executor.shutdown()
+
+    async def handle(self, message):
+        """{"op": ..., ...} を受けて {"ok": bool, ...} を返す。例外は投げず、失敗は ok=False と error で返す"""
+        try:
+            op = message.get("op")
+            if op == "create":
+                session = await self.create(message.get("seed"), message.get("world"), message.get("paused", False))
+                return {"ok": True, **session.describe()}
+            if op == "list":
+                return {"ok": True, "sessions": [s.describe() for s in self.sessions.values()]}
+            if op not in ("status", "pause", "resume", "step", "close"):
+                raise ValueError(f"Unknown op: {op}")
+            session = self.get(message.get("session"))
+            if op == "pause":
+                session.pause()
+            elif op == "resume":
+                session.resume()
+            elif op == "step":
+                session.step(message.get("n", 1))
+            elif op == "close":
+                await self.close_session(session.id)
+            return {"ok": True, **session.describe()}
+        except ValueError as e:
+            return {"ok": False, "error": str(e)}
+        except Exception as e:
+            # 世界の生成などで落ちても、呼び出し側には失敗の返事として返す
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+class LocalClient:
+    """同じプロセスから SessionManager.handle を呼ぶクライアント。通信層を挟まずに試せる"""
+
+    def __init__(self, manager):
+        self.manager = manager
+
+    async def request(self, op, **fields):
+        reply = await self.manager.handle({"op": op, **fields})
+        if not reply["ok"]:
+            raise ValueError(reply["error"])
+        return reply
+
+    async def create(self, seed=None, world=None, paused=False):
+        return (await self.request("create", seed=seed, world=world, paused=paused))["session"]
+
+    async def status(self, session_id):
+        return await self.request("status", session=session_id)
+
+    async def pause(self, session_id):
+        return await self.request("pause", session=session_id)
+
+    async def resume(self, session_id):
+        return await self.request("resume", session=session_id)
+
+    async def step(self, session_id, n=1):
+        return await self.request("step", session=session_id, n=n)
+
+    async def close(self, session_id):
+        return await self.request("close", session=session_id)
+
+    def watch(self, session_id, maxsize=None, drop=False):
+        return self.manager.get(session_id).subscribe(maxsize, drop)
@@ -0,0 +1,208 @@
+import heapq
+import json
+import threading
+import time
+from collections import deque
+import numpy as np
+
+class _Series:
+    """1つのタイマーの累計と、直近 window 回分の所要時間 (秒)"""
+
+    __slots__ = ("count", "total", "max", "recent")
+
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.recent.append(seconds)
+
+class Profiler:
+    """
+    ターンの区間ごと・アクタークラスごとの所要時間と、探索や視線判定の回数を集める。
+    無効の間は lap / call / count がすぐ戻るだけなので、常に呼んでおいてよい。
+    ホットパスでは `if PROFILER.enabled:` で囲んで呼ぶこと。
+
+    所要時間は累計に加えて直近 window 回分を持ち、分位点とヒストグラムはその範囲で求める。
+    1ターン全体が遅かった上位 slowest 件は、区間ごとの内訳・カウンタの増分と、
+    再現に要る種・ターン開始時の乱数状態・直前のチェックポイントと一緒に残す。
+    process モードのワーカー内で数えた分は親に戻らない。
+    """
+
+    # ヒストグラムの区切り (秒)
+    BUCKETS = (1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 1e-1, 5e-1)
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, window=1024, slowest=10):
+        self.enabled = False
+        self.window = window
+        self.slowest = slowest
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self, window=None, slowest=None):
+        if window is not None:
+            self.window = window
+        if slowest is not None:
+            self.slowest = slowest
+        self.reset()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self.timers = {}
+            self.counters = {}
+            self.turns = 0
+            self._slow = []
+            self._turn = None
+
+    def record(self, name, seconds):
+        with self._lock:
+            series = self.timers.get(name)
+            if series is None:
+                series = self.timers[name] = _Series(self.window)
+            series.add(seconds)
+            if self._turn is not None and name != "step":
+                phases = self._turn["phases"]
+                phases[name] = phases.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def call(self, name, fn, *args):
+        """fn(*args) を呼び、所要時間を name に積む"""
+        if not self.enabled:
+            return fn(*args)
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def begin_turn(self, turn, context=None):
+        """
+        ターンの計測を始める。context はこのターンを再現するための情報 (種や乱数の状態) で、
+        遅いターンに選ばれた時だけ残る。呼び出し可能なら、選ばれた時に初めて呼んで中身を作る
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self._lock:
+            self._turn = {
+                "turn": turn,
+                "start": now,
+                "mark": now,
+                "phases": {},
+                "counters": dict(self.counters),
+                "context": context,
+            }
+
+    def lap(self, phase):
+        """前の lap (またはターン開始) からの時間を区間 phase として積む"""
+        if not self.enabled or self._turn is None:
+            return
+        now = time.perf_counter()
+        self.record(f"step.{phase}", now - self._turn["mark"])
+        self._turn["mark"] = now
+
+    def end_turn(self):
+        if not self.enabled or self._turn is None:
+            return
+        turn, self._turn = self._turn, None
+        seconds = time.perf_counter() - turn["start"]
+        self.record("step", seconds)
+        self.turns += 1
+        if self.slowest <= 0 or (len(self._slow) >= self.slowest and seconds <= self._slow[0][0]):
+            return
+        before = turn["counters"]
+        context = turn["context"]
+        if callable(context):
+            context = context()
+        entry = {
+            "turn": turn["turn"],
+            "seconds": seconds,
+            "phases": turn["phases"],
+            "counters": {k: v - before.get(k, 0) for k, v in self.counters.items() if v != before.get(k, 0)},
+            "context": context,
+        }
+        # 同じ秒数のものは turn で順序を付ける (dict どうしを比べない)
+        item = (seconds, turn["turn"], entry)
+        if len(self._slow) < self.slowest:
+            heapq.heappush(self._slow, item)
+        else:
+            heapq.heapreplace(self._slow, item)
+
+    def slow_turns(self):
+        """遅かったターンを遅い順に"""
+        return [entry for _, _, entry in sorted(self._slow, key=lambda item: -item[0])]
+
+    def report(self):
+        timers = {}
+        for name, series in sorted(self.timers.items()):
+            recent = np.fromiter(series.recent, dtype=float, count=len(series.recent))
+            stats = {
+                "count": series.count,
+                "total": series.total,
+                "mean": series.total / series.count,
+                "max": series.max,
+            }
+            for q, v in zip(self.QUANTILES, np.quantile(recent, self.QUANTILES)):
+                stats[f"p{round(q * 100)}"] = float(v)
+            edges = (0.0, *self.BUCKETS, np.inf)
+            stats["histogram"] = {
+                "edges": list(self.BUCKETS),
+                "counts": np.histogram(recent, bins=edges)[0].tolist(),
+            }
+            timers[name] = stats
+        return {
+            "turns": self.turns,
+            "timers": timers,
+            "counters": dict(sorted(self.counters.items())),
+            "slow_turns": self.slow_turns(),
+        }
+
+    def to_json(self, path=None):
+        text = json.dumps(self.report(), indent=2, ensure_ascii=False, default=_jsonable)
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        return text
+
+    def format_table(self):
+        report = self.report()
+        lines = [f"{'timer': <32}{'count': >8}{'total ms': >11}{'mean us': >10}{'p50 us': >10}{'p99 us': >10}{'max us': >10}"]
+        for name, s in report["timers"].items():
+            lines.append(
+                f"{name: <32}{s['count']: >8}{s['total'] * 1e3: >11.1f}{s['mean'] * 1e6: >10.1f}"
+                f"{s['p50'] * 1e6: >10.1f}{s['p99'] * 1e6: >10.1f}{s['max'] * 1e6: >10.1f}"
+            )
+        for name, n in report["counters"].items():
+            lines.append(f"{name: <32}{n: >8}")
+        for entry in report["slow_turns"]:
+            phases = " ".join(f"{k}={v * 1e3:.2f}" for k, v in entry["phases"].items())
+            lines.append(f"slow turn {entry['turn']: >5}: {entry['seconds'] * 1e3:.2f} ms  {phases}")
+        return "\n".join(lines)
+
+def _jsonable(value):
+    # 乱数の状態などに含まれる numpy の値を JSON に落とす
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return repr(value)
+
+PROFILER = Profiler()
@@ -0,0 +1,21 @@
+import copy
+import pytest
+import yaml
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+_CONFIG = _load("config/settings/global_constants.yaml")
+_LEARNING = _load("config/settings/learning.yaml")
+
+@pytest.fixture
+def config():
+    """既定の設定を短いエピソード向けにしたもの。テストごとに複製を渡す"""
+    config = copy.deepcopy(_CONFIG)
+    config["world"]["max_turns"] = 20
+    return config
+
+@pytest.fixture
+def learning_cfg():
+    return copy.deepcopy(_LEARNING)
@@ -0,0 +1,52 @@
+import copy
+import pytest
+from pkg.analysis.batch import BatchRunner, episode_seeds, run_episode
+from pkg.factory.generator import WorldGenerator
+
+def test_world_generator_builds_real_actors(config):
+    state = WorldGenerator(seed=3).build_initial_state(config)
+    kinds = sorted(type(a).__name__ for a in state.actor_data.values())
+    assert kinds == ["Human"] * 7 + ["Oni"] * 3 + ["Oracle"]
+    assert state.grid[state.exit_pos] == 0
+    for actor in state.actor_data.values():
+        assert state.grid[actor.pos] == 0
+
+def test_world_generator_is_seeded(config):
+    a = WorldGenerator(seed=5).build_initial_state(config)
+    b = WorldGenerator(seed=5).build_initial_state(config)
+    assert (a.grid == b.grid).all()
+    assert {k: v.pos for k, v in a.actor_data.items()} == {k: v.pos for k, v in b.actor_data.items()}
+    assert a.grid_items.keys() == b.grid_items.keys()
+
+def test_run_episode_plays_to_the_end(config, learning_cfg):
+    report = run_episode(config, learning_cfg, seed=11)
+    assert "error" not in report
+    assert report["turn_count"] <= config["world"]["max_turns"]
+    assert report["termination_reason"]
+    assert report == run_episode(config, learning_cfg, seed=11)
+
+def test_batch_runner_inline(config, learning_cfg):
+    summary = BatchRunner(config, learning_cfg, 2, base_seed=1, workers=1).run()
+    assert summary["completed"] == 2
+    assert summary["failed"] == 0
+    assert sum(summary["termination_reasons"].values()) == 2
+
+def test_batch_runner_fails_fast_when_every_episode_errors(config, learning_cfg):
+    # 3x3 の盤面には全員と鍵を置けない
+    config["world"]["grid_size"] = 3
+    runner = BatchRunner(config, learning_cfg, 20, workers=1)
+    with pytest.raises(RuntimeError, match="Not enough open cells"):
+        runner.run()
+
+def test_same_seed_twice_in_one_process(config, learning_cfg):
+    # 先に回したエピソードの経路キャッシュが、後の同じ種の結果を変えない
+    config["world"]["max_turns"] = 60
+    seed = episode_seeds(1, 6)[4]
+    assert run_episode(config, learning_cfg, seed) == run_episode(config, learning_cfg, seed)
+
+def test_world_generator_leaves_config_alone(config):
+    # 1つの設定を種を変えて使い回しても、前の世界の出口に縛られない
+    before = copy.deepcopy(config)
+    exits = {WorldGenerator(seed=seed).build_initial_state(config).exit_pos for seed in (7, 8)}
+    assert config == before
+    assert len(exits) == 2
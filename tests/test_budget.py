@@ -0,0 +1,47 @@
+import numpy as np
+from pkg.engine.budget import _CURRENT, DecisionBudget
+from pkg.engine.incremental import AdaptivePlanner
+from pkg.engine.search import GridSearch
+
+def _search(engine, start, goal, nodes=10**9):
+    budget = DecisionBudget(nodes=nodes)
+    token = _CURRENT.set(budget)
+    try:
+        before = engine.expanded
+        path = engine.find_path(start, goal)
+    finally:
+        _CURRENT.reset(token)
+    return path, budget, engine.expanded - before
+
+def _grid():
+    grid = np.zeros((30, 30), dtype=int)
+    grid[5:25, 15] = 1
+    # 右下の角は壁で閉じて届かない
+    grid[27, 27:] = 1
+    grid[27:, 27] = 1
+    return grid
+
+def test_grid_search_charges_every_expansion():
+    engine = GridSearch(_grid())
+    path, budget, expanded = _search(engine, (15, 2), (15, 28))
+    assert path[-1] == (15, 28)
+    assert expanded % 64 and budget.used == expanded
+    path, budget, expanded = _search(engine, (0, 0), (29, 29))
+    assert path is None
+    assert budget.used == expanded
+
+def test_incremental_planner_charges_every_expansion():
+    planner = AdaptivePlanner(_grid())
+    path, budget, expanded = _search(planner, (15, 2), (15, 28))
+    assert path[-1] == (15, 28)
+    assert budget.used == expanded
+    path, budget, expanded = _search(planner, (0, 0), (29, 29))
+    assert path is None
+    assert budget.used == expanded
+
+def test_exhausted_search_is_truncated():
+    engine = GridSearch(_grid())
+    path, budget, expanded = _search(engine, (15, 2), (15, 28), nodes=64)
+    assert budget.exhausted and engine.truncated
+    assert budget.used == expanded == 64
+    assert path[0] == (15, 2)
@@ -0,0 +1,77 @@
+import copy
+import numpy as np
+from pkg.engine.actor_store import ForkedActors
+from pkg.engine.checkpoint import Checkpointer
+from pkg.engine.core import SimulationCore
+from pkg.entities.onis.oni_base import Oni
+from pkg.factory.generator import WorldGenerator
+from pkg.utils.random_manager import RandomManager
+
+def _core(config, learning_cfg, seed=6):
+    config["world"]["seed"] = seed
+    config["world"]["headless"] = True
+    Oni.reset_shared_memory()
+    random_manager = RandomManager(seed)
+    state = WorldGenerator(seed=seed).build_initial_state(config)
+    return SimulationCore(state, config, learning_cfg, random_manager=random_manager)
+
+def _columns(state):
+    store = state.store
+    return {name: store.column(name).copy() for name in ("pos", "alive", "escaped")}
+
+def test_resume_is_bit_exact(config, learning_cfg, tmp_path):
+    config["world"]["checkpoint_dir"] = str(tmp_path)
+    config["world"]["checkpoint_interval"] = 5
+    config["world"]["checkpoint_keep"] = None
+    core = _core(config, learning_cfg)
+    for _ in range(15):
+        core.step()
+    core.close()
+    expected = _columns(core.state)
+
+    config["world"]["checkpoint_dir"] = None
+    resumed = SimulationCore.resume(tmp_path / "turn_000010.ckpt", config, learning_cfg, RandomManager())
+    assert resumed.state.turn == 10
+    for _ in range(5):
+        resumed.step()
+    resumed.close()
+    actual = _columns(resumed.state)
+    for name, column in expected.items():
+        np.testing.assert_array_equal(actual[name], column, err_msg=name)
+
+def test_repeated_forks_do_not_nest(config, learning_cfg):
+    core = _core(config, learning_cfg)
+    state = core.state
+    for _ in range(10):
+        core.step()
+        twin = state.fork()
+        for actors in (state.actor_data, twin.actor_data):
+            assert isinstance(actors, ForkedActors)
+            assert not isinstance(actors._source, ForkedActors)
+    core.close()
+
+def test_checkpointer_keeps_the_chain_flat(config, learning_cfg, tmp_path):
+    config["world"]["checkpoint_dir"] = str(tmp_path)
+    config["world"]["checkpoint_interval"] = 1
+    core = _core(config, learning_cfg)
+    for _ in range(12):
+        core.step()
+    core.close()
+    assert not isinstance(core.state.actor_data._source, ForkedActors)
+    assert len(list(tmp_path.glob("*" + Checkpointer.SUFFIX))) == config["world"]["checkpoint_keep"]
+
+def test_resume_with_freshly_loaded_config(config, learning_cfg, tmp_path):
+    # main.py の再開は生成器を通っていない設定で読む
+    fresh = copy.deepcopy(config)
+    config["world"]["checkpoint_dir"] = str(tmp_path)
+    config["world"]["checkpoint_interval"] = 5
+    core = _core(config, learning_cfg)
+    for _ in range(5):
+        core.step()
+    core.close()
+    assert fresh["world"].get("exit_pos") is None
+    resumed = SimulationCore.resume(Checkpointer.latest(tmp_path), fresh, learning_cfg, RandomManager())
+    assert resumed.state.turn == 5
+    assert resumed.state.exit_pos == core.state.exit_pos
+    resumed.step()
+    resumed.close()
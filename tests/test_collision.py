@@ -0,0 +1,54 @@
+import numpy as np
+from pkg.engine.collision import first_contacts, pad_paths
+from pkg.engine.visibility import has_wall_between
+
+def _pairwise(h_paths, o_paths, los):
+    # 一括化する前の ActionResolver._resolve_combat_refined の判定 (人間ごとに最初に当たった鬼)
+    caught = []
+    for h_path in h_paths:
+        hit = -1
+        for o, o_path in enumerate(o_paths):
+            if h_path[-1] == o_path[-1]:
+                collision = los(h_path[0], o_path[0])
+            elif len(set(h_path) & set(o_path)) > 1:
+                collision = los(h_path[0], o_path[0]) or any(
+                    los(h_p, o_p) for h_p, o_p in zip(h_path[1:], o_path[1:])
+                )
+            else:
+                collision = False
+            if collision:
+                hit = o
+                break
+        caught.append(hit)
+    return caught
+
+def _walk(rng, size, steps):
+    path = [tuple(int(v) for v in rng.integers(0, size, 2))]
+    for _ in range(steps):
+        y, x = path[-1]
+        dy, dx = rng.integers(-1, 2, 2)
+        path.append((int(np.clip(y + dy, 0, size - 1)), int(np.clip(x + dx, 0, size - 1))))
+    return path
+
+def test_matches_pairwise_rules_on_random_paths():
+    rng = np.random.default_rng(0)
+    contacts = 0
+    for _ in range(3000):
+        size = 6
+        grid = (rng.random((size, size)) < 0.2).astype(int)
+        los = lambda a, b: not has_wall_between(a, b, grid)
+        h_paths = [_walk(rng, size, int(rng.integers(0, 3))) for _ in range(int(rng.integers(1, 4)))]
+        o_paths = [_walk(rng, size, int(rng.integers(0, 3))) for _ in range(int(rng.integers(1, 4)))]
+        expected = _pairwise(h_paths, o_paths, los)
+        width = max(len(p) for p in h_paths + o_paths)
+        h_cells, h_len = pad_paths(h_paths, width)
+        o_cells, o_len = pad_paths(o_paths, width)
+        actual = first_contacts(
+            h_cells, h_len, o_cells, o_len,
+            lambda h, o: los(h_paths[h][0], o_paths[o][0]),
+            lambda src, dst: np.array([los(tuple(a), tuple(b)) for a, b in zip(src.tolist(), dst.tolist())], dtype=bool),
+        )
+        assert actual.tolist() == expected, (h_paths, o_paths)
+        contacts += sum(o >= 0 for o in expected)
+    # 接触のある場面を十分に含んでいること
+    assert contacts > 300
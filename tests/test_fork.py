@@ -0,0 +1,58 @@
+import numpy as np
+from benchmarks.bench_headless import make_core
+
+def _columns(state):
+    store = state.store
+    return {name: store.column(name).copy() for name in ("pos", "alive", "escaped")}
+
+def _assert_same(a, b):
+    assert a.keys() == b.keys()
+    for name in a:
+        np.testing.assert_array_equal(a[name], b[name], err_msg=name)
+
+def test_branching_leaves_parent_unchanged(config, learning_cfg):
+    config["world"]["max_turns"] = 40
+    core = make_core(config, learning_cfg, 4, headless=False)
+    for _ in range(5):
+        core.step()
+    state = core.state
+    before = (_columns(state), state.grid.copy(), dict(state.grid_items), state.turn)
+    core.run_branches(2, max_turns=10)
+    _assert_same(_columns(state), before[0])
+    np.testing.assert_array_equal(state.grid, before[1])
+    assert dict(state.grid_items) == before[2]
+    assert state.turn == before[3]
+    core.close()
+
+def test_identical_branches_match_a_straight_run(config, learning_cfg):
+    config["world"]["max_turns"] = 40
+    core = make_core(config, learning_cfg, 4, headless=False)
+    straight = make_core(config, learning_cfg, 4, headless=False)
+    for _ in range(5):
+        core.step()
+        straight.step()
+    first, second = core.run_branches(2, max_turns=10)
+    expected = [straight.step() for _ in range(len(first))]
+    core.close()
+    straight.close()
+    assert len(first) == 10 or first[-1].is_terminal
+    assert first == second == expected
+
+def test_forked_columns_are_copy_on_write(config, learning_cfg):
+    core = make_core(config, learning_cfg, 4, headless=False)
+    state = core.state
+    twin = state.fork()
+    before = _columns(state)
+    a_id = next(iter(state.store.ids))
+    twin.actor_data[a_id].alive = False
+    _assert_same(_columns(state), before)
+    assert not twin.actor_data[a_id].alive
+    # 元の側の書き込みも分岐には届かない
+    start = tuple(twin.actor_data[a_id].pos)
+    state.actor_data[a_id].pos = (0, 0)
+    assert tuple(state.actor_data[a_id].pos) == (0, 0)
+    assert tuple(twin.actor_data[a_id].pos) == start
+    y, x = map(int, np.argwhere(state.grid == 0)[0])
+    twin.edit_grid()[y, x] = 1
+    assert state.grid[y, x] == 0 and twin.grid[y, x] == 1
+    core.close()
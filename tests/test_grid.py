@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from pkg.engine.grid import Grid, source_grid
+from pkg.engine.path_cache import PathCache, grid_version
+from pkg.engine.pathfinder import Pathfinder
+
+def _rect_by_mask(shape, key):
+    mark = np.zeros(shape, dtype=bool)
+    mark[key] = True
+    ys, xs = np.nonzero(mark)
+    return (int(ys.min()), int(xs.min()), int(ys.max()) + 1, int(xs.max()) + 1)
+
+KEYS = [
+    (3, 4),
+    (-1, -2),
+    (slice(2, 5), slice(1, 7)),
+    (slice(None, None, 3), 2),
+    (slice(8, 1, -2), slice(None)),
+    (5,),
+    (Ellipsis, 3),
+    (np.array([1, 4, 7]), np.array([2, 2, 9])),
+    (np.array([True, False] * 5), slice(3, 4)),
+]
+
+@pytest.mark.parametrize("key", KEYS)
+def test_setitem_records_the_written_rectangle(key):
+    grid = Grid(10, 10)
+    grid[key] = 1
+    assert grid.version == 1
+    assert grid.changes_since(0) == [_rect_by_mask(grid.shape, key)]
+
+def test_setitem_with_a_full_mask():
+    grid = Grid(10, 10)
+    mask = np.zeros((10, 10), dtype=bool)
+    mask[2, 3] = mask[6, 1] = True
+    grid[mask] = 1
+    assert grid.changes_since(0) == [(2, 1, 7, 4)]
+
+def test_unchanged_write_keeps_the_version():
+    grid = Grid(6, 6)
+    grid[1:3, 1:3] = 0
+    assert grid.version == 0
+
+def test_slices_are_plain_arrays():
+    grid = Grid(8, 8)
+    part = grid[2:4, 2:4]
+    assert type(part) is np.ndarray
+    assert type(grid[3]) is np.ndarray
+    # 切り出しの書き換えは元の Grid の版を進めない (Grid に添字付きで書くこと)
+    grid[2:4, 2:4] = 1
+    assert grid.version == 1
+    assert grid.changes_since(0) == [(2, 2, 4, 4)]
+
+def test_same_layout_views_share_the_version():
+    grid = Grid(5, 5)
+    view = grid.view()
+    view[1, 1] = 1
+    assert grid.version == 1
+    assert grid[:].version == 1
+    assert type(grid[::-1]) is np.ndarray
+
+def test_read_only_view_is_a_plain_array():
+    grid = Grid(6)
+    view = grid.read_only()
+    assert type(view) is np.ndarray
+    assert not view.flags.writeable
+    assert source_grid(view) is grid
+    assert source_grid(np.zeros((6, 6))) is None
+    grid[2, 3] = 1
+    assert view[2, 3] == 1
+    assert grid_version(view) == grid_version(grid)
+
+def test_pathfinder_on_read_only_view_follows_edits():
+    # アクターはビューを持ったまま次のターンへ進むので、元の Grid の書き換えに追従する
+    grid = Grid(5)
+    finder = Pathfinder(grid.read_only(), cache=PathCache())
+    assert finder.get_path((2, 0), (2, 4)) == [(2, 0), (2, 1), (2, 2), (2, 3), (2, 4)]
+    grid[1:4, 2] = 1
+    path = finder.get_path((2, 0), (2, 4))
+    assert (2, 2) not in path and path[-1] == (2, 4)
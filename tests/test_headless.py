@@ -0,0 +1,17 @@
+import pytest
+from benchmarks.bench_headless import make_core, run_headless, run_normal
+from pkg.engine.core import TurnRecord
+
+@pytest.mark.parametrize("seed", [0, 3])
+def test_headless_report_matches_normal_run(config, learning_cfg, seed):
+    config["world"]["max_turns"] = 60
+    normal = run_normal(make_core(config, learning_cfg, seed, headless=False))
+    assert "error" not in normal
+    assert run_headless(make_core(config, learning_cfg, seed, headless=True)) == normal
+
+def test_headless_step_returns_turn_record(config, learning_cfg):
+    core = make_core(config, learning_cfg, 0, headless=True)
+    record = core.step()
+    core.close()
+    assert isinstance(record, TurnRecord)
+    assert record.turn == 1
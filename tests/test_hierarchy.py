@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from benchmarks.bench_pathfinder import make_grid, random_queries
+from pkg.engine.hierarchy import SectorGraph
+from pkg.engine.search import DIRECTIONS, DistanceField, move_masks
+
+def _cost(path):
+    return SectorGraph._path_cost(path)
+
+def _assert_walkable(grid, path):
+    # 隣り合うセルへの、壁の角をかすめない一歩の列
+    masks = move_masks(grid)
+    for a, b in zip(path, path[1:]):
+        step = (b[0] - a[0], b[1] - a[1])
+        assert step in DIRECTIONS, (a, b)
+        assert masks[a] >> DIRECTIONS.index(step) & 1, (a, b)
+
+@pytest.mark.parametrize("size,density,cluster,seed", [(40, 0.2, 8, 0), (48, 0.35, 8, 1), (64, 0.3, 16, 2)])
+def test_paths_are_valid_and_near_optimal(size, density, cluster, seed):
+    rng = np.random.default_rng(seed)
+    grid = make_grid(size, density, rng)
+    graph = SectorGraph(grid, cluster)
+    field = DistanceField(grid)
+    ratios = []
+    for s, g in random_queries(grid, 150, rng):
+        seeds = np.zeros(grid.shape, dtype=bool)
+        seeds[s] = True
+        best = field.compute_units(seeds)[g]
+        path = graph.find_path(s, g)
+        # 届くかどうかは具体的な距離場と一致する
+        assert (path is None) == (best >= DistanceField.UNREACHABLE), (s, g)
+        if path is None:
+            continue
+        assert path[0] == s and path[-1] == g
+        _assert_walkable(grid, path)
+        assert _cost(path) >= best
+        if best:
+            ratios.append(_cost(path) / best)
+    # 出入口を経由する分の遠回りはあるが、大きくは外れない
+    assert np.mean(ratios) < 1.1 and max(ratios) < 2.0
+
+def test_same_sector_takes_the_cheaper_route():
+    # セクタの中では壁を大きく回り込むが、下のセクタを通れば4手で着く
+    grid = np.zeros((16, 16), dtype=np.int8)
+    grid[1:8, 4] = 1
+    graph = SectorGraph(grid, 8)
+    s, g = (7, 3), (7, 5)
+    inside = graph._segment(s[0] * 16 + s[1], g[0] * 16 + g[1])
+    path = graph.find_path(s, g)
+    _assert_walkable(grid, path)
+    assert _cost(path) < _cost(inside)
+
+def test_unreachable_goal():
+    grid = np.zeros((16, 16), dtype=np.int8)
+    grid[:, 8] = 1
+    graph = SectorGraph(grid, 8)
+    assert graph.find_path((0, 0), (0, 15)) is None
+    assert graph.find_path((0, 0), (0, 8)) is None
@@ -0,0 +1,26 @@
+from pkg.engine.core import SimulationCore
+from pkg.entities.onis.oni_base import Oni
+from pkg.factory.generator import WorldGenerator
+from pkg.utils.random_manager import RandomManager
+
+def _core(config, learning_cfg, seed=2):
+    config["world"]["seed"] = seed
+    config["world"]["headless"] = True
+    Oni.reset_shared_memory()
+    state = WorldGenerator(seed=seed).build_initial_state(config)
+    return SimulationCore(state, config, learning_cfg, random_manager=RandomManager(seed))
+
+def test_planners_are_off_by_default(config, learning_cfg):
+    core = _core(config, learning_cfg)
+    for _ in range(5):
+        core.step()
+    assert len(core.state.planners) == 0
+
+def test_planners_are_only_built_for_onis(config, learning_cfg):
+    config["world"]["incremental_planner"] = True
+    core = _core(config, learning_cfg)
+    for _ in range(5):
+        core.step()
+    owners = {a_id for a_id, _ in core.state.planners._planners}
+    onis = {a_id for a_id, a in core.state.actor_data.items() if a.is_oni}
+    assert owners and owners <= onis
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from benchmarks.bench_pathfinder import make_grid, random_queries
+from pkg.engine.jps import JumpPointSearch
+from pkg.engine.search import DIRECTIONS, GridSearch, move_masks
+
+def _cost(path):
+    # (斜め, 縦横) の歩数。√2 は無理数なので、コストが等しいことと歩数が一致することは同じ
+    diagonal = sum(a[0] != b[0] and a[1] != b[1] for a, b in zip(path, path[1:]))
+    return diagonal, len(path) - 1 - diagonal
+
+def _assert_walkable(grid, path):
+    # 隣り合うセルへの、壁の角をかすめない一歩の列
+    masks = move_masks(grid)
+    for a, b in zip(path, path[1:]):
+        step = (b[0] - a[0], b[1] - a[1])
+        assert step in DIRECTIONS, (a, b)
+        assert masks[a] >> DIRECTIONS.index(step) & 1, (a, b)
+
+@pytest.mark.parametrize("size,density,seed", [(25, 0.2, 0), (25, 0.35, 1), (40, 0.1, 2), (40, 0.3, 3), (64, 0.25, 4)])
+def test_jps_matches_grid_search_cost(size, density, seed):
+    rng = np.random.default_rng(seed)
+    grid = make_grid(size, density, rng)
+    jps = JumpPointSearch(grid)
+    engine = GridSearch(grid)
+    for s, g in random_queries(grid, 300, rng):
+        path = jps.find_path(s, g)
+        expected = engine.find_path(s, g)
+        assert (path is None) == (expected is None), (s, g)
+        if path is None:
+            continue
+        assert path[0] == s and path[-1] == g
+        _assert_walkable(grid, path)
+        assert _cost(path) == _cost(expected), (s, g)
+
+def test_no_corner_cutting_between_diagonal_walls():
+    # 斜めに並んだ壁の隙間は角抜けになるので、回り込む必要がある
+    grid = np.zeros((5, 5), dtype=int)
+    grid[1, 2] = grid[2, 1] = 1
+    path = JumpPointSearch(grid).find_path((1, 1), (2, 2))
+    _assert_walkable(grid, path)
+    assert _cost(path) == _cost(GridSearch(grid).find_path((1, 1), (2, 2)))
+
+def test_unreachable_and_out_of_bounds():
+    grid = np.zeros((5, 5), dtype=int)
+    grid[:, 2] = 1
+    jps = JumpPointSearch(grid)
+    assert jps.find_path((0, 0), (0, 4)) is None
+    assert jps.find_path((0, 0), (0, 2)) is None
+    assert jps.find_path((0, 0), (5, 0)) is None
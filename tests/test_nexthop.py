@@ -0,0 +1,18 @@
+import numpy as np
+from benchmarks.bench_pathfinder import legacy_astar, make_grid, random_queries
+from pkg.engine.nexthop import NextHopTable
+
+def test_path_lengths_match_astar():
+    # 一歩目の同点の崩し方は A* と違いうるが、歩数は一致する
+    rng = np.random.default_rng(0)
+    grid = make_grid(20, 0.2, rng)
+    table = NextHopTable.build(grid)
+    for s, g in random_queries(grid, 300, rng):
+        path = legacy_astar(grid, s, g)
+        expected = len(path) - 1 if path[-1] == g else None
+        assert table.path_length(s, g) == expected, (s, g)
+        if expected is not None:
+            assert len(table.path(s, g)) == len(path)
+
+def test_table_is_off_by_default(config):
+    assert not config["world"]["nexthop_table"]
@@ -0,0 +1,49 @@
+from pkg.engine.core import SimulationCore
+from pkg.engine.path_cache import PATH_CACHE, PathCache
+from pkg.factory.generator import WorldGenerator
+
+def test_lookup_keeps_table_alive():
+    # 引かれ続けている版は、後から付いた版より先に捨てられない
+    cache = PathCache(max_tables=2)
+    cache.attach_table("a", 1)
+    cache.attach_table("b", 2)
+    assert cache.table("a") == 1
+    cache.attach_table("c", 3)
+    assert cache.table("a") == 1
+    assert cache.table("b") is None
+
+def test_visibility_lookup_keeps_index_alive():
+    cache = PathCache(max_tables=2)
+    cache.attach_visibility("a", 1)
+    cache.attach_visibility("b", 2)
+    assert cache.visibility("a") == 1
+    cache.attach_visibility("c", 3)
+    assert cache.visibility("a") == 1
+    assert cache.visibility("b") is None
+
+def test_capacity_follows_live_cores():
+    cache = PathCache(max_tables=2)
+    for _ in range(4):
+        cache.retain()
+    for version in range(4):
+        cache.attach_table(version, version)
+    assert [cache.table(v) for v in range(4)] == [0, 1, 2, 3]
+    for _ in range(4):
+        cache.release()
+    cache.attach_table(4, 4)
+    assert cache.table(0) is None and cache.table(4) == 4
+
+def test_cores_hold_a_table_each(config, learning_cfg):
+    config["world"]["headless"] = True
+    live = PATH_CACHE._live
+    cores = [
+        SimulationCore(WorldGenerator(seed=seed).build_initial_state(config), config, learning_cfg)
+        for seed in range(3)
+    ]
+    assert PATH_CACHE._live == live + 3
+    cores[0].run_branches(1, max_turns=1)
+    assert PATH_CACHE._live == live + 3
+    for core in cores:
+        core.close()
+        core.close()
+    assert PATH_CACHE._live == live
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from benchmarks.bench_pathfinder import legacy_astar, make_grid, random_queries
+from pkg.engine.path_cache import PathCache
+from pkg.engine.pathfinder import Pathfinder
+from pkg.engine.search import GridSearch
+
+@pytest.mark.parametrize("size,density,seed", [(25, 0.2, 0), (25, 0.35, 1), (40, 0.1, 2), (40, 0.3, 3)])
+def test_grid_search_matches_baseline_astar(size, density, seed):
+    rng = np.random.default_rng(seed)
+    grid = make_grid(size, density, rng)
+    engine = GridSearch(grid)
+    for s, g in random_queries(grid, 300, rng):
+        path = engine.find_path(s, g)
+        assert (path or [s]) == legacy_astar(grid, s, g), (s, g)
+
+def test_pathfinder_astar_matches_baseline():
+    rng = np.random.default_rng(7)
+    grid = make_grid(30, 0.25, rng)
+    finder = Pathfinder(grid, cache=PathCache())
+    for s, g in random_queries(grid, 200, rng):
+        assert finder._astar(s, g) == legacy_astar(grid, s, g), (s, g)
@@ -0,0 +1,91 @@
+import time
+from pathlib import Path
+from pkg.engine.core import SimulationCore
+from pkg.entities.onis.oni_base import Oni
+from pkg.factory.generator import WorldGenerator
+from pkg.utils.profiler import PROFILER, Profiler
+from pkg.utils.random_manager import RandomManager
+
+def _turn(profiler, turn, seconds, context=None):
+    profiler.begin_turn(turn, context)
+    time.sleep(seconds)
+    profiler.lap("decide")
+    profiler.count("astar_searches", turn)
+    profiler.lap("apply")
+    profiler.end_turn()
+
+def test_disabled_profiler_records_nothing():
+    profiler = Profiler()
+    _turn(profiler, 1, 0.0)
+    assert profiler.call("decide.Human", max, 1, 2) == 2
+    report = profiler.report()
+    assert report["turns"] == 0 and report["timers"] == {} and report["counters"] == {}
+
+def test_laps_and_counters():
+    profiler = Profiler()
+    profiler.enable()
+    _turn(profiler, 1, 0.01)
+    _turn(profiler, 2, 0.0)
+    report = profiler.report()
+    assert report["turns"] == 2
+    assert set(report["timers"]) == {"step", "step.decide", "step.apply"}
+    assert report["timers"]["step.decide"]["count"] == 2
+    assert report["timers"]["step.decide"]["max"] >= 0.01
+    assert report["timers"]["step"]["total"] >= report["timers"]["step.decide"]["total"]
+    assert sum(report["timers"]["step"]["histogram"]["counts"]) == 2
+    assert report["counters"] == {"astar_searches": 3}
+
+def test_slowest_turns_are_kept_with_their_context():
+    profiler = Profiler(slowest=2)
+    profiler.enable()
+    built = []
+
+    def context(turn):
+        def build():
+            built.append(turn)
+            return {"turn": turn}
+        return build
+
+    for turn, seconds in enumerate((0.03, 0.02, 0.0, 0.0, 0.0), start=1):
+        _turn(profiler, turn, seconds, context(turn))
+    slow = profiler.slow_turns()
+    assert [entry["turn"] for entry in slow] == [1, 2]
+    assert slow[0]["seconds"] >= slow[1]["seconds"] >= 0.02
+    assert set(slow[0]["phases"]) == {"step.decide", "step.apply"}
+    # ターン内のカウンタの増分だけを持つ
+    assert slow[1]["counters"] == {"astar_searches": 2}
+    assert slow[1]["context"] == {"turn": 2}
+    # 遅いターンに残らなかったターンの context は組まない
+    assert built == [1, 2]
+
+def test_core_builds_context_only_for_slow_turns(config, learning_cfg, tmp_path, monkeypatch):
+    world = config["world"]
+    world.update(seed=4, headless=True, executor="serial", profile=True, profile_slowest=3,
+                 checkpoint_dir=str(tmp_path), checkpoint_interval=2, checkpoint_keep=None)
+    Oni.reset_shared_memory()
+    state = WorldGenerator(seed=4).build_initial_state(config)
+    core = SimulationCore(state, config, learning_cfg, random_manager=RandomManager(4))
+    calls = []
+    build = core._repro_context
+    monkeypatch.setattr(core, "_repro_context", lambda turn: calls.append(turn) or build(turn))
+    try:
+        for _ in range(12):
+            core.step()
+            core.checkpointer.wait()
+    finally:
+        core.close()
+        PROFILER.disable()
+    slow = PROFILER.slow_turns()
+    assert len(slow) == 3
+    # 組んだのは遅いターンの候補に入った時だけで、同じターンを二度組むことはない
+    assert {entry["turn"] for entry in slow} <= set(calls)
+    assert len(calls) == len(set(calls))
+    for entry in slow:
+        context = entry["context"]
+        assert context["seed"] == 4 and context["world_seed"] == 4
+        assert set(context["random_state"]) == {"random", "numpy"}
+        # 再開に使うのはそのターンより前のチェックポイント (最初のものはターン2の終わり)
+        if context["checkpoint"] is None:
+            assert entry["turn"] <= 2
+        else:
+            assert Path(context["checkpoint"]).name < f"turn_{entry['turn']:06}"
@@ -0,0 +1,66 @@
+import pytest
+from benchmarks.bench_headless import make_core
+from pkg.analysis.evaluator import SimulationEvaluator
+from pkg.analysis.replay import ReplayReader, ReplayWriter, _status_dict
+
+def _record(config, learning_cfg, path, turns=30, keyframe_interval=4, seed=2):
+    """live で回しながらリプレイを書き、(live の報告, ターンごとのスナップショット) を返す"""
+    config["world"]["max_turns"] = turns
+    core = make_core(config, learning_cfg, seed, headless=False)
+    snapshots = {}
+    with ReplayWriter(path, keyframe_interval) as replay:
+        evaluator = SimulationEvaluator(keep_history=False, replay=replay)
+        try:
+            while not core.state.is_terminal:
+                result = core.step()
+                evaluator.record_step(result)
+                snapshots[result.turn] = {a_id: _status_dict(s) for a_id, s in result.snapshot.items()}
+        finally:
+            core.close()
+    return evaluator.generate_final_report(), snapshots
+
+def test_replay_report_matches_live(config, learning_cfg, tmp_path):
+    path = tmp_path / "run.rpl"
+    live, _ = _record(config, learning_cfg, path)
+    assert "error" not in live
+    assert SimulationEvaluator.from_replay(path).generate_final_report() == live
+
+def test_frames_match_live_across_keyframes(config, learning_cfg, tmp_path):
+    path = tmp_path / "run.rpl"
+    _, snapshots = _record(config, learning_cfg, path)
+    with ReplayReader(path) as reader:
+        assert reader.turns == sorted(snapshots)
+        # 逆順に引いても、キーフレームの前後でも同じ中身になる
+        for turn in sorted(snapshots, reverse=True):
+            assert reader.frame(turn).snapshot == snapshots[turn], turn
+        assert [frame.snapshot for frame in reader] == [snapshots[t] for t in reader.turns]
+        with pytest.raises(KeyError):
+            reader.frame(max(snapshots) + 1)
+
+def test_truncated_tail_is_ignored(config, learning_cfg, tmp_path):
+    path = tmp_path / "run.rpl"
+    _, snapshots = _record(config, learning_cfg, path, turns=10)
+    data = path.read_bytes()
+    path.write_bytes(data[:-3])
+    with ReplayReader(path) as reader:
+        assert reader.turns == sorted(snapshots)[:-1]
+        last = reader.turns[-1]
+        assert reader.frame(last).snapshot == snapshots[last]
+
+def test_append_to_existing_file(config, learning_cfg, tmp_path):
+    path = tmp_path / "run.rpl"
+    _, first = _record(config, learning_cfg, path, turns=6, seed=2)
+    _, second = _record(config, learning_cfg, path, turns=6, seed=5)
+    with ReplayReader(path) as reader:
+        frames = list(reader)
+    assert len(frames) == len(first) + len(second)
+    expected = [first[t] for t in sorted(first)] + [second[t] for t in sorted(second)]
+    assert [frame.snapshot for frame in frames] == expected
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b"not a replay file")
+    with pytest.raises(ValueError):
+        ReplayReader(path)
+    with pytest.raises(ValueError):
+        ReplayWriter(path)
@@ -0,0 +1,66 @@
+import pytest
+from pkg.engine.grid import Grid
+from pkg.engine.reservation import ReservationTable
+
+def _table(size=7, ticks=1):
+    table = ReservationTable(Grid(size))
+    table.reset(ticks)
+    return table
+
+def _straight(start, goal):
+    # 斜めを先に使う単純な希望経路
+    path = [start]
+    y, x = start
+    while (y, x) != goal:
+        y += (goal[0] > y) - (goal[0] < y)
+        x += (goal[1] > x) - (goal[1] < x)
+        path.append((y, x))
+    return path
+
+def test_final_cells_are_distinct():
+    # 全員が同じセルを目指しても、終点は重ならない
+    table = _table()
+    starts = [(0, 0), (0, 6), (6, 0), (6, 6), (3, 0), (0, 3)]
+    for i, s in enumerate(starts):
+        table.hold(i, s)
+    ends = [table.plan(i, s, _straight(s, (3, 3)), team="human")[-1] for i, s in enumerate(starts)]
+    assert len(set(ends)) == len(ends)
+
+def test_same_team_cannot_swap_but_opponents_can():
+    for team_b, swapped in (("human", False), ("oni", True)):
+        # hold しないので、a が空けたセルへ b が入れるかは辺の予約だけで決まる
+        table = _table()
+        a = table.plan("a", (3, 2), [(3, 2), (3, 3)], team="human")
+        b = table.plan("b", (3, 3), [(3, 3), (3, 2)], team=team_b)
+        assert a == [(3, 2), (3, 3)]
+        # 同じ陣営は a の辺を逆向きに通れない。鬼と人間のすれ違いは戦闘判定に任せる
+        assert (b == [(3, 3), (3, 2)]) is swapped
+
+def test_speed_two_uses_both_ticks():
+    table = _table(ticks=2)
+    table.hold("fast", (0, 0))
+    table.hold("slow", (6, 0))
+    fast = table.plan("fast", (0, 0), _straight((0, 0), (0, 6)), speed=2, team="human")
+    slow = table.plan("slow", (6, 0), _straight((6, 0), (6, 6)), speed=1, team="human")
+    assert fast == [(0, 0), (0, 1), (0, 2)]
+    # speed 1 は1歩進んで、残りの刻みは終点で待つ
+    assert slow == [(6, 0), (6, 1), (6, 1)]
+
+def test_side_steps_when_guide_is_blocked():
+    # 希望経路の次のセルを他人が押さえていれば、目標に近い別のセルへ避ける
+    table = _table()
+    table.hold("blocker", (4, 4))
+    cells = table.plan("walker", (3, 3), _straight((3, 3), (6, 6)), team="human")
+    assert cells[-1] in {(3, 4), (4, 3)}
+
+def test_walls_are_respected():
+    grid = Grid(5)
+    grid[:, 2] = 1
+    table = ReservationTable(grid)
+    table.reset(1)
+    cells = table.plan("a", (2, 1), [(2, 1), (2, 2), (2, 3)], team="human")
+    assert grid[cells[-1]] == 0
+
+def test_ticks_must_be_positive():
+    with pytest.raises(ValueError):
+        _table().reset(0)
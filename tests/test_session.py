@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from pkg.analysis.batch import episode_seeds
+from pkg.server.session import LocalClient, SessionManager
+
+def _run(coro):
+    return asyncio.run(asyncio.wait_for(coro, timeout=60))
+
+def test_local_client_create_step_pause(config, learning_cfg):
+    async def scenario():
+        manager = SessionManager(config, learning_cfg)
+        client = LocalClient(manager)
+        try:
+            session_id = await client.create(seed=4, paused=True)
+            assert (await client.status(session_id))["status"] == "paused"
+            watch = client.watch(session_id)
+            await client.step(session_id, n=3)
+            results = [await watch.queue.get() for _ in range(3)]
+            assert [r.turn for r in results] == [1, 2, 3]
+            assert set(results[-1].snapshot) == set(manager.get(session_id).core.state.actor_data)
+            status = await client.pause(session_id)
+            assert status["status"] == "paused"
+            assert status["turn"] == 3
+            await client.close(session_id)
+            assert (await client.request("list"))["sessions"] == []
+        finally:
+            await manager.close()
+
+    _run(scenario())
+
+def test_handle_reports_build_failures(config, learning_cfg):
+    async def scenario():
+        manager = SessionManager(config, learning_cfg)
+        try:
+            # 3x3 の盤面には全員を置けず、生成で落ちる
+            reply = await manager.handle({"op": "create", "seed": 1, "world": {"grid_size": 3}})
+            assert reply["ok"] is False
+            assert "Not enough open cells" in reply["error"]
+            with pytest.raises(ValueError):
+                await LocalClient(manager).create(seed=1, world={"exit_pos": [-5, 0], "grid_size": 3})
+            assert manager.sessions == {}
+        finally:
+            await manager.close()
+
+    _run(scenario())
+
+def test_same_seed_sessions_match(config, learning_cfg):
+    # 先に回ったセッションの探索が、後から同じ種で作ったセッションの結果を変えない
+    config["world"]["max_turns"] = 60
+
+    async def scenario():
+        manager = SessionManager(config, learning_cfg)
+        seed = episode_seeds(1, 6)[4]
+        try:
+            runs = []
+            for _ in range(3):
+                session = await manager.create(seed=seed, paused=True)
+                watch = session.subscribe(maxsize=64)
+                session.resume()
+                await session.wait()
+                runs.append([r async for r in watch])
+            return runs
+        finally:
+            await manager.close()
+
+    runs = _run(scenario())
+    assert runs[0] and runs[0][-1].is_terminal
+    assert runs[0] == runs[1] == runs[2]
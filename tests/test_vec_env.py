@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from pkg.engine.search import DistanceField
+from pkg.engine.vec_env import VecEnv
+
+def _env(config, learning_cfg, num_envs=4):
+    config["world"]["grid_size"] = 12
+    config["world"]["max_turns"] = 5
+    return VecEnv(config, learning_cfg, num_envs, seed=0)
+
+def test_step_before_reset_raises(config, learning_cfg):
+    env = _env(config, learning_cfg)
+    with pytest.raises(ValueError, match="reset"):
+        env.step()
+
+def test_regenerated_worlds_match_full_rebuild(config, learning_cfg):
+    # 作り直した世界の分だけ書き換えた壁と移動表が、全世界を作り直したものと一致する
+    env = _env(config, learning_cfg)
+    env.reset()
+    regenerated = 0
+    for _ in range(12):
+        _, _, done, _ = env.step()
+        regenerated += done.sum()
+    assert regenerated
+    r = env._lines.radius
+    walls = np.pad(env.grids == 1, ((0, 0), (r, r), (r, r)), constant_values=False)
+    np.testing.assert_array_equal(env._walls, walls)
+    for mine, full in zip(env._distance._tables(), DistanceField(env.grids)._tables()):
+        np.testing.assert_array_equal(mine, full)
+
+def test_reset_only_touches_given_worlds(config, learning_cfg):
+    env = _env(config, learning_cfg)
+    env.reset()
+    walls, grids = env._walls.copy(), env.grids.copy()
+    env._regenerate(np.array([1]))
+    keep = np.array([0, 2, 3])
+    np.testing.assert_array_equal(env.grids[keep], grids[keep])
+    np.testing.assert_array_equal(env._walls[keep], walls[keep])
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+from pkg.engine.spatial import SpatialHash
+from pkg.engine.visibility import ActorVisibility, VisibilityIndex, has_wall_between
+
+def _world(seed, n, size=40):
+    rng = np.random.default_rng(seed)
+    grid = (rng.random((size, size)) < 0.2).astype(int)
+    positions = [tuple(map(int, p)) for p in rng.integers(0, size, size=(n, 2))]
+    ids = [f"a{i}" for i in range(n)]
+    return grid, ids, positions
+
+@pytest.mark.parametrize("with_index", [False, True])
+def test_actor_visibility_matches_brute_force(with_index):
+    grid, ids, positions = _world(0, 60)
+    radius = 8
+    index = VisibilityIndex.build(grid, radius) if with_index else None
+    vis = ActorVisibility(ids, positions, radius, grid, index)
+    for i, (a, p) in enumerate(zip(ids, positions)):
+        expected = [
+            b for j, (b, q) in enumerate(zip(ids, positions))
+            if j != i and abs(p[0] - q[0]) + abs(p[1] - q[1]) <= 5 and not has_wall_between(p, q, grid)
+        ]
+        assert vis.visible_from(a, 5) == expected
+        for b, q in zip(ids, positions):
+            d = abs(p[0] - q[0]) + abs(p[1] - q[1])
+            if d > radius:
+                assert vis.sees(a, b) is None
+            else:
+                assert vis.sees(a, b) == (a == b or not has_wall_between(p, q, grid))
+
+def test_actor_visibility_uses_the_given_spatial_hash():
+    grid, ids, positions = _world(1, 40)
+    spatial = SpatialHash(8)
+    for a_id, p in zip(ids, positions):
+        spatial.insert(a_id, p)
+    a = ActorVisibility(ids, positions, 6, grid, spatial=spatial)
+    b = ActorVisibility(ids, positions, 6, grid)
+    assert a.pairs == b.pairs
+    assert all(a.visible_from(x, 6) == b.visible_from(x, 6) for x in ids)